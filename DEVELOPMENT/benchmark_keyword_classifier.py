@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark de la Classification par Mots-Clés
+Compare le classifieur commun (automate d'Aho-Corasick, automation/keyword_classifier.py)
+aux trois classifieurs qu'il remplace, recopiés ci-dessous : durée par message,
+évolution avec le nombre de mots-clés et catégories concordantes.
+
+Usage: python DEVELOPMENT/benchmark_keyword_classifier.py [--repeat 2000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PRODUCTION'))
+
+from automation.keyword_classifier import (get_keyword_classifier, normalize, KeywordAutomaton,
+                                           CATEGORY_LABELS, TEMPLATE_CATEGORIES)
+
+MESSAGES = [
+    "Bonjour, ma commande #1003 a un retard de livraison. Quand vais-je la recevoir ?",
+    "Je souhaite obtenir un remboursement pour ma commande #1001, je ne suis pas satisfaite du produit.",
+    "Le produit de ma commande #1002 est arrivé cassé et défectueux.",
+    "Pouvez-vous me donner des informations sur le statut de ma commande #1004 ?",
+    "C'est la troisième fois que je vous écris, personne ne me répond. Je suis très mécontent !",
+    "Proposez-vous des cartes cadeaux pour les fêtes ?",
+    "Où est mon colis ? Le transporteur indique une expédition il y a 10 jours, c'est inadmissible.",
+    "La cafetière ne fonctionne pas, l'écran est abîmé et la facture n'était pas dans le carton. " * 3,
+]
+
+
+# --- Implémentations précédentes (références) ---
+
+def legacy_classify_message_simple(message):
+    """web_app/app.py avant le classifieur commun"""
+    message_lower = message.lower()
+    if any(word in message_lower for word in ['retard', 'livraison', 'reçu', 'arrivé', 'expédition']):
+        return 'Retard de livraison'
+    elif any(word in message_lower for word in ['remboursement', 'rembourser', 'annuler', 'remboursé']):
+        return 'Remboursement'
+    elif any(word in message_lower for word in ['défectueux', 'cassé', 'abîmé', 'problème', 'défaut']):
+        return 'Produit défectueux'
+    else:
+        return 'Information commande'
+
+
+LEGACY_SUPPORT_CATEGORIES = {
+    "Retard de livraison": ["retard", "livraison", "délai", "reçu", "arrivé", "transporteur",
+                            "suivi", "où est", "quand", "expédition"],
+    "Remboursement": ["remboursement", "rembourser", "annuler", "argent", "paiement",
+                      "remboursé", "reçu", "satisfait", "retour"],
+    "Produit défectueux": ["défectueux", "cassé", "abîmé", "défaut", "problème", "marche pas",
+                           "fonctionne pas", "endommagé", "qualité", "mauvais état"],
+    "Information commande": ["information", "détail", "statut", "état", "facture", "reçu",
+                             "confirmation", "résumé", "liste", "contenu"]
+}
+
+
+def legacy_support_classify(message):
+    """SupportAgent._classify_message avant le classifieur commun"""
+    message_lower = message.lower()
+    scores = {}
+    for categorie, mots_cles in LEGACY_SUPPORT_CATEGORIES.items():
+        score = sum(1 for mot in mots_cles if mot in message_lower)
+        if score > 0:
+            scores[categorie] = score
+    if scores:
+        return max(scores, key=scores.get)
+    return "Non classé"
+
+
+def legacy_fallback_classification(message):
+    """ClaudeAgent._fallback_classification avant le classifieur commun (catégorie et escalade)"""
+    message_lower = message.lower()
+    if any(word in message_lower for word in ['retard', 'livraison', 'reçu', 'arrivé', 'expédition']):
+        category = 'retard_livraison'
+    elif any(word in message_lower for word in ['remboursement', 'rembourser', 'annuler']):
+        category = 'remboursement'
+    elif any(word in message_lower for word in ['défectueux', 'cassé', 'abîmé', 'problème']):
+        category = 'produit_defectueux'
+    elif any(word in message_lower for word in ['mécontent', 'insatisfait', 'plainte']):
+        category = 'reclamation'
+    else:
+        category = 'information_commande'
+    escalation = any(word in message_lower for word in
+                     ('urgent', 'immédiatement', 'inadmissible', 'inacceptable', 'scandale', 'avocat'))
+    return category, escalation
+
+
+def per_message_us(function, repeat):
+    total = timeit.timeit(lambda: [function(message) for message in MESSAGES], number=repeat)
+    return total / (repeat * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark du classifieur par mots-clés")
+    parser.add_argument('--repeat', type=int, default=2000, help="Passages sur les messages d'exemple")
+    args = parser.parse_args()
+
+    classifier = get_keyword_classifier()
+    shared = lambda message: classifier.classify(message)
+    label = lambda message: classifier.label(message, among=TEMPLATE_CATEGORIES, default="Non classé")
+
+    print("📊 MICROBENCHMARK DE LA CLASSIFICATION PAR MOTS-CLÉS")
+    print(f"   {len(MESSAGES)} messages, {len(classifier.automaton.keywords)} mots-clés compilés, "
+          f"{args.repeat} passages")
+    print("=" * 50)
+
+    legacy = {
+        'classify_message_simple': legacy_classify_message_simple,
+        'SupportAgent._classify_message': legacy_support_classify,
+        'ClaudeAgent._fallback_classification': legacy_fallback_classification
+    }
+    legacy_total = 0.0
+    for name, function in legacy.items():
+        duration = per_message_us(function, args.repeat)
+        legacy_total += duration
+        print(f"🔸 {name}: {duration:.2f} µs / message")
+    print(f"🔸 Les trois (un appel chacun): {legacy_total:.2f} µs / message")
+
+    print(f"🔹 normalize: {per_message_us(normalize, args.repeat):.2f} µs / message")
+    print(f"🔹 KeywordClassifier.classify (toutes catégories + escalade): "
+          f"{per_message_us(shared, args.repeat):.2f} µs / message")
+    print("-" * 50)
+
+    # Passage à l'échelle : les tests `in` croissent avec le nombre de mots-clés, pas le parcours de l'automate
+    normalized = [normalize(message) for message in MESSAGES]
+    base = sorted(classifier.automaton.keywords)
+    for size in (len(base), 200, 1000):
+        keywords = (base + [f"{word}{index}" for index in range(size) for word in base])[:size]
+        automaton = KeywordAutomaton(keywords)
+        scan = per_message_us(lambda message: sum(1 for keyword in keywords if keyword in message),
+                              max(1, args.repeat // 10))
+        # Les messages sont déjà normalisés : seul le parcours est mesuré
+        search = timeit.timeit(lambda: [automaton.search(message) for message in normalized],
+                               number=max(1, args.repeat // 10)) / (max(1, args.repeat // 10) * len(MESSAGES)) * 1e6
+        print(f"📈 {size:5} mots-clés: tests `in` {scan:7.2f} µs | automate {search:6.2f} µs / message")
+    print("-" * 50)
+
+    # Concordance avec les anciennes fonctions (les scores pondérés peuvent départager autrement)
+    for message in MESSAGES:
+        result = classifier.classify(message)
+        category = result['category'] or 'information_commande'
+        old_category, old_escalation = legacy_fallback_classification(message)
+        marker = "✅" if (category, 'escalation' in result['markers']) == (old_category, old_escalation) else "↔️"
+        print(f"{marker} {message[:50]:50} | {CATEGORY_LABELS.get(category, category):20} "
+              f"(avant: {CATEGORY_LABELS.get(old_category, old_category)}) | "
+              f"support: {label(message)} (avant: {legacy_support_classify(message)})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
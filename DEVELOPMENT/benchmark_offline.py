@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Hors Ligne du Pipeline Claude
+Démarre le faux serveur de l'API Anthropic dans le processus et traite les
+messages d'exemple avec un ClaudeAgent configuré comme l'application web
+(budget de tokens, résilience, routage), en parallèle comme les workers de la
+file : latence p50/p95/p99, premier fragment streamé, débit, appels API,
+réponses de secours et erreurs injectées. Sans clé ni réseau, et reproductible
+avec la même graine.
+
+Usage: python DEVELOPMENT/benchmark_offline.py [--messages 100] [--workers 4]
+           [--latency lognormal:0.6,0.4] [--tokens-per-second 80] [--errors 529:0.02]
+           [--stream] [--modes combined two_step] [--seed 42]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PRODUCTION'))
+
+import fake_anthropic_server
+from benchmark_processing_modes import SAMPLE_MESSAGES, SAMPLE_CONTEXT, percentile
+from config import TOKEN_BUDGET_CONFIG, RESILIENCE_CONFIG, ROUTING_CONFIG
+from automation.claude_agent import ClaudeAgent, PROCESSING_MODES
+from automation.token_budget import TokenBudgeter
+from automation.resilience import ResilientCaller
+from automation.model_router import ModelRouter
+
+
+def build_agent(base_url):
+    """ClaudeAgent dirigé vers le faux serveur, avec les réglages de l'application web"""
+    return ClaudeAgent(api_key='offline-benchmark', base_url=base_url,
+                       token_budget=TokenBudgeter(**TOKEN_BUDGET_CONFIG),
+                       resilience=ResilientCaller(**RESILIENCE_CONFIG),
+                       router=ModelRouter(**ROUTING_CONFIG))
+
+
+def process_one(agent, mode, index, stream):
+    """Traite un message d'exemple et retourne sa mesure"""
+    subject, message = SAMPLE_MESSAGES[index % len(SAMPLE_MESSAGES)]
+    first_fragment = []
+    start = time.perf_counter()
+
+    def on_text(text):
+        if not first_fragment:
+            first_fragment.append(time.perf_counter() - start)
+
+    result = agent.process_customer_message(SAMPLE_CONTEXT['client']['email'], message, subject,
+                                            context=SAMPLE_CONTEXT, on_text=on_text if stream else None,
+                                            mode=mode)
+    return {
+        'duration': time.perf_counter() - start,
+        'first_fragment': first_fragment[0] if first_fragment else None,
+        'error': result.get('error'),
+        'model': result.get('model'),
+        'effective_mode': result.get('processing_mode'),
+        **result.get('usage', {})
+    }
+
+
+def run_mode(server, mode, args):
+    """Traite `args.messages` messages avec `args.workers` workers ; retourne (mesures, durée totale)"""
+    agent = build_agent(f"http://127.0.0.1:{server.server_address[1]}")
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        start = time.perf_counter()
+        measures = list(pool.map(lambda index: process_one(agent, mode, index, args.stream),
+                                 range(args.messages)))
+        elapsed = time.perf_counter() - start
+    return agent, measures, elapsed
+
+
+def summarize(mode, agent, measures, elapsed, server_stats):
+    ok = [m for m in measures if not m['error']]
+    if not ok:
+        print(f"⚠️ {mode}: aucune mesure")
+        return
+    durations = [m['duration'] * 1000 for m in ok]
+    per_message = lambda key: statistics.mean(m.get(key, 0) or 0 for m in ok)
+    fallbacks = sum(1 for m in ok if m['model'] == 'fallback')
+    breaker = agent.resilience.get_status()['breaker']
+
+    print(f"🔹 {mode} ({len(ok)} messages, {len(measures) - len(ok)} erreurs)")
+    print(f"   ⏱️  p50: {percentile(durations, 50):.0f} ms | p95: {percentile(durations, 95):.0f} ms | "
+          f"p99: {percentile(durations, 99):.0f} ms")
+    first = [m['first_fragment'] * 1000 for m in ok if m['first_fragment'] is not None]
+    if first:
+        print(f"   ✏️  Premier fragment p50: {percentile(first, 50):.0f} ms | p95: {percentile(first, 95):.0f} ms")
+    print(f"   🚀 Débit: {len(measures) / elapsed:.1f} messages/s")
+    print(f"   📞 Appels API / message: {per_message('api_calls'):.2f} | "
+          f"requêtes reçues: {server_stats['requests']} (erreurs injectées: {server_stats['errors']})")
+    print(f"   🔤 Tokens / message: {per_message('input_tokens'):.0f} en entrée, "
+          f"{per_message('output_tokens'):.0f} en sortie")
+    print("   🧭 Modèles: " + ", ".join(f"{model}: {count}" for model, count in sorted(
+        ((model, sum(1 for m in ok if m['model'] == model)) for model in {m['model'] for m in ok}),
+        key=lambda item: -item[1])))
+    print(f"   🛟 Réponses de secours: {fallbacks} | disjoncteur: {breaker['state']} "
+          f"(ouvert {breaker['opened']} fois, {breaker['rejected']} appels refusés)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du pipeline ClaudeAgent (faux serveur)")
+    parser.add_argument('--messages', type=int, default=100, help="Messages traités par mode")
+    parser.add_argument('--workers', type=int, default=4, help="Traitements en parallèle")
+    parser.add_argument('--modes', nargs='+', choices=PROCESSING_MODES, default=list(PROCESSING_MODES))
+    parser.add_argument('--stream', action='store_true', help="Génération en streaming (comme l'interface web)")
+    parser.add_argument('--latency', default='lognormal:0.6,0.4',
+                        help="Délai avant le premier token : fixed:S, uniform:MIN,MAX ou lognormal:MÉDIANE,SIGMA")
+    parser.add_argument('--tokens-per-second', type=float, default=80.0, help="Débit de génération simulé")
+    parser.add_argument('--errors', default='', help="Erreurs injectées par code HTTP, ex. 529:0.02,429:0.01")
+    parser.add_argument('--payloads', help="Fichier JSON de réponses prédéfinies (voir fake_anthropic_server)")
+    parser.add_argument('--seed', type=int, default=42, help="Graine des tirages du faux serveur")
+    parser.add_argument('--port', type=int, default=0, help="Port du faux serveur (0 : port libre)")
+    args = parser.parse_args()
+
+    print("📊 BENCHMARK HORS LIGNE DU PIPELINE CLAUDE")
+    print(f"   Latence {args.latency}, {args.tokens_per_second:g} tokens/s, erreurs: {args.errors or 'aucune'}, "
+          f"{args.workers} workers")
+    print("=" * 50)
+
+    for mode in args.modes:
+        # Un serveur par mode : mêmes tirages (graine) et compteurs propres à chaque mode
+        server = fake_anthropic_server.serve(
+            port=args.port, latency=args.latency, tokens_per_second=args.tokens_per_second,
+            errors=fake_anthropic_server.parse_errors(args.errors),
+            payloads=fake_anthropic_server.load_payloads(args.payloads), seed=args.seed)
+        try:
+            agent, measures, elapsed = run_mode(server, mode, args)
+            summarize(mode, agent, measures, elapsed, dict(server.state.stats))
+        finally:
+            server.shutdown()
+            server.server_close()
+        print("-" * 50)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
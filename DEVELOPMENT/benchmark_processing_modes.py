@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark des Modes de Traitement Claude
+Compare le mode combiné (classification + réponse en un appel) au mode en deux
+appels : latence p50/p95, appels API et tokens par message.
+
+Usage: python DEVELOPMENT/benchmark_processing_modes.py [--runs 3] [--stream]
+Nécessite ANTHROPIC_API_KEY (ANTHROPIC_BASE_URL est respectée par le SDK).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PRODUCTION'))
+
+from automation.claude_agent import ClaudeAgent, PROCESSING_MODES
+
+SAMPLE_MESSAGES = [
+    ("Retard de livraison", "Bonjour, ma commande #1003 a un retard de livraison. Quand vais-je la recevoir ?"),
+    ("Remboursement", "Je souhaite obtenir un remboursement pour ma commande #1001, je ne suis pas satisfaite du produit."),
+    ("Produit défectueux", "Le produit de ma commande #1002 est arrivé cassé et défectueux."),
+    ("Information commande", "Pouvez-vous me donner des informations sur le statut de ma commande #1004 ?"),
+    ("Réclamation", "C'est la troisième fois que je vous écris, personne ne me répond. Je suis très mécontent !"),
+]
+
+SAMPLE_CONTEXT = {
+    "client": {"prenom": "Camille", "nom": "Martin", "email": "camille.martin@email.com", "type": "premium"},
+    "nb_commandes": 2,
+    "total_depense": 189.9,
+    "commandes": [
+        {"id": "CMD-20250101120000-01", "montant": 89.9, "statut": "expediee", "produits": []},
+        {"id": "CMD-20241201120000-02", "montant": 100.0, "statut": "livree", "produits": []}
+    ]
+}
+
+
+def percentile(values, pct):
+    """Percentile par rang le plus proche"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_mode(agent, mode, runs, stream):
+    """Traite chaque message d'exemple `runs` fois et retourne les mesures"""
+    measures = []
+    for _ in range(runs):
+        for subject, message in SAMPLE_MESSAGES:
+            on_text = (lambda text: None) if stream else None
+            start = time.perf_counter()
+            result = agent.process_customer_message(SAMPLE_CONTEXT['client']['email'], message, subject,
+                                                    context=SAMPLE_CONTEXT, on_text=on_text, mode=mode)
+            duration = time.perf_counter() - start
+            if result.get('error'):
+                print(f"   ❌ {subject}: {result['error']}")
+                continue
+            measures.append({
+                'duration': duration,
+                'effective_mode': result.get('processing_mode'),
+                **result.get('usage', {})
+            })
+    return measures
+
+
+def summarize(mode, measures):
+    if not measures:
+        print(f"⚠️ {mode}: aucune mesure")
+        return
+    durations = [m['duration'] * 1000 for m in measures]
+    per_message = lambda key: statistics.mean(m.get(key, 0) for m in measures)
+    fallbacks = sum(1 for m in measures if m['effective_mode'] != mode)
+
+    print(f"🔹 {mode} ({len(measures)} messages)")
+    print(f"   ⏱️  p50: {percentile(durations, 50):.0f} ms | p95: {percentile(durations, 95):.0f} ms")
+    print(f"   📞 Appels API / message: {per_message('api_calls'):.2f}")
+    print(f"   🔤 Tokens / message: {per_message('input_tokens'):.0f} en entrée, "
+          f"{per_message('output_tokens'):.0f} en sortie")
+    print(f"   🗄️  Cache de prompt / message: {per_message('cache_read_input_tokens'):.0f} tokens lus, "
+          f"{per_message('cache_creation_input_tokens'):.0f} écrits")
+    if fallbacks:
+        print(f"   ↩️  Retours au mode en deux appels: {fallbacks}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les modes de traitement de ClaudeAgent")
+    parser.add_argument('--runs', type=int, default=3, help="Passages sur les messages d'exemple")
+    parser.add_argument('--stream', action='store_true', help="Génération en streaming (comme l'interface web)")
+    parser.add_argument('--modes', nargs='+', choices=PROCESSING_MODES, default=list(PROCESSING_MODES))
+    args = parser.parse_args()
+
+    print("📊 BENCHMARK DES MODES DE TRAITEMENT CLAUDE")
+    print("=" * 50)
+
+    agent = ClaudeAgent()
+    if not agent.is_ready:
+        print("❌ ClaudeAgent inactif (ANTHROPIC_API_KEY manquante ?)")
+        return 1
+
+    for mode in args.modes:
+        measures = run_mode(agent, mode, args.runs, args.stream)
+        summarize(mode, measures)
+        print("-" * 50)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Faux Serveur de l'API Anthropic (tests hors ligne)
+Implémente POST /v1/messages (texte ou appel d'outil imposé par tool_choice)
+et la Message Batches API (création, suivi, résultats JSONL) avec des réponses
+au format attendu par ClaudeAgent et des compteurs de prompt caching simulés,
+pour tester et mesurer sans clé ni coût : latence avant le premier token tirée
+d'une distribution, génération à débit de tokens fixe, erreurs injectées
+(429, 500, 529) et réponses prédéfinies chargées d'un fichier JSON. Les tirages
+sont reproductibles (--seed).
+
+Usage:
+    python DEVELOPMENT/fake_anthropic_server.py --port 8765 --batch-delay 5
+    python DEVELOPMENT/fake_anthropic_server.py --latency lognormal:0.8,0.5 \\
+        --tokens-per-second 60 --errors 529:0.02,429:0.01 --payloads payloads.json
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=test \\
+        python PRODUCTION/automation/batch_processor.py run --interval 1
+
+Fichier de réponses prédéfinies (la première entrée dont un mot-clé figure
+dans le message l'emporte sur les réponses par défaut) :
+    [{"keywords": ["colis"], "classification": {"category": "retard_livraison", ...},
+      "response": "Bonjour, ..."}]
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Classification renvoyée selon les mots-clés du message (premier trouvé)
+CANNED_CATEGORIES = [
+    (("rembours",), "remboursement", 3, "negatif"),
+    (("cassé", "defectueux", "défectueux", "abîmé"), "produit_defectueux", 4, "negatif"),
+    (("retard", "livraison", "colis"), "retard_livraison", 3, "neutre"),
+    (("mécontent", "inacceptable", "plainte"), "reclamation", 5, "tres_negatif"),
+    (("statut", "suivi", "commande"), "information_commande", 2, "neutre"),
+]
+
+# Le message client suit ce marqueur dans les prompts de ClaudeAgent
+MESSAGE_MARKER = "MESSAGE ORIGINAL DU CLIENT:"
+
+
+def _client_message(text):
+    if MESSAGE_MARKER in text:
+        text = text.split(MESSAGE_MARKER, 1)[1].split("\n", 1)[0]
+    return text.lower()
+
+
+def _payload(text, payloads):
+    """Réponse prédéfinie correspondant au message, ou None"""
+    lowered = _client_message(text)
+    for payload in payloads or ():
+        if any(keyword.lower() in lowered for keyword in payload.get("keywords", ())):
+            return payload
+    return None
+
+
+def canned_classification(text, payloads=()):
+    payload = _payload(text, payloads)
+    if payload and payload.get("classification"):
+        return dict(payload["classification"])
+    lowered = _client_message(text)
+    for keywords, category, urgency, sentiment in CANNED_CATEGORIES:
+        if any(keyword in lowered for keyword in keywords):
+            break
+    else:
+        category, urgency, sentiment = "autre", 2, "neutre"
+    return {
+        "category": category,
+        "urgency": urgency,
+        "sentiment": sentiment,
+        "key_elements": [],
+        "requires_human": urgency >= 5,
+        "confidence": 0.9
+    }
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content or [])
+
+
+class PromptCache:
+    """Préfixes système déjà vus (simulation du prompt caching : lecture si déjà écrit)"""
+
+    def __init__(self):
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def usage(self, system):
+        blocks = system if isinstance(system, list) else []
+        cached = "".join(block.get("text", "") for block in blocks if block.get("cache_control"))
+        if not cached:
+            return {"cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}, len(_text(system)) // 4
+        with self.lock:
+            hit = cached in self.seen
+            self.seen.add(cached)
+        tokens = len(cached) // 4
+        key = "cache_read_input_tokens" if hit else "cache_creation_input_tokens"
+        other = "cache_creation_input_tokens" if hit else "cache_read_input_tokens"
+        return {key: tokens, other: 0}, 0
+
+
+PROMPT_CACHE = PromptCache()
+
+
+def canned_message(params, payloads=()):
+    """
+    Message au format de l'API : classification seule, réponse seule ou sortie
+    du mode combiné selon la tâche indiquée dans le prompt
+    """
+    prompt = " ".join(_text(message["content"]) for message in params.get("messages", []))
+    classification = canned_classification(prompt, payloads)
+    payload = _payload(prompt, payloads)
+    reply = (payload or {}).get("response") or (
+        f"Bonjour, nous avons bien reçu votre message concernant votre demande "
+        f"({classification['category']}). Notre équipe s'en occupe et revient vers vous rapidement.")
+    tool_choice = params.get("tool_choice") or {}
+    if tool_choice.get("type") == "tool":
+        return _message(params, prompt, [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                                          "name": tool_choice["name"], "input": classification}],
+                        len(json.dumps(classification)), "tool_use")
+    if "ANALYSE uniquement" in prompt:
+        text = json.dumps(classification, ensure_ascii=False)
+    elif "RÉPONSE AU CLIENT uniquement" in prompt:
+        text = reply
+    else:
+        text = f"<classification>\n{json.dumps(classification, ensure_ascii=False)}\n</classification>\n{reply}"
+    return _message(params, prompt, [{"type": "text", "text": text}], len(text), "end_turn")
+
+
+def _message(params, prompt, content, output_chars, stop_reason):
+    cache_usage, system_tokens = PROMPT_CACHE.usage(params.get("system", ""))
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "claude-fake"),
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": max(1, (len(prompt) // 4) + system_tokens),
+                  "output_tokens": max(1, output_chars // 4), **cache_usage}
+    }
+
+
+def _timestamp(moment):
+    return moment.isoformat().replace("+00:00", "Z")
+
+
+class LatencyModel:
+    """Durée tirée d'une distribution : 'fixed:S', 'uniform:MIN,MAX' ou 'lognormal:MÉDIANE,SIGMA' (secondes)"""
+
+    def __init__(self, spec="fixed:0", rng=None):
+        kind, _, values = spec.partition(":")
+        self.kind = kind
+        self.values = [float(value) for value in values.split(",") if value] or [0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Distribution de latence inconnue: {spec}")
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        if self.kind == "uniform":
+            return self.rng.uniform(self.values[0], self.values[-1])
+        if self.kind == "lognormal":
+            sigma = self.values[1] if len(self.values) > 1 else 0.5
+            return self.rng.lognormvariate(math.log(max(self.values[0], 1e-6)), sigma)
+        return self.values[0]
+
+
+# Erreurs injectées sur /v1/messages, au format de l'API
+ERROR_TYPES = {
+    429: ("rate_limit_error", "Number of requests has exceeded your rate limit"),
+    500: ("api_error", "Internal server error"),
+    529: ("overloaded_error", "Overloaded")
+}
+
+
+def parse_errors(spec):
+    """'529:0.02,429:0.01' -> {529: 0.02, 429: 0.01}"""
+    errors = {}
+    for item in filter(None, (spec or "").split(",")):
+        status, _, rate = item.partition(":")
+        if int(status) not in ERROR_TYPES:
+            raise ValueError(f"Code d'erreur non simulé: {status} ({', '.join(map(str, ERROR_TYPES))})")
+        errors[int(status)] = float(rate)
+    return errors
+
+
+class FakeAnthropicState:
+    """
+    Lots en mémoire (un lot est terminé `batch_delay` secondes après sa création)
+    et comportement simulé des appels Messages
+    """
+
+    def __init__(self, batch_delay=2.0, error_rate=0.0, stream_delay=0.0, latency="fixed:0",
+                 tokens_per_second=0.0, errors=None, payloads=(), seed=None):
+        """
+        Args:
+            batch_delay: Secondes avant la fin d'un lot
+            error_rate: Part des requêtes d'un lot en erreur
+            stream_delay: Secondes entre deux fragments streamés (prioritaire sur tokens_per_second)
+            latency: Distribution du délai avant le premier token (voir LatencyModel)
+            tokens_per_second: Débit de génération simulé (0 : instantané)
+            errors: Taux d'erreur par code HTTP sur /v1/messages ({529: 0.02})
+            payloads: Réponses prédéfinies par mots-clés
+            seed: Graine des tirages (latences, erreurs) pour des mesures reproductibles
+        """
+        self.batch_delay = batch_delay
+        self.stream_delay = stream_delay
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self.errors = dict(errors or {})
+        self.payloads = list(payloads or ())
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "output_tokens": 0}
+
+    def draw(self):
+        """Tirage d'un appel Messages : (code d'erreur ou None, délai avant le premier token)"""
+        with self.lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            delay = self.latency.sample()
+            for status, rate in self.errors.items():
+                if roll < rate:
+                    self.stats["errors"] += 1
+                    return status, delay
+                roll -= rate
+        return None, delay
+
+    def generation_seconds(self, output_tokens):
+        """Durée de génération d'une sortie au débit simulé"""
+        with self.lock:
+            self.stats["output_tokens"] += output_tokens
+        return output_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def chunk_delay(self, chunk_chars):
+        if self.stream_delay:
+            return self.stream_delay
+        return (chunk_chars / 4) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def create_batch(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.batches[batch_id] = {
+                "created": datetime.now(timezone.utc),
+                "requests": requests
+            }
+        return batch_id
+
+    def batch_json(self, batch_id, base_url):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        created = batch["created"]
+        ended = datetime.now(timezone.utc) >= created + timedelta(seconds=self.batch_delay)
+        results = self.results(batch_id) if ended else []
+        succeeded = sum(1 for entry in results if entry["result"]["type"] == "succeeded")
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else len(batch["requests"]),
+                "succeeded": succeeded,
+                "errored": len(results) - succeeded,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": _timestamp(created),
+            "expires_at": _timestamp(created + timedelta(hours=24)),
+            "ended_at": _timestamp(created + timedelta(seconds=self.batch_delay)) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None
+        }
+
+    def results(self, batch_id):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return []
+        entries = []
+        for index, request in enumerate(batch["requests"]):
+            # Erreurs déterministes : un lot relu renvoie les mêmes résultats
+            if self.error_rate and (index * 0.618) % 1 < self.error_rate:
+                result = {"type": "errored",
+                          "error": {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}}
+            else:
+                result = {"type": "succeeded", "message": canned_message(request["params"], self.payloads)}
+            entries.append({"custom_id": request["custom_id"], "result": result})
+        return entries
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        @property
+        def base_url(self):
+            return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+        def _send(self, status, body, content_type="application/json"):
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _error(self, status):
+            error_type, text = ERROR_TYPES[status]
+            payload = json.dumps({"type": "error", "error": {"type": error_type, "message": text}}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if status == 429:
+                self.send_header("retry-after", "1")
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _not_found(self):
+            self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _stream(self, message, chunk_chars=12):
+            """Réponse en Server-Sent Events, au format du streaming de l'API Messages"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            text = message["content"][0]["text"]
+            usage = message["usage"]
+            start = dict(message, content=[], stop_reason=None, usage=dict(usage, output_tokens=1))
+            events = [
+                ("message_start", {"type": "message_start", "message": start}),
+                ("content_block_start", {"type": "content_block_start", "index": 0,
+                                         "content_block": {"type": "text", "text": ""}}),
+            ]
+            events += [
+                ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                         "delta": {"type": "text_delta", "text": text[i:i + chunk_chars]}})
+                for i in range(0, len(text), chunk_chars)
+            ]
+            events += [
+                ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                   "usage": {"output_tokens": usage["output_tokens"]}}),
+                ("message_stop", {"type": "message_stop"}),
+            ]
+            try:
+                for name, data in events:
+                    self.wfile.write(f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if name == "content_block_delta":
+                        delay = state.chunk_delay(len(data["delta"]["text"]))
+                        if delay:
+                            time.sleep(delay)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client parti (génération interrompue)
+                pass
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if path == "/v1/messages":
+                params = self._read_json()
+                status, delay = state.draw()
+                time.sleep(delay)
+                if status:
+                    return self._error(status)
+                message = canned_message(params, state.payloads)
+                generation = state.generation_seconds(message["usage"]["output_tokens"])
+                if params.get("stream"):
+                    with state.lock:
+                        state.stats["streamed"] += 1
+                    self._stream(message)
+                else:
+                    # Réponse non streamée : renvoyée une fois toute la sortie générée
+                    time.sleep(generation)
+                    self._send(200, message)
+            elif path == "/v1/messages/batches":
+                batch_id = state.create_batch(self._read_json().get("requests", []))
+                self._send(200, state.batch_json(batch_id, self.base_url))
+            else:
+                self._not_found()
+
+        def do_GET(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if parts[:3] != ["v1", "messages", "batches"] or len(parts) < 4:
+                return self._not_found()
+            batch = state.batch_json(parts[3], self.base_url)
+            if batch is None:
+                return self._not_found()
+            if len(parts) == 4:
+                return self._send(200, batch)
+            if parts[4] == "results" and batch["processing_status"] == "ended":
+                lines = "\n".join(json.dumps(entry, ensure_ascii=False) for entry in state.results(parts[3]))
+                return self._send(200, (lines + "\n").encode("utf-8"), "application/binary")
+            self._not_found()
+
+    return Handler
+
+
+def load_payloads(path):
+    """Réponses prédéfinies d'un fichier JSON (liste d'entrées keywords/classification/response)"""
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def serve(host="127.0.0.1", port=8765, batch_delay=2.0, error_rate=0.0, stream_delay=0.0, **behaviour):
+    """
+    Démarre le serveur dans un thread et le retourne (server.shutdown() pour l'arrêter,
+    server.state pour les compteurs). `behaviour` : latency, tokens_per_second, errors,
+    payloads, seed (voir FakeAnthropicState).
+    """
+    state = FakeAnthropicState(batch_delay, error_rate, stream_delay, **behaviour)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur de l'API Anthropic")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="Secondes avant la fin d'un lot")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part des requêtes d'un lot en erreur")
+    parser.add_argument("--stream-delay", type=float, default=0.0, help="Secondes entre deux fragments streamés")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Délai avant le premier token : fixed:S, uniform:MIN,MAX ou lognormal:MÉDIANE,SIGMA")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Débit de génération (0 : instantané)")
+    parser.add_argument("--errors", default="", help="Erreurs injectées par code HTTP, ex. 529:0.02,429:0.01")
+    parser.add_argument("--payloads", help="Fichier JSON de réponses prédéfinies")
+    parser.add_argument("--seed", type=int, default=None, help="Graine des tirages (mesures reproductibles)")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.batch_delay, args.error_rate, args.stream_delay,
+                   latency=args.latency, tokens_per_second=args.tokens_per_second,
+                   errors=parse_errors(args.errors), payloads=load_payloads(args.payloads), seed=args.seed)
+    print(f"🧪 Faux serveur Anthropic sur http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Budgets de temps d'import - Démarrage à froid de l'application web
+Mesure `python -X importtime` sur un processus neuf et vérifie que les SDK
+(anthropic, openai, notion_client) ne sont pas chargés à l'import.
+
+Usage: python DEVELOPMENT/import_budget.py [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+WEB_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PRODUCTION', 'web_app')
+
+# Temps cumulés maximum (ms) pour un import à froid
+BUDGETS_MS = {
+    'app': 600,
+    'automation.reveal_scheduler': 30,
+    'database.connection_pool': 30,
+    'config': 30
+}
+
+# Modules qui ne doivent jamais être chargés par `import app`
+FORBIDDEN_MODULES = ('anthropic', 'openai', 'notion_client')
+
+
+def measure_once():
+    """Importe app dans un processus neuf et retourne {module: cumul_ms}"""
+    env = dict(os.environ)
+    # Pas de clé : l'import ne doit de toute façon rien initialiser
+    env.pop('ANTHROPIC_API_KEY', None)
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=WEB_APP_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        try:
+            timings[name.strip()] = int(cumulative) / 1000
+        except ValueError:
+            continue  # ligne d'en-tête
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérifie les budgets d'import de l'application web")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print("⏱️ BUDGETS D'IMPORT - APPLICATION WEB")
+    print("=" * 50)
+
+    runs = []
+    wall = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        runs.append(measure_once())
+        wall.append((time.perf_counter() - start) * 1000)
+
+    failures = []
+
+    loaded = set().union(*runs)
+    for module in FORBIDDEN_MODULES:
+        if module in loaded:
+            failures.append(f"{module} chargé à l'import")
+            print(f"❌ {module}: chargé à l'import")
+        else:
+            print(f"✅ {module}: non chargé")
+
+    print("-" * 50)
+    for module, budget in BUDGETS_MS.items():
+        values = [run[module] for run in runs if module in run]
+        if not values:
+            print(f"⚠️ {module}: non importé")
+            continue
+        median = statistics.median(values)
+        ok = median <= budget
+        print(f"{'✅' if ok else '❌'} {module}: {median:.1f} ms (budget {budget} ms)")
+        if not ok:
+            failures.append(f"{module} {median:.1f} ms > {budget} ms")
+
+    print("-" * 50)
+    print(f"🚀 Processus complet (médiane): {statistics.median(wall):.1f} ms")
+
+    if failures:
+        print(f"\n❌ {len(failures)} budget(s) dépassé(s)")
+        return 1
+    print("\n✅ Tous les budgets sont respectés")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
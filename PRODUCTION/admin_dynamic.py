@@ -14,6 +14,10 @@ from flask import Flask, render_template_string, jsonify, request
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from database.client_context_cache import ensure_invalidation_table, record_invalidation
+from database.response_cache import read_response_cache_stats
+from automation.burst_detector import read_live_clusters
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'admin-dynamic-support-2024'
 
@@ -85,6 +89,9 @@ class DynamicAdminManager:
                         (nom, prix, stock, desc, cat)
                     )
             
+            # Invalidations du cache de contexte client de l'application web
+            ensure_invalidation_table(conn)
+            
             conn.commit()
             conn.close()
             print("✅ Base de données admin dynamique initialisée")
@@ -148,6 +155,9 @@ class DynamicAdminManager:
             except:
                 pass  # Si l'ancienne table n'existe pas, on continue
             
+            # Le contexte de ce client en cache côté application web est périmé
+            record_invalidation(conn, client_email)
+            
             conn.commit()
             conn.close()
             
@@ -214,6 +224,12 @@ class DynamicAdminManager:
             
             stats_jour = cursor.fetchone()
             
+            # Cache des réponses Claude (alimenté par l'application web)
+            response_cache = read_response_cache_stats(conn)
+            
+            # Rafales de messages similaires en cours (incidents)
+            incidents = read_live_clusters(conn)
+            
             conn.close()
             
             return {
@@ -229,6 +245,8 @@ class DynamicAdminManager:
                 },
                 'commandes_statut': commandes_statut,
                 'commandes_recentes': commandes_recentes,
+                'response_cache': response_cache,
+                'incidents': incidents,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -256,6 +274,12 @@ class DynamicAdminManager:
                 WHERE commande_id = ?
             ''', params)
             
+            # Le contexte de ce client en cache côté application web est périmé
+            cursor.execute("SELECT client_email FROM commandes_details WHERE commande_id = ?", (commande_id,))
+            row = cursor.fetchone()
+            if row:
+                record_invalidation(conn, row[0])
+            
             conn.commit()
             conn.close()
             return True
@@ -360,6 +384,9 @@ def dashboard():
                         <!-- Les stats seront injectées ici -->
                     </div>
                     
+                    <!-- Rafales de messages similaires (incidents en cours) -->
+                    <div id="incidents-container" class="mb-4"></div>
+                    
                     <!-- Navigation onglets -->
                     <ul class="nav nav-tabs" id="adminTabs" role="tablist">
                         <li class="nav-item" role="presentation">
@@ -547,6 +574,7 @@ def dashboard():
                 const response = await fetch('/api/dashboard-data');
                 dashboardData = await response.json();
                 updateStats();
+                updateIncidents();
                 updateCommandesTable();
             } catch (error) {
                 console.error('Erreur chargement dashboard:', error);
@@ -585,6 +613,7 @@ def dashboard():
         
         function updateStats() {
             const stats = dashboardData.stats || {};
+            const cache = dashboardData.response_cache || {};
             const statsHtml = `
                 <div class="col-md-3">
                     <div class="stat-card text-center">
@@ -618,10 +647,57 @@ def dashboard():
                         <small>Produits: ${stats.total_produits || 0}</small>
                     </div>
                 </div>
+                <div class="col-md-3">
+                    <div class="stat-card text-center">
+                        <i class="fas fa-bolt fa-2x mb-2"></i>
+                        <div class="stat-number">${cache.hit_ratio != null ? Math.round(cache.hit_ratio * 100) : 0}%</div>
+                        <div>Cache Réponses IA</div>
+                        <small>${cache.hits || 0} / ${cache.lookups || 0} consultations</small>
+                    </div>
+                </div>
+                <div class="col-md-3">
+                    <div class="stat-card text-center">
+                        <i class="fas fa-coins fa-2x mb-2"></i>
+                        <div class="stat-number">${(cache.tokens_saved || 0).toLocaleString('fr-FR')}</div>
+                        <div>Tokens Économisés</div>
+                        <small>Entrées en cache: ${cache.entries || 0}</small>
+                    </div>
+                </div>
             `;
             document.getElementById('stats-container').innerHTML = statsHtml;
         }
         
+        function escapeHtml(text) {
+            const div = document.createElement('div');
+            div.textContent = text || '';
+            return div.innerHTML;
+        }
+        
+        function updateIncidents() {
+            const incidents = dashboardData.incidents || [];
+            const container = document.getElementById('incidents-container');
+            if (incidents.length === 0) {
+                container.innerHTML = '';
+                return;
+            }
+            
+            container.innerHTML = `
+                <div class="alert alert-warning mb-0">
+                    <h5><i class="fas fa-exclamation-triangle"></i> Incidents en cours - messages similaires</h5>
+                    ${incidents.map(incident => `
+                        <div class="d-flex justify-content-between align-items-center border-top pt-2 mt-2">
+                            <span class="text-truncate me-3">${escapeHtml(incident.representative)}</span>
+                            <span class="text-nowrap">
+                                <span class="badge bg-secondary">${incident.category || 'en analyse'}</span>
+                                <span class="badge bg-danger">${incident.size} messages</span>
+                                <small class="text-muted ms-2">depuis ${new Date(incident.first_seen + 'Z').toLocaleTimeString('fr-FR')}</small>
+                            </span>
+                        </div>
+                    `).join('')}
+                </div>
+            `;
+        }
+        
         function updateCommandesTable() {
             const commandes = dashboardData.commandes_recentes || [];
             const tbody = document.getElementById('commandes-tbody');
@@ -40,7 +40,7 @@ class AdvancedSupportMonitoring:
                     client_name TEXT,
                     subject TEXT NOT NULL,
                     message TEXT NOT NULL,
-                    status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme')),
+                    status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme', 'erreur')),
                     category TEXT,
                     urgency INTEGER DEFAULT 1 CHECK (urgency BETWEEN 1 AND 5),
                     sentiment TEXT,
@@ -298,6 +298,7 @@ def dashboard():
         .status-en_cours { border-left: 4px solid #ffc107; }
         .status-traite { border-left: 4px solid #28a745; }
         .status-ferme { border-left: 4px solid #6c757d; }
+        .status-erreur { border-left: 4px solid #212529; }
         .client-list { max-height: 400px; overflow-y: auto; }
     </style>
 </head>
@@ -554,7 +555,8 @@ def dashboard():
                 'nouveau': 'danger',
                 'en_cours': 'warning',
                 'traite': 'success',
-                'ferme': 'secondary'
+                'ferme': 'secondary',
+                'erreur': 'dark'
             };
             return colors[status] || 'secondary';
         }
@@ -564,7 +566,8 @@ def dashboard():
                 'nouveau': 'Nouveau',
                 'en_cours': 'En cours',
                 'traite': 'Traité',
-                'ferme': 'Fermé'
+                'ferme': 'Fermé',
+                'erreur': 'Erreur'
             };
             return texts[status] || status;
         }
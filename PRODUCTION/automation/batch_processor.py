@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Traitement par Lots de l'Arriéré de Messages
+Quand l'interface web est arrêtée ou limitée, les messages 'nouveau' s'accumulent.
+Ce module les réclame par pages, les soumet en un seul lot à la Message Batches
+API (mode combiné : classification et réponse dans le même appel), puis applique
+tous les résultats en une transaction (executemany).
+
+Un message soumis reste 'en_cours' avec son batch_id : les workers web ne le
+reprennent pas. Un résultat en erreur, annulé ou expiré remet le message en 'nouveau'.
+
+Usage (depuis PRODUCTION/) :
+    python automation/batch_processor.py run        # soumet, attend et applique
+    python automation/batch_processor.py submit     # soumet seulement
+    python automation/batch_processor.py poll       # applique les lots terminés
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pytz
+
+PARIS_TZ = pytz.timezone('Europe/Paris')
+
+# Statuts d'un lot côté API
+BATCH_ENDED = 'ended'
+
+
+def ensure_batch_tables(conn):
+    """Crée la table des lots et la colonne messages.batch_id (base créée avant les lots)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_batches (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'in_progress',
+            request_count INTEGER DEFAULT 0,
+            succeeded INTEGER DEFAULT 0,
+            errored INTEGER DEFAULT 0,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ended_at DATETIME
+        )
+    ''')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+    if 'batch_id' not in columns:
+        conn.execute('ALTER TABLE messages ADD COLUMN batch_id TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_batch_id ON messages(batch_id)')
+
+
+def _custom_id(message_id: int) -> str:
+    return f"msg-{message_id}"
+
+
+def _message_id(custom_id: str) -> Optional[int]:
+    try:
+        return int(custom_id.split('-', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+class BacklogBatchProcessor:
+    """Soumission de l'arriéré 'nouveau' à la Message Batches API et application des résultats"""
+
+    def __init__(self, db_pool, agent, context_loader=None, page_size: int = 500,
+                 max_batch_size: int = 10000):
+        """
+        Args:
+            db_pool: Pool de connexions vers la base des messages
+            agent: ClaudeAgent prêt (client Anthropic et prompt du mode combiné)
+            context_loader: Fonction (conn, email) -> contexte client, par défaut read_client_context
+            page_size: Messages lus et réclamés par requête SQL
+            max_batch_size: Nombre maximum de messages par lot (l'API en accepte 100 000)
+        """
+        self.db_pool = db_pool
+        self.agent = agent
+        if context_loader is None:
+            from database.client_context_cache import read_client_context
+            context_loader = read_client_context
+        self.context_loader = context_loader
+        self.page_size = max(1, page_size)
+        self.max_batch_size = max(1, max_batch_size)
+
+        self.stats = {
+            'batches_submitted': 0,
+            'messages_submitted': 0,
+            'succeeded': 0,
+            'errored': 0,
+            'input_tokens': 0,
+            'output_tokens': 0
+        }
+
+    def ensure_tables(self):
+        with self.db_pool.connection() as conn:
+            ensure_batch_tables(conn)
+
+    @property
+    def batches(self):
+        return self.agent.client.messages.batches
+
+    def submit(self, limit: Optional[int] = None) -> Optional[str]:
+        """
+        Réclame les messages 'nouveau' par pages et les soumet en un seul lot
+
+        Returns:
+            Identifiant du lot, ou None si l'arriéré est vide
+        """
+        limit = min(limit or self.max_batch_size, self.max_batch_size)
+        # Identifiant provisoire : les messages sont réclamés avant de connaître celui de l'API
+        claim_id = f"pending-{os.getpid()}-{int(time.time() * 1000)}"
+
+        requests = []
+        contexts = {}
+        last_id = 0
+        while len(requests) < limit:
+            with self.db_pool.connection() as conn:
+                rows = conn.execute('''
+                    UPDATE messages SET status = 'en_cours', batch_id = ?, updated_at = ?
+                    WHERE id IN (
+                        SELECT id FROM messages
+                        WHERE status = 'nouveau' AND id > ?
+                        ORDER BY id LIMIT ?
+                    ) AND status = 'nouveau'
+                    RETURNING id, client_email, subject, message
+                ''', (claim_id, datetime.now(PARIS_TZ), last_id,
+                      min(self.page_size, limit - len(requests)))).fetchall()
+                if not rows:
+                    break
+
+                for row in sorted(rows, key=lambda r: r['id']):
+                    email = row['client_email']
+                    if email not in contexts:
+                        contexts[email] = self.context_loader(conn, email)
+                    requests.append({
+                        "custom_id": _custom_id(row['id']),
+                        "params": self.agent.batch_request(row['message'], row['subject'], contexts[email])
+                    })
+                last_id = max(row['id'] for row in rows)
+
+        if not requests:
+            print("✅ [Batch] Aucun message en attente")
+            return None
+
+        try:
+            batch = self.batches.create(requests=requests)
+        except Exception as e:
+            print(f"❌ [Batch] Erreur soumission du lot: {e}")
+            self._release_claim(claim_id)
+            raise
+
+        with self.db_pool.connection() as conn:
+            conn.execute('UPDATE messages SET batch_id = ? WHERE batch_id = ?', (batch.id, claim_id))
+            conn.execute('INSERT INTO message_batches (id, request_count) VALUES (?, ?)',
+                         (batch.id, len(requests)))
+
+        self.stats['batches_submitted'] += 1
+        self.stats['messages_submitted'] += len(requests)
+        print(f"📦 [Batch] Lot {batch.id} soumis: {len(requests)} messages")
+        return batch.id
+
+    def _release_claim(self, batch_id: str):
+        """Remet en 'nouveau' les messages encore rattachés à un lot"""
+        with self.db_pool.connection() as conn:
+            conn.execute('''
+                UPDATE messages SET status = 'nouveau', batch_id = NULL, updated_at = ?
+                WHERE batch_id = ? AND status = 'en_cours'
+            ''', (datetime.now(PARIS_TZ), batch_id))
+
+    def release_stale_claims(self, older_than_seconds: int = 3600) -> int:
+        """
+        Remet en 'nouveau' les messages réclamés par une soumission interrompue
+        (identifiant provisoire jamais remplacé par celui de l'API)
+
+        Returns:
+            Nombre de messages remis en attente
+        """
+        with self.db_pool.connection() as conn:
+            cursor = conn.execute('''
+                UPDATE messages SET status = 'nouveau', batch_id = NULL
+                WHERE batch_id LIKE 'pending-%' AND status = 'en_cours' AND updated_at < ?
+            ''', (datetime.fromtimestamp(time.time() - older_than_seconds, PARIS_TZ),))
+        if cursor.rowcount:
+            print(f"🔄 [Batch] {cursor.rowcount} messages d'une soumission interrompue remis en attente")
+        return cursor.rowcount
+
+    def pending_batches(self) -> List[str]:
+        """Lots soumis dont les résultats n'ont pas encore été appliqués"""
+        with self.db_pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id FROM message_batches WHERE status != ? ORDER BY created_at", (BATCH_ENDED,)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, int]]:
+        """
+        Applique les résultats d'un lot s'il est terminé
+
+        Returns:
+            {'succeeded', 'errored'} si le lot est terminé, sinon None
+        """
+        batch = self.batches.retrieve(batch_id)
+        if batch.processing_status != BATCH_ENDED:
+            counts = batch.request_counts
+            print(f"⏳ [Batch] Lot {batch_id}: {counts.processing} en cours, {counts.succeeded} réussis")
+            return None
+        return self.apply_results(batch_id)
+
+    def apply_results(self, batch_id: str) -> Dict[str, int]:
+        """Lit les résultats d'un lot terminé et met à jour tous ses messages en une transaction"""
+        with self.db_pool.connection() as conn:
+            rows = conn.execute('''
+                SELECT id, client_email, subject, message, created_at FROM messages
+                WHERE batch_id = ? AND status = 'en_cours'
+            ''', (batch_id,)).fetchall()
+            batch_row = conn.execute('SELECT created_at FROM message_batches WHERE id = ?',
+                                     (batch_id,)).fetchone()
+            messages = {row['id']: row for row in rows}
+            contexts = {email: self.context_loader(conn, email)
+                        for email in {row['client_email'] for row in rows}}
+
+        now = datetime.now(PARIS_TZ)
+        submitted_at = self._parse_timestamp(batch_row['created_at']) if batch_row else None
+        updates = []
+        input_tokens = output_tokens = 0
+
+        for entry in self.batches.results(batch_id):
+            message_id = _message_id(entry.custom_id)
+            row = messages.pop(message_id, None)
+            if row is None or entry.result.type != 'succeeded':
+                if row is not None:
+                    messages[message_id] = row   # Remis en 'nouveau' ci-dessous
+                continue
+
+            result = self.agent.batch_result(row['client_email'], row['subject'], row['message'],
+                                             entry.result.message, contexts[row['client_email']])
+            input_tokens += result['usage']['input_tokens']
+            output_tokens += result['usage']['output_tokens']
+            if result.get('error'):
+                messages[message_id] = row
+                continue
+
+            updates.append((
+                result['category'], result['urgency'], result['sentiment'], result['response'],
+                (now - submitted_at).total_seconds() if submitted_at else 0,
+                result['quality_score'], result['model'], result['classified_by'], now, now, message_id
+            ))
+
+        # Erreurs, annulations, expirations et sorties inexploitables : retour dans l'arriéré
+        failed = [(now, message_id) for message_id in messages]
+
+        with self.db_pool.connection() as conn:
+            conn.executemany('''
+                UPDATE messages SET
+                    status = 'traite', category = ?, urgency = ?, sentiment = ?, response = ?,
+                    response_time = ?, quality_score = ?, model_used = ?, classified_by = ?,
+                    processed_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', updates)
+            conn.executemany('''
+                UPDATE messages SET status = 'nouveau', batch_id = NULL, updated_at = ?
+                WHERE id = ? AND status = 'en_cours'
+            ''', failed)
+            conn.execute('''
+                UPDATE message_batches SET status = ?, succeeded = ?, errored = ?,
+                    input_tokens = ?, output_tokens = ?, ended_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (BATCH_ENDED, len(updates), len(failed), input_tokens, output_tokens, batch_id))
+
+        self.stats['succeeded'] += len(updates)
+        self.stats['errored'] += len(failed)
+        self.stats['input_tokens'] += input_tokens
+        self.stats['output_tokens'] += output_tokens
+        print(f"✅ [Batch] Lot {batch_id} appliqué: {len(updates)} traités, {len(failed)} remis en attente")
+        return {'succeeded': len(updates), 'errored': len(failed)}
+
+    @staticmethod
+    def _parse_timestamp(value) -> Optional[datetime]:
+        """created_at SQLite (UTC, sans fuseau) converti en datetime comparable"""
+        try:
+            return pytz.utc.localize(datetime.strptime(str(value)[:19], '%Y-%m-%d %H:%M:%S'))
+        except ValueError:
+            return None
+
+    def run(self, limit: Optional[int] = None, interval: float = 60.0) -> Dict[str, Any]:
+        """Applique les lots en attente, soumet l'arriéré puis attend la fin de tous les lots"""
+        self.ensure_tables()
+        self.release_stale_claims()
+        self.submit(limit)
+        pending = self.pending_batches()
+        while pending:
+            pending = [batch_id for batch_id in pending if self.poll(batch_id) is None]
+            if pending:
+                time.sleep(interval)
+        return self.get_status()
+
+    def get_status(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+def main():
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from dotenv import load_dotenv
+    from config import DB_POOL_CONFIG, BATCH_CONFIG, ROUTING_CONFIG
+    from database.connection_pool import SQLiteConnectionPool
+    from automation.claude_agent import ClaudeAgent
+    from automation.model_router import ModelRouter
+
+    parser = argparse.ArgumentParser(description="Traitement par lots des messages en attente")
+    parser.add_argument('command', choices=('run', 'submit', 'poll'))
+    parser.add_argument('--limit', type=int, default=None, help="Nombre maximum de messages soumis")
+    parser.add_argument('--interval', type=float, default=BATCH_CONFIG['poll_interval'],
+                        help="Secondes entre deux vérifications d'un lot")
+    args = parser.parse_args()
+    load_dotenv()
+
+    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crm_ecommerce.db')
+    db_pool = SQLiteConnectionPool(db_path, pragmas={'busy_timeout': DB_POOL_CONFIG['busy_timeout_ms']})
+    agent = ClaudeAgent(router=ModelRouter(**ROUTING_CONFIG))
+    if not agent.is_ready:
+        print("❌ ClaudeAgent inactif (ANTHROPIC_API_KEY manquante ?)")
+        return 1
+
+    processor = BacklogBatchProcessor(db_pool, agent,
+                                      page_size=BATCH_CONFIG['page_size'],
+                                      max_batch_size=BATCH_CONFIG['max_batch_size'])
+    processor.ensure_tables()
+    processor.release_stale_claims()
+    if args.command == 'submit':
+        processor.submit(args.limit)
+    elif args.command == 'poll':
+        for batch_id in processor.pending_batches():
+            processor.poll(batch_id)
+    else:
+        processor.run(args.limit, args.interval)
+    print(f"📊 [Batch] {processor.get_status()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Détection des Rafales de Messages Quasi Identiques
+Chaque message reçoit une signature MinHash de ses mots et paires de mots ; les
+messages dont la similarité de Jaccard estimée dépasse un seuil sont regroupés
+dans un même cluster. Les candidats sont retrouvés par LSH (8 bandes de 4
+valeurs) au lieu d'une comparaison avec tous les clusters. Un cluster est
+classifié une seule fois, ses membres suivants réutilisent cette classification.
+(SimHash a été écarté : sur des messages courts, un seul mot modifié déplace
+trop de bits de l'empreinte.)
+"""
+
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from database.response_cache import ORDER_REF_PATTERN, normalize_text
+
+NUM_HASHES = 32
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Permutations (a*x + b mod p) fixes : les signatures restent comparables entre redémarrages
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_HASHES)]
+
+# Champs de classification réutilisables pour un autre membre du cluster
+SHARED_CLASSIFICATION_FIELDS = ('category', 'urgency', 'sentiment', 'requires_human', 'confidence')
+
+
+def ensure_cluster_tables(conn):
+    """Crée la table des clusters (lue par l'interface admin)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_clusters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            representative TEXT NOT NULL,
+            size INTEGER DEFAULT 0,
+            category TEXT,
+            first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_message_clusters_last_seen ON message_clusters(last_seen)')
+
+
+def read_live_clusters(conn, window_seconds: int = 1800, limit: int = 10) -> List[Dict[str, Any]]:
+    """Clusters actifs sur la fenêtre, les plus gros d'abord (interface admin)"""
+    try:
+        rows = conn.execute('''
+            SELECT id, representative, size, category, first_seen, last_seen
+            FROM message_clusters
+            WHERE last_seen >= datetime('now', ?)
+            ORDER BY size DESC, last_seen DESC
+            LIMIT ?
+        ''', (f'-{int(window_seconds)} seconds', limit)).fetchall()
+    except Exception:
+        # Table pas encore créée par l'application web
+        return []
+    columns = ('id', 'representative', 'size', 'category', 'first_seen', 'last_seen')
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def minhash(text: str) -> Optional[tuple]:
+    """
+    Signature MinHash d'un texte (mots et paires de mots, références de commande neutralisées)
+
+    Returns:
+        NUM_HASHES valeurs, ou None si le texte est trop court pour être comparé
+    """
+    tokens = normalize_text(ORDER_REF_PATTERN.sub(' ref ', text)).split()
+    if len(tokens) < 4:
+        return None
+    features = set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+    values = [
+        int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for feature in features
+    ]
+    return tuple(
+        min((a * value + b) % MERSENNE_PRIME for value in values)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(signature_a: tuple, signature_b: tuple) -> float:
+    """Similarité de Jaccard estimée entre deux signatures"""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_HASHES
+
+
+def _bands(signature: tuple):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+class _Cluster:
+    def __init__(self, local_id: int, signature: tuple, representative: str):
+        self.local_id = local_id
+        self.signature = signature
+        self.representative = representative
+        self.size = 0
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.message_ids = []
+        self.classification = None
+        self.db_id = None
+
+
+class BurstDetector:
+    """Regroupement en continu des messages quasi identiques (MinHash + LSH)"""
+
+    def __init__(self, db_pool=None, threshold: float = 0.6, window_seconds: float = 1800,
+                 min_burst_size: int = 3, max_clusters: int = 5000):
+        """
+        Args:
+            db_pool: Pool de connexions (persistance des rafales pour l'interface admin), optionnel
+            threshold: Similarité de Jaccard estimée minimale avec le premier message du cluster
+            window_seconds: Un cluster sans nouveau message depuis cette durée est oublié
+            min_burst_size: Taille à partir de laquelle un cluster est signalé comme rafale
+            max_clusters: Nombre maximum de clusters suivis en mémoire
+        """
+        self.db_pool = db_pool
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.min_burst_size = max(2, min_burst_size)
+        self.max_clusters = max_clusters
+
+        self._lock = threading.Lock()
+        self._clusters = OrderedDict()   # local_id -> _Cluster, du moins au plus récemment actif
+        self._buckets = {}               # (bande, valeur) -> {local_id}
+        self._message_clusters = {}      # message_id -> local_id
+        self._next_id = 1
+
+        self.stats = {
+            'messages': 0,
+            'clustered': 0,
+            'bursts': 0,
+            'classifications_reused': 0
+        }
+
+    def ensure_table(self):
+        if not self.db_pool:
+            return
+        with self.db_pool.connection() as conn:
+            ensure_cluster_tables(conn)
+
+    def add(self, message_id: int, text: str) -> Optional[int]:
+        """
+        Rattache un message enregistré à un cluster (existant ou nouveau)
+
+        Returns:
+            Identifiant en base du cluster si c'est une rafale, sinon None
+        """
+        signature = minhash(text)
+        now = time.time()
+        with self._lock:
+            self.stats['messages'] += 1
+            self._expire(now)
+            if signature is None:
+                return None
+
+            cluster = self._find(signature)
+            if cluster is None:
+                cluster = _Cluster(self._next_id, signature, text[:300])
+                self._next_id += 1
+                self._clusters[cluster.local_id] = cluster
+                for band in _bands(signature):
+                    self._buckets.setdefault(band, set()).add(cluster.local_id)
+            else:
+                self.stats['clustered'] += 1
+                self._clusters.move_to_end(cluster.local_id)
+
+            cluster.size += 1
+            cluster.last_seen = now
+            self._message_clusters[message_id] = cluster.local_id
+            cluster.message_ids.append(message_id)
+
+            is_burst = cluster.size >= self.min_burst_size
+            new_burst = cluster.size == self.min_burst_size
+            if new_burst:
+                self.stats['bursts'] += 1
+                print(f"🚨 Rafale détectée: {cluster.size} messages similaires - \"{cluster.representative[:80]}\"")
+            snapshot = (cluster.local_id, cluster.representative, cluster.size,
+                        (cluster.classification or {}).get('category'),
+                        list(cluster.message_ids) if new_burst else [message_id], cluster.db_id, new_burst)
+
+        if not is_burst or not self.db_pool:
+            return None
+        return self._persist(snapshot)
+
+    def _find(self, signature: tuple) -> Optional[_Cluster]:
+        """Cluster le plus proche parmi les candidats LSH (verrou tenu)"""
+        best, best_similarity = None, self.threshold
+        candidates = set()
+        for band in _bands(signature):
+            candidates |= self._buckets.get(band, set())
+        for local_id in candidates:
+            cluster = self._clusters[local_id]
+            score = similarity(cluster.signature, signature)
+            if score >= best_similarity:
+                best, best_similarity = cluster, score
+        return best
+
+    def _expire(self, now: float):
+        """Oublie les clusters inactifs et les plus anciens au-delà du maximum (verrou tenu)"""
+        while self._clusters:
+            local_id, cluster = next(iter(self._clusters.items()))
+            if now - cluster.last_seen <= self.window_seconds and len(self._clusters) < self.max_clusters:
+                break
+            del self._clusters[local_id]
+            for band in _bands(cluster.signature):
+                bucket = self._buckets.get(band)
+                if bucket:
+                    bucket.discard(local_id)
+                    if not bucket:
+                        del self._buckets[band]
+            for message_id in cluster.message_ids:
+                self._message_clusters.pop(message_id, None)
+
+    def _persist(self, snapshot) -> Optional[int]:
+        """Enregistre la rafale et rattache ses messages (table messages.cluster_id)"""
+        local_id, representative, size, category, linked, db_id, new_burst = snapshot
+        if db_id is None and not new_burst:
+            # Rafale en cours d'enregistrement par un autre thread
+            return None
+        try:
+            with self.db_pool.connection() as conn:
+                if db_id is None:
+                    db_id = conn.execute(
+                        'INSERT INTO message_clusters (representative, size, category) VALUES (?, ?, ?)',
+                        (representative, size, category)
+                    ).lastrowid
+                    with self._lock:
+                        cluster = self._clusters.get(local_id)
+                        if cluster is not None:
+                            cluster.db_id = db_id
+                else:
+                    conn.execute(
+                        'UPDATE message_clusters SET size = ?, last_seen = CURRENT_TIMESTAMP WHERE id = ?',
+                        (size, db_id)
+                    )
+                # Les premiers membres sont rattachés quand le cluster devient une rafale
+                conn.executemany('UPDATE messages SET cluster_id = ? WHERE id = ?',
+                                 [(db_id, member) for member in linked])
+            return db_id
+        except Exception as e:
+            print(f"⚠️ Erreur enregistrement rafale: {e}")
+            return None
+
+    def classification_for(self, message_id: int) -> Optional[Dict[str, Any]]:
+        """Classification déjà obtenue pour le cluster du message (à réutiliser), ou None"""
+        with self._lock:
+            cluster = self._clusters.get(self._message_clusters.get(message_id))
+            if cluster is None or cluster.classification is None:
+                return None
+            self.stats['classifications_reused'] += 1
+            return dict(cluster.classification, key_elements=[])
+
+    def record_classification(self, message_id: int, classification: Dict[str, Any]):
+        """Mémorise la classification d'un message pour les autres membres de son cluster"""
+        shared = {field: classification.get(field) for field in SHARED_CLASSIFICATION_FIELDS
+                  if classification.get(field) is not None}
+        if not shared.get('category'):
+            return
+        with self._lock:
+            cluster = self._clusters.get(self._message_clusters.get(message_id))
+            if cluster is None or cluster.classification is not None:
+                return
+            cluster.classification = shared
+            db_id = cluster.db_id
+
+        if db_id and self.db_pool:
+            try:
+                with self.db_pool.connection() as conn:
+                    conn.execute('UPDATE message_clusters SET category = ? WHERE id = ?',
+                                 (shared['category'], db_id))
+            except Exception as e:
+                print(f"⚠️ Erreur mise à jour rafale: {e}")
+
+    def live_clusters(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Rafales en cours (taille >= min_burst_size), les plus grosses d'abord"""
+        now = time.time()
+        with self._lock:
+            bursts = [
+                cluster for cluster in self._clusters.values()
+                if cluster.size >= self.min_burst_size and now - cluster.last_seen <= self.window_seconds
+            ]
+            bursts.sort(key=lambda cluster: cluster.size, reverse=True)
+            return [{
+                'id': cluster.db_id,
+                'representative': cluster.representative,
+                'size': cluster.size,
+                'category': (cluster.classification or {}).get('category'),
+                'age_seconds': round(now - cluster.first_seen),
+                'idle_seconds': round(now - cluster.last_seen)
+            } for cluster in bursts[:limit]]
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les métriques de détection et les rafales en cours"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['tracked_clusters'] = len(self._clusters)
+        stats['live_bursts'] = self.live_clusters()
+        return stats
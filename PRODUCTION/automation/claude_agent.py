@@ -7,34 +7,219 @@ Utilise l'API Claude d'Anthropic pour la classification et génération de répo
 
 import os
 import json
+import asyncio
+import threading
+import time
+import importlib.util
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Any, Callable, Dict, Optional
 import logging
 from dotenv import load_dotenv
 
+from automation.token_budget import (TokenBudgeter, ORDER_CATEGORIES,
+                                     CLASSIFICATION_CALL, RESPONSE_CALL, COMBINED_CALL)
+from automation.resilience import ResilientCaller
+from automation.model_router import ModelRouter
+from automation.keyword_classifier import get_keyword_classifier
+from automation.structured_output import (CLASSIFICATION_TOOL, CLASSIFICATION_TOOL_NAME,
+                                          classification_from_response, extract_json_object,
+                                          normalize_classification)
+
 # Charger les variables d'environnement
 load_dotenv()
 
-try:
-    import anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+# Le SDK n'est importé qu'à la création d'un agent configuré (import coûteux)
+ANTHROPIC_AVAILABLE = importlib.util.find_spec('anthropic') is not None
+if not ANTHROPIC_AVAILABLE:
     print("⚠️ Module anthropic non disponible. Installation: pip install anthropic")
 
+# Modèles utilisés pour chaque étape sans routage (voir automation.model_router)
+CLASSIFICATION_MODEL = "claude-3-sonnet-20240229"
+RESPONSE_MODEL = "claude-3-5-sonnet-20240620"
+
+# Modes de traitement : un seul appel (classification + réponse), deux appels successifs,
+# ou deux appels en parallèle (réponse spéculative sur la classification locale).
+# Deux appels successifs par défaut ; les autres modes sont choisis par requête ou
+# par CLAUDE_PROCESSING_MODE
+COMBINED_MODE = "combined"
+TWO_STEP_MODE = "two_step"
+SPECULATIVE_MODE = "speculative"
+PROCESSING_MODES = (COMBINED_MODE, TWO_STEP_MODE, SPECULATIVE_MODE)
+DEFAULT_PROCESSING_MODE = os.getenv('CLAUDE_PROCESSING_MODE', TWO_STEP_MODE)
+
+# Balise qui sépare la classification JSON de la réponse en mode combiné
+CLASSIFICATION_END_TAG = "</classification>"
+
+# Prompt caching : le préfixe système, identique pour tous les messages, est mis en
+# cache par l'API ; seule la partie propre au message est retraitée à chaque appel.
+# Minimum cachable : 1024 tokens sur Sonnet, 2048 sur Haiku (non mis en cache avec ce préfixe)
+PROMPT_CACHING = os.getenv('CLAUDE_PROMPT_CACHING', 'true').lower() in ('1', 'true', 'yes')
+
+# Classification par un outil au schéma imposé (champs typés) plutôt que par du JSON en texte libre
+CLASSIFICATION_TOOL_USE = os.getenv('CLAUDE_CLASSIFICATION_TOOL', 'true').lower() in ('1', 'true', 'yes')
+
+# Approche de la réponse selon la catégorie du message
+CATEGORY_INSTRUCTIONS = {
+    "retard_livraison": "Excuses sincères, explication des démarches entreprises, délai de résolution",
+    "remboursement": "Compréhension, processus de remboursement, délais",
+    "produit_defectueux": "Excuses, solution de remplacement immédiate, geste commercial",
+    "information_commande": "Informations précises, transparence, suivi",
+    "reclamation": "Écoute active, prise en charge personnalisée, solution",
+    "autre": "Réponse personnalisée selon le contexte"
+}
+
+
+class _CombinedOutput:
+    """
+    Découpe la sortie du mode combiné : classification JSON puis réponse client.
+    En streaming, seule la réponse est transmise, une fois la classification validée.
+    """
+    
+    def __init__(self, on_text: Optional[Callable[[str], None]] = None):
+        self.on_text = on_text
+        self.buffer = ""
+        self.classification = None
+        self.failed = False
+        self.emitted = False
+        self.parts = []
+    
+    def feed(self, text: str):
+        if self.failed:
+            return
+        if self.classification is not None:
+            self._emit(text)
+            return
+        
+        self.buffer += text
+        end = self.buffer.find(CLASSIFICATION_END_TAG)
+        if end == -1:
+            return
+        
+        try:
+            self.classification = normalize_classification(extract_json_object(self.buffer[:end]))
+        except ValueError:
+            self.classification = None
+            self.failed = True
+            return
+        self._emit(self.buffer[end + len(CLASSIFICATION_END_TAG):].lstrip())
+    
+    def _emit(self, text: str):
+        if not text:
+            return
+        self.parts.append(text)
+        if self.on_text:
+            self.emitted = True
+            self.on_text(text)
+    
+    @property
+    def response(self) -> str:
+        return "".join(self.parts).strip()
+    
+    @property
+    def complete(self) -> bool:
+        return self.classification is not None and bool(self.response)
+
+class _SpeculativeStream:
+    """
+    Tampon de la réponse générée sur la classification locale : rien n'est transmis
+    au client avant que la classification Claude confirme la catégorie.
+    """
+    
+    def __init__(self, on_text: Optional[Callable[[str], None]] = None):
+        self.on_text = on_text
+        self.lock = threading.Lock()
+        self.pending = []
+        self.accepted = False
+        self.rejected = False
+    
+    def feed(self, text: str):
+        with self.lock:
+            if self.rejected:
+                return
+            if not self.accepted:
+                self.pending.append(text)
+            elif self.on_text:
+                self.on_text(text)
+    
+    def resolve(self, agree: bool):
+        """Diffuse le texte en attente si la catégorie est confirmée, sinon l'abandonne"""
+        with self.lock:
+            if agree:
+                self.accepted = True
+                if self.on_text:
+                    for text in self.pending:
+                        self.on_text(text)
+            else:
+                self.rejected = True
+            self.pending = []
+    
+    def should_stop(self) -> bool:
+        return self.rejected
+
 class ClaudeAgent:
     """Agent Claude pour le traitement intelligent des messages client"""
     
-    def __init__(self, api_key: Optional[str] = None, db_manager=None):
+    def __init__(self, api_key: Optional[str] = None, db_manager=None, response_cache=None,
+                 token_budget: Optional[TokenBudgeter] = None, resilience: Optional[ResilientCaller] = None,
+                 router: Optional[ModelRouter] = None, base_url: Optional[str] = None,
+                 local_classifier=None, local_threshold: float = 0.9, local_audit_rate: float = 0.05):
         """
         Initialise l'agent Claude
+        
+        Args:
+            api_key: Clé API Anthropic (ANTHROPIC_API_KEY par défaut)
+            db_manager: Gestionnaire de base de données
+            response_cache: Cache des classifications et réponses (database.response_cache), optionnel
+            token_budget: Plafonds max_tokens adaptatifs et compactage du contexte (automation.token_budget)
+            resilience: Délais, disjoncteur et requêtes couvertes des appels (automation.resilience)
+            router: Choix du modèle par message (automation.model_router) ; sans routeur,
+                CLASSIFICATION_MODEL et RESPONSE_MODEL pour tous les messages
+            base_url: URL de l'API Messages (ANTHROPIC_BASE_URL par défaut, ex. le faux
+                serveur DEVELOPMENT/fake_anthropic_server.py pour les tests hors ligne)
+            local_classifier: Classifieur appris sur les classifications Claude
+                (automation.local_classifier.LocalClassifier), optionnel
+            local_threshold: Confiance à partir de laquelle la classification locale
+                remplace l'appel de classification
+            local_audit_rate: Part des messages classifiés localement avec confiance
+                qui sont tout de même classifiés par Claude (mesure de la concordance)
         """
         print("🤖 [ClaudeAgent] Initialisation en cours...")
         self.db_manager = db_manager
+        self.response_cache = response_cache
+        self.token_budget = token_budget or TokenBudgeter()
+        # Disjoncteur ouvert : les appels échouent immédiatement et les réponses de secours sont utilisées
+        self.resilience = resilience or ResilientCaller()
+        self.router = router or ModelRouter(RESPONSE_MODEL, RESPONSE_MODEL, CLASSIFICATION_MODEL, enabled=False)
+        self.local_classifier = local_classifier
+        self.local_threshold = local_threshold
+        self.local_audit_rate = local_audit_rate
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+        self.base_url = base_url or os.getenv('ANTHROPIC_BASE_URL') or None
         self.client = None
+        self._async_client = None
         self.is_ready = False
         
+        # Classifications lancées en parallèle de la génération spéculative
+        self._speculation_executor = None
+        self.speculation_stats = {'speculations': 0, 'hits': 0, 'misses': 0, 'latency_saved_ms': 0.0}
+        
+        # Origine des classifications Claude et appels payés perdus sur une sortie inexploitable
+        self.structured_stats = {'tool_use': 0, 'text': 0, 'wasted_classification': 0, 'wasted_combined': 0}
+        
+        # Classifications locales utilisées sans appel, et concordance avec Claude
+        # (toutes les classifications Claude, et celles des messages audités)
+        self.local_stats = {'decisions': 0, 'compared': 0, 'agreements': 0, 'audits': 0, 'audit_agreements': 0}
+        
+        # Appels et tokens consommés par mode de traitement
+        self._stats_lock = threading.Lock()
+        self.mode_stats = {
+            mode: {'messages': 0, 'api_calls': 0, 'cache_hits': 0, 'input_tokens': 0, 'output_tokens': 0,
+                   'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0, 'fallbacks': 0}
+            for mode in PROCESSING_MODES
+        }
+        
         if not ANTHROPIC_AVAILABLE:
             print("❌ [ClaudeAgent] Librairie 'anthropic' non trouvée. Agent inactif.")
             return
@@ -44,9 +229,12 @@ class ClaudeAgent:
             return
         
         print("🔑 [ClaudeAgent] Clé API trouvée.")
+        if self.base_url:
+            print(f"🌐 [ClaudeAgent] API Anthropic: {self.base_url}")
 
         try:
-            self.client = anthropic.Anthropic(api_key=self.api_key)
+            import anthropic
+            self.client = anthropic.Anthropic(api_key=self.api_key, base_url=self.base_url)
             self.is_ready = True
             print("✅ [ClaudeAgent] Initialisation réussie. Agent prêt.")
         except Exception as e:
@@ -54,11 +242,20 @@ class ClaudeAgent:
             self.client = None
             self.is_ready = False
     
+    @property
+    def async_client(self):
+        """Client asynchrone (créé au premier usage, dans la boucle du serveur ASGI)"""
+        if self._async_client is None and self.is_ready:
+            import anthropic
+            self._async_client = anthropic.AsyncAnthropic(api_key=self.api_key, base_url=self.base_url)
+        return self._async_client
+    
     def get_customer_context(self, email: str) -> Dict[str, Any]:
         """Récupère le contexte client depuis la base de données (DÉSACTIVÉ)"""
         return {}
     
-    def classify_message(self, message: str, subject: str = "", customer_context: Dict = None) -> Dict[str, Any]:
+    def classify_message(self, message: str, subject: str = "", customer_context: Dict = None,
+                         usage: Dict = None) -> Dict[str, Any]:
         """
         Classifie un message client avec Claude
         
@@ -66,19 +263,172 @@ class ClaudeAgent:
             message: Message du client
             subject: Sujet du message
             customer_context: Contexte client (commandes, historique)
+            usage: Compteurs d'appels et de tokens à incrémenter (optionnel)
             
         Returns:
             Dict avec la classification et les détails
         """
+        local = self._local_classification(message, subject, customer_context)
+        if local:
+            return local
+        if not self.is_ready:
+            return self._fallback_classification(message)
+        
+        cached = self._cache_call('get_classification', message, subject, customer_context)
+        if cached:
+            return self._cached_classification(cached, customer_context, usage)
+            
+        try:
+            # Appel à l'API Claude
+            request = self._classification_request(message, subject, customer_context)
+            response = self.resilience.call(CLASSIFICATION_CALL, self.client.messages.create, request)
+            call_usage = self._add_usage(usage, response)
+            self._record_call(CLASSIFICATION_CALL, request, response, call_usage)
+            
+            classification = self._parse_classification(response, customer_context,
+                                                         self._response_model(request, response))
+            self._compare_local(message, subject, classification)
+            self._cache_call('put_classification', message, subject, customer_context, classification, call_usage)
+            return classification
+            
+        except ValueError as e:
+            print(f"Erreur parsing classification Claude: {e}")
+            return self._fallback_classification(message)
+        except Exception as e:
+            print(f"Erreur classification Claude: {e}")
+            return self._fallback_classification(message)
+    
+    async def aclassify_message(self, message: str, subject: str = "", customer_context: Dict = None,
+                                usage: Dict = None) -> Dict[str, Any]:
+        """Version asynchrone de classify_message (client AsyncAnthropic)"""
+        local = self._local_classification(message, subject, customer_context)
+        if local:
+            return local
         if not self.is_ready:
             return self._fallback_classification(message)
+        
+        cached = await self._acache_call('get_classification', message, subject, customer_context)
+        if cached:
+            return self._cached_classification(cached, customer_context, usage)
             
         try:
-            # Préparer le contexte
-            context_str = ""
-            if customer_context and customer_context.get("client"):
-                client = customer_context["client"]
-                context_str = f"""
+            request = self._classification_request(message, subject, customer_context)
+            response = await self.resilience.acall(CLASSIFICATION_CALL, self.async_client.messages.create, request)
+            call_usage = self._add_usage(usage, response)
+            self._record_call(CLASSIFICATION_CALL, request, response, call_usage)
+            
+            classification = self._parse_classification(response, customer_context,
+                                                         self._response_model(request, response))
+            self._compare_local(message, subject, classification)
+            await self._acache_call('put_classification', message, subject, customer_context,
+                                    classification, call_usage)
+            return classification
+            
+        except ValueError as e:
+            print(f"Erreur parsing classification Claude: {e}")
+            return self._fallback_classification(message)
+        except Exception as e:
+            print(f"Erreur classification Claude: {e}")
+            return self._fallback_classification(message)
+    
+    @classmethod
+    def _system_prefix(cls) -> str:
+        """
+        Instructions statiques communes à tous les appels (catégories, contraintes,
+        exemples). Le texte ne doit dépendre d'aucun message : c'est lui qui est mis en cache.
+        """
+        category_lines = "\n".join(f"- {category}: {instruction}"
+                                    for category, instruction in CATEGORY_INSTRUCTIONS.items())
+        return f"""Tu es un expert en support client e-commerce français. Selon la tâche demandée dans le message, tu analyses la demande d'un client, tu y réponds de façon UNIQUE et PERSONNALISÉE, ou les deux.
+
+=== ANALYSE ===
+Classification JSON avec:
+{cls._classification_fields()}
+
+{cls._classification_examples()}
+
+=== RÉPONSE AU CLIENT ===
+Approche selon la catégorie:
+{category_lines}
+
+{cls._response_guidelines()}
+
+=== FORMATS DE SORTIE ===
+- TÂCHE ANALYSE uniquement : le JSON seul, sans autres commentaires.
+- TÂCHE RÉPONSE AU CLIENT uniquement : la réponse en texte brut, sans balise.
+- TÂCHE ANALYSE puis RÉPONSE AU CLIENT : rien avant, rien après ce format
+<classification>
+{{le JSON de l'analyse}}
+{CLASSIFICATION_END_TAG}
+La réponse au client en texte brut, sans balise."""
+    
+    @staticmethod
+    def _classification_examples() -> str:
+        """Exemples de classification (partie statique du prompt)"""
+        return """EXEMPLES DE CLASSIFICATION:
+- "Ça fait trois semaines que j'attends mon colis, le suivi ne bouge plus depuis le 12. J'en ai besoin pour un anniversaire samedi !"
+  {"category": "retard_livraison", "urgency": 4, "sentiment": "negatif", "key_elements": ["colis bloqué depuis le 12", "besoin pour samedi"], "requires_human": false, "confidence": 0.93}
+- "Bonjour, je voudrais retourner le pull reçu hier, la taille ne convient pas. Comment obtenir le remboursement ?"
+  {"category": "remboursement", "urgency": 2, "sentiment": "neutre", "key_elements": ["retour pull", "taille inadaptée"], "requires_human": false, "confidence": 0.95}
+- "La cafetière ne chauffe plus après deux utilisations, c'est inadmissible pour ce prix."
+  {"category": "produit_defectueux", "urgency": 3, "sentiment": "negatif", "key_elements": ["cafetière", "ne chauffe plus", "deux utilisations"], "requires_human": false, "confidence": 0.92}
+- "Pouvez-vous me confirmer l'adresse de livraison de ma dernière commande ? Je crois m'être trompé de numéro."
+  {"category": "information_commande", "urgency": 3, "sentiment": "neutre", "key_elements": ["vérification adresse", "erreur de numéro possible"], "requires_human": false, "confidence": 0.88}
+- "Quatrième message sans réponse. Si rien n'est fait aujourd'hui je saisis une association de consommateurs."
+  {"category": "reclamation", "urgency": 5, "sentiment": "tres_negatif", "key_elements": ["relances sans réponse", "menace de recours"], "requires_human": true, "confidence": 0.96}
+- "Proposez-vous des cartes cadeaux pour les fêtes ?"
+  {"category": "autre", "urgency": 1, "sentiment": "positif", "key_elements": ["carte cadeau"], "requires_human": false, "confidence": 0.9}
+
+RÈGLES D'URGENCE: 5 = menace de recours, client premium bloqué ou risque de sécurité ; 4 = échéance proche ou relance ; 3 = problème sans échéance ; 1-2 = simple question.
+requires_human = true pour les menaces juridiques, les litiges de paiement ou les demandes hors du périmètre du support."""
+    
+    @classmethod
+    def _system_prompt(cls):
+        """Prompt système des appels Messages (bloc marqué pour le prompt caching)"""
+        if not PROMPT_CACHING:
+            return cls._system_prefix()
+        return [{"type": "text", "text": cls._system_prefix(), "cache_control": {"type": "ephemeral"}}]
+    
+    def _classification_request(self, message: str, subject: str, customer_context: Dict = None) -> Dict[str, Any]:
+        """Paramètres de l'appel Messages pour la classification"""
+        request = {
+            "model": self.router.classification_model,
+            "max_tokens": self.token_budget.max_tokens(CLASSIFICATION_CALL),
+            "temperature": 0.1,
+            "system": self._system_prompt(),
+            "messages": [
+                {"role": "user", "content": self._classification_prompt(message, subject, customer_context)}
+            ]
+        }
+        if CLASSIFICATION_TOOL_USE:
+            # La définition de l'outil précède le système dans le préfixe mis en cache
+            request.update({
+                "tools": [CLASSIFICATION_TOOL],
+                "tool_choice": {"type": "tool", "name": CLASSIFICATION_TOOL_NAME}
+            })
+        return request
+    
+    def _classification_prompt(self, message: str, subject: str, customer_context: Dict = None) -> str:
+        """Construit la partie du prompt de classification propre au message"""
+        context_str = self._classification_context(customer_context)
+        
+        # Prompt pour la classification
+        prompt = f"""{context_str}
+
+SUJET: {subject}
+MESSAGE CLIENT: {message}
+
+TÂCHE: ANALYSE uniquement. Fournis la classification JSON de ce message.
+Réponds uniquement avec le JSON, sans autres commentaires."""
+        return prompt
+    
+    def _classification_context(self, customer_context: Dict = None) -> str:
+        """Contexte client inclus dans les prompts d'analyse (historique compacté)"""
+        customer_context = self.token_budget.compact_context(customer_context)
+        context_str = ""
+        if customer_context and customer_context.get("client"):
+            client = customer_context["client"]
+            context_str = f"""
 CONTEXTE CLIENT:
 - Nom: {client.get('prenom')} {client.get('nom')}
 - Email: {client.get('email')}
@@ -86,22 +436,17 @@ CONTEXTE CLIENT:
 - Nombre de commandes: {customer_context.get('nb_commandes', 0)}
 - Total dépensé: {customer_context.get('total_depense', 0)}€
 """
-                
-                if customer_context.get("commandes"):
-                    context_str += "\nDERNIÈRES COMMANDES:\n"
-                    for cmd in customer_context["commandes"][-3:]:  # 3 dernières
-                        context_str += f"- Commande #{cmd['id']}: {cmd['montant']}€ ({cmd['statut']})\n"
             
-            # Prompt pour la classification
-            prompt = f"""Tu es un assistant IA spécialisé dans le support client e-commerce. 
-
-{context_str}
-
-SUJET: {subject}
-MESSAGE CLIENT: {message}
-
-Analyse ce message et fournis une classification JSON avec:
-1. "category": Une des catégories principales
+            if customer_context.get("commandes"):
+                context_str += "\nDERNIÈRES COMMANDES:\n"
+                for cmd in customer_context["commandes"]:
+                    context_str += f"- Commande #{cmd['id']}: {cmd['montant']}€ ({cmd['statut']})\n"
+        return context_str
+    
+    @staticmethod
+    def _classification_fields() -> str:
+        """Champs attendus dans la classification JSON"""
+        return """1. "category": Une des catégories principales
    - "retard_livraison": Problèmes de livraison, retards, colis perdu
    - "remboursement": Demandes de remboursement, retours
    - "produit_defectueux": Produits cassés, défectueux, non conformes
@@ -113,40 +458,42 @@ Analyse ce message et fournis une classification JSON avec:
 3. "sentiment": Sentiment client ("positif", "neutre", "negatif", "tres_negatif")
 4. "key_elements": Liste des éléments clés identifiés
 5. "requires_human": true/false si nécessite intervention humaine
-6. "confidence": Score de confiance (0-1)
-
-Réponds uniquement avec le JSON, sans autres commentaires."""
-
-            # Appel à l'API Claude
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1024,
-                temperature=0.1,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            # Parser la réponse JSON
-            result = json.loads(response.content[0].text)
-            
-            # Ajouter des métadonnées
-            result.update({
-                "processed_at": datetime.now().isoformat(),
-                "model": "claude-3-sonnet-20240229",
-                "has_context": bool(customer_context and customer_context.get("client"))
-            })
-            
-            return result
-            
-        except json.JSONDecodeError as e:
-            print(f"Erreur parsing JSON Claude: {e}")
-            return self._fallback_classification(message)
-        except Exception as e:
-            print(f"Erreur classification Claude: {e}")
-            return self._fallback_classification(message)
+6. "confidence": Score de confiance (0-1)"""
+    
+    def _parse_classification(self, response, customer_context: Dict = None,
+                              model: str = CLASSIFICATION_MODEL) -> Dict[str, Any]:
+        """
+        Classification d'une réponse de l'API (outil ou JSON extrait du texte) avec ses métadonnées
+        
+        Raises:
+            ValueError: sortie inexploitable, l'appel est compté comme perdu
+        """
+        try:
+            classification, source = classification_from_response(response)
+        except ValueError:
+            self._count_structured('wasted_classification')
+            raise
+        self._count_structured(source)
+        return self._classification_metadata(classification, customer_context, model)
+    
+    def _count_structured(self, key: str):
+        with self._stats_lock:
+            self.structured_stats[key] += 1
+    
+    @staticmethod
+    def _classification_metadata(result: Dict, customer_context: Dict, model: str) -> Dict[str, Any]:
+        """Ajoute les métadonnées de traitement à une classification"""
+        result.update({
+            "processed_at": datetime.now().isoformat(),
+            "model": model,
+            "has_context": bool(customer_context and customer_context.get("client"))
+        })
+        
+        return result
     
-    def generate_response(self, message: str, classification: Dict, customer_context: Dict = None) -> str:
+    def generate_response(self, message: str, classification: Dict, customer_context: Dict = None,
+                          on_text: Optional[Callable[[str], None]] = None, usage: Dict = None,
+                          should_stop: Optional[Callable[[], bool]] = None) -> str:
         """
         Génère une réponse personnalisée avec Claude
         
@@ -154,62 +501,142 @@ Réponds uniquement avec le JSON, sans autres commentaires."""
             message: Message original du client
             classification: Résultat de la classification
             customer_context: Contexte client
+            on_text: Si fourni, la réponse est générée en streaming et chaque
+                fragment de texte lui est transmis dès sa réception
+            usage: Compteurs d'appels et de tokens à incrémenter (optionnel)
+            should_stop: Interrompt la génération en streaming dès qu'il retourne True
+                (réponse spéculative rejetée) ; la réponse partielle n'est ni comptée ni mise en cache
             
         Returns:
             Réponse générée par Claude
         """
+        category = classification.get("category", "autre")
+        if not self.is_ready:
+            return self._fallback_response(category)
+        
+        cached = self._cache_call('get_response', message, category, customer_context)
+        if cached:
+            return self._cached_response(cached, on_text, usage)
+            
+        try:
+            request = self._response_request(message, classification, customer_context)
+            
+            if on_text is None:
+                response = self.resilience.call(RESPONSE_CALL, self.client.messages.create, request)
+                text = response.content[0].text.strip()
+            else:
+                # Streaming : le premier fragment arrive bien avant la fin de la génération
+                parts = []
+                with self.resilience.stream(RESPONSE_CALL, self.client.messages.stream, request) as stream:
+                    for fragment in stream.text_stream:
+                        if should_stop and should_stop():
+                            # Quitter le bloc ferme la connexion : la génération s'arrête
+                            return ""
+                        parts.append(fragment)
+                        on_text(fragment)
+                    response = stream.get_final_message()
+                text = "".join(parts).strip()
+            
+            call_usage = self._add_usage(usage, response)
+            self._record_call(RESPONSE_CALL, request, response, call_usage, classification)
+            self._cache_call('put_response', message, category, customer_context, text, call_usage)
+            return text
+            
+        except Exception as e:
+            print(f"Erreur génération réponse Claude: {e}")
+            self._set_model(usage, "fallback")
+            return self._fallback_response(category)
+    
+    async def agenerate_response(self, message: str, classification: Dict, customer_context: Dict = None,
+                                 on_text: Optional[Callable[[str], None]] = None, usage: Dict = None,
+                                 should_stop: Optional[Callable[[], bool]] = None) -> str:
+        """Version asynchrone de generate_response (client AsyncAnthropic)"""
+        category = classification.get("category", "autre")
         if not self.is_ready:
-            return self._fallback_response(classification.get("category", "autre"))
+            return self._fallback_response(category)
+        
+        cached = await self._acache_call('get_response', message, category, customer_context)
+        if cached:
+            return self._cached_response(cached, on_text, usage)
             
         try:
-            # Préparer le contexte client
-            context_str = ""
-            client_name = ""
-            
-            if customer_context and customer_context.get("client"):
-                client = customer_context["client"]
-                client_name = client.get("prenom", "")
-                context_str = f"""
+            request = self._response_request(message, classification, customer_context)
+            
+            if on_text is None:
+                response = await self.resilience.acall(RESPONSE_CALL, self.async_client.messages.create, request)
+                text = response.content[0].text.strip()
+            else:
+                parts = []
+                async with self.resilience.astream(RESPONSE_CALL, self.async_client.messages.stream, request) as stream:
+                    async for fragment in stream.text_stream:
+                        if should_stop and should_stop():
+                            return ""
+                        parts.append(fragment)
+                        on_text(fragment)
+                    response = await stream.get_final_message()
+                text = "".join(parts).strip()
+            
+            call_usage = self._add_usage(usage, response)
+            self._record_call(RESPONSE_CALL, request, response, call_usage, classification)
+            await self._acache_call('put_response', message, category, customer_context, text, call_usage)
+            return text
+            
+        except Exception as e:
+            print(f"Erreur génération réponse Claude: {e}")
+            self._set_model(usage, "fallback")
+            return self._fallback_response(category)
+    
+    def _response_request(self, message: str, classification: Dict, customer_context: Dict = None) -> Dict[str, Any]:
+        """Paramètres de l'appel Messages pour la génération de réponse"""
+        return {
+            "model": self.router.route(classification),
+            "max_tokens": self.token_budget.max_tokens(RESPONSE_CALL, classification.get("category"),
+                                                       classification.get("urgency")),
+            "temperature": 0.3,
+            "system": self._system_prompt(),
+            "messages": [
+                {"role": "user", "content": self._response_prompt(message, classification, customer_context)}
+            ]
+        }
+    
+    def _response_prompt(self, message: str, classification: Dict, customer_context: Dict = None) -> str:
+        """Construit la partie du prompt de génération de réponse propre au message"""
+        # Préparer le contexte client
+        context_str = ""
+        client_name = ""
+        
+        if customer_context and customer_context.get("client"):
+            client = customer_context["client"]
+            client_name = client.get("prenom", "")
+            context_str = f"""
 INFORMATIONS CLIENT:
 - Nom: {client.get('prenom')} {client.get('nom')}
 - Type de client: {client.get('type')}
 - Historique: {customer_context.get('nb_commandes', 0)} commandes, {customer_context.get('total_depense', 0)}€ dépensés
 """
-                
-                # Ajouter info sur les commandes récentes si pertinent
-                if customer_context.get("commandes") and classification.get("category") in ["retard_livraison", "information_commande"]:
-                    recent_orders = customer_context["commandes"][-2:]
-                    context_str += "\nCOMMANDES RÉCENTES:\n"
-                    for cmd in recent_orders:
-                        context_str += f"- Commande #{cmd['id']}: {cmd['montant']}€ - {cmd['statut']}\n"
-            
-            # Instructions spécifiques selon la catégorie
-            category_instructions = {
-                "retard_livraison": "Excuses sincères, explication des démarches entreprises, délai de résolution",
-                "remboursement": "Compréhension, processus de remboursement, délais",
-                "produit_defectueux": "Excuses, solution de remplacement immédiate, geste commercial",
-                "information_commande": "Informations précises, transparence, suivi",
-                "reclamation": "Écoute active, prise en charge personnalisée, solution",
-                "autre": "Réponse personnalisée selon le contexte"
-            }
-            
-            category = classification.get("category", "autre")
-            urgency = classification.get("urgency", 3)
-            sentiment = classification.get("sentiment", "neutre")
-            
-            # Adapter le ton selon l'urgence et le sentiment
-            tone_instruction = ""
-            if urgency >= 4 or sentiment == "tres_negatif":
-                tone_instruction = "Ton très attentionné et prioritaire. Intervention immédiate."
-            elif sentiment == "negatif":
-                tone_instruction = "Ton empathique et rassurant."
-            else:
-                tone_instruction = "Ton professionnel et bienveillant."
             
-            # Prompt pour la génération de réponse
-            prompt = f"""Tu es un expert en support client e-commerce français. Ta mission est de créer une réponse UNIQUE et PERSONNALISÉE.
-
-{context_str}
+            # Ajouter info sur les commandes récentes si pertinent
+            if customer_context.get("commandes") and classification.get("category") in ORDER_CATEGORIES:
+                recent_orders = self.token_budget.compact_context(customer_context, max_orders=2)["commandes"]
+                context_str += "\nCOMMANDES RÉCENTES:\n"
+                for cmd in recent_orders:
+                    context_str += f"- Commande #{cmd['id']}: {cmd['montant']}€ - {cmd['statut']}\n"
+        
+        category = classification.get("category", "autre")
+        urgency = classification.get("urgency", 3)
+        sentiment = classification.get("sentiment", "neutre")
+        
+        # Adapter le ton selon l'urgence et le sentiment
+        tone_instruction = ""
+        if urgency >= 4 or sentiment == "tres_negatif":
+            tone_instruction = "Ton très attentionné et prioritaire. Intervention immédiate."
+        elif sentiment == "negatif":
+            tone_instruction = "Ton empathique et rassurant."
+        else:
+            tone_instruction = "Ton professionnel et bienveillant."
+        
+        # Prompt pour la génération de réponse
+        prompt = f"""{context_str}
 
 MESSAGE ORIGINAL DU CLIENT: {message}
 
@@ -219,7 +646,22 @@ ANALYSE:
 - Sentiment: {sentiment}
 - Éléments clés: {classification.get('key_elements', [])}
 
-CONTRAINTES ABSOLUES:
+TÂCHE: RÉPONSE AU CLIENT uniquement.
+{self._personalization(client_name, tone_instruction)}
+
+Génère maintenant une réponse UNIQUE et PERSONNALISÉE:"""
+        return prompt
+    
+    @staticmethod
+    def _personalization(client_name: str, tone_instruction: str) -> str:
+        """Consignes de personnalisation propres au message (hors préfixe mis en cache)"""
+        return f"""- Prénom du client: {client_name if client_name else "non communiqué"}
+- TON: {tone_instruction}"""
+    
+    @staticmethod
+    def _response_guidelines() -> str:
+        """Contraintes de rédaction communes aux modes de traitement"""
+        return """CONTRAINTES ABSOLUES:
 ❌ INTERDIT: Utiliser des phrases génériques comme "Nous avons bien reçu votre demande", "Dans les plus brefs délais", "Cordialement l'équipe support"
 ❌ INTERDIT: Formules toutes faites et automatiques
 ❌ INTERDIT: Réponses qui pourraient être envoyées à n'importe qui
@@ -227,10 +669,10 @@ CONTRAINTES ABSOLUES:
 ✅ OBLIGATOIRE: 
 - Répondre SPÉCIFIQUEMENT aux points mentionnés dans le message
 - Utiliser des détails concrets du message du client
-- Personnaliser selon {client_name if client_name else "le client"}
+- Personnaliser selon le prénom du client indiqué avec la tâche
 - Adopter un ton naturel et humain
 - Proposer des solutions concrètes et précises
-- {tone_instruction}
+- Respecter le TON indiqué avec la tâche
 
 STRUCTURE REQUISE:
 1. Salutation personnalisée avec prénom si disponible
@@ -246,27 +688,170 @@ EXEMPLES DE BONNES PRATIQUES:
 - "Votre colis parti le 15/01 devrait arriver demain avant 14h"
 - "Je vous rembourse dès maintenant les 47,99€ sur votre carte"
 
-LONGUEUR: 150-300 mots maximum, direct et efficace.
+LONGUEUR: 150-300 mots maximum, direct et efficace."""
+    
+    def _combined_request(self, message: str, subject: str, customer_context: Dict = None) -> Dict[str, Any]:
+        """
+        Paramètres de l'appel unique qui classifie le message et rédige la réponse
+        (modèle choisi sur la classification locale, Claude n'ayant pas encore classifié)
+        """
+        return {
+            "model": self.router.route(self._local_guess(message, subject)),
+            "max_tokens": self.token_budget.max_tokens(COMBINED_CALL),
+            "temperature": 0.3,
+            "system": self._system_prompt(),
+            "messages": [
+                {"role": "user", "content": self._combined_prompt(message, subject, customer_context)}
+            ]
+        }
+    
+    def _combined_prompt(self, message: str, subject: str, customer_context: Dict = None) -> str:
+        """Construit la partie du prompt du mode combiné (classification puis réponse) propre au message"""
+        client_name = ""
+        if customer_context and customer_context.get("client"):
+            client_name = customer_context["client"].get("prenom", "")
+        
+        tone_instruction = ("Ton adapté à ton analyse : très attentionné et prioritaire si urgence >= 4 "
+                            "ou sentiment tres_negatif, empathique et rassurant si negatif, "
+                            "professionnel et bienveillant sinon.")
+        
+        return f"""{self._classification_context(customer_context)}
+
+SUJET: {subject}
+MESSAGE ORIGINAL DU CLIENT: {message}
 
-Génère maintenant une réponse UNIQUE et PERSONNALISÉE:"""
+TÂCHE: ANALYSE puis RÉPONSE AU CLIENT.
+{self._personalization(client_name, tone_instruction)}
 
-            # Appel à Claude 4 pour génération avec réflexion
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20240620",  # Remplacé par le dernier modèle Sonnet
-                max_tokens=3000,
-                temperature=0.3,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            return response.content[0].text.strip()
-            
+Respecte le format de sortie obligatoire (<classification>JSON{CLASSIFICATION_END_TAG} puis la réponse)."""
+    
+    def _combined_call(self, message: str, subject: str, customer_context: Dict,
+                       on_text: Optional[Callable[[str], None]], usage: Dict):
+        """
+        Classifie et répond en un seul appel
+        
+        Returns:
+            (classification, réponse) ou None si la sortie structurée est inexploitable
+        """
+        output = _CombinedOutput(on_text)
+        request = self._combined_request(message, subject, customer_context)
+        try:
+            if on_text is None:
+                response = self.resilience.call(COMBINED_CALL, self.client.messages.create, request)
+                output.feed(response.content[0].text)
+            else:
+                with self.resilience.stream(COMBINED_CALL, self.client.messages.stream, request) as stream:
+                    for text in stream.text_stream:
+                        output.feed(text)
+                    response = stream.get_final_message()
+            call_usage = self._add_usage(usage, response)
+            self._record_call(COMBINED_CALL, request, response, call_usage)
         except Exception as e:
-            print(f"Erreur génération réponse Claude: {e}")
-            return self._fallback_response(classification.get("category", "autre"))
+            # Une réponse déjà diffusée ne peut pas être régénérée silencieusement
+            if output.emitted:
+                raise
+            print(f"Erreur appel combiné Claude: {e}")
+            return None
+        
+        combined = self._combined_result(output, customer_context, self._response_model(request, response))
+        if combined:
+            self._compare_local(message, subject, combined[0])
+            for method, args in self._combined_cache_entries(message, subject, customer_context, combined, call_usage):
+                self._cache_call(method, *args)
+        return combined
+    
+    async def _acombined_call(self, message: str, subject: str, customer_context: Dict,
+                              on_text: Optional[Callable[[str], None]], usage: Dict):
+        """Version asynchrone de _combined_call"""
+        output = _CombinedOutput(on_text)
+        request = self._combined_request(message, subject, customer_context)
+        try:
+            if on_text is None:
+                response = await self.resilience.acall(COMBINED_CALL, self.async_client.messages.create, request)
+                output.feed(response.content[0].text)
+            else:
+                async with self.resilience.astream(COMBINED_CALL, self.async_client.messages.stream, request) as stream:
+                    async for text in stream.text_stream:
+                        output.feed(text)
+                    response = await stream.get_final_message()
+            call_usage = self._add_usage(usage, response)
+            self._record_call(COMBINED_CALL, request, response, call_usage)
+        except Exception as e:
+            if output.emitted:
+                raise
+            print(f"Erreur appel combiné Claude: {e}")
+            return None
+        
+        combined = self._combined_result(output, customer_context, self._response_model(request, response))
+        if combined:
+            self._compare_local(message, subject, combined[0])
+            for method, args in self._combined_cache_entries(message, subject, customer_context, combined, call_usage):
+                await self._acache_call(method, *args)
+        return combined
+    
+    def _combined_result(self, output: _CombinedOutput, customer_context: Dict, model: str):
+        if not output.complete:
+            if output.emitted:
+                raise ValueError("Réponse combinée incomplète après diffusion")
+            print("⚠️ Sortie combinée inexploitable, retour au mode en deux appels")
+            self._count_structured('wasted_combined')
+            return None
+        classification = self._classification_metadata(output.classification, customer_context, model)
+        return classification, output.response
+    
+    @staticmethod
+    def _combined_cache_entries(message: str, subject: str, customer_context: Dict, combined, call_usage: Dict):
+        """Entrées de cache d'un appel combiné (tokens de sortie répartis selon la longueur de chaque partie)"""
+        classification, response = combined
+        classification_chars = len(json.dumps(classification, ensure_ascii=False))
+        share = classification_chars / (classification_chars + len(response))
+        classification_usage = {
+            "input_tokens": call_usage["input_tokens"] // 2,
+            "output_tokens": round(call_usage["output_tokens"] * share)
+        }
+        response_usage = {
+            "input_tokens": call_usage["input_tokens"] - classification_usage["input_tokens"],
+            "output_tokens": call_usage["output_tokens"] - classification_usage["output_tokens"]
+        }
+        return [
+            ('put_classification', (message, subject, customer_context, classification, classification_usage)),
+            ('put_response', (message, classification.get("category", "autre"), customer_context,
+                              response, response_usage))
+        ]
     
-    def process_customer_message(self, email: str, message: str, subject: str = "", context: Dict = None) -> Dict[str, Any]:
+    def batch_request(self, message: str, subject: str = "", customer_context: Dict = None) -> Dict[str, Any]:
+        """Paramètres d'une requête du mode combiné soumise par lot (Message Batches API)"""
+        return self._combined_request(message, subject, customer_context)
+    
+    def batch_result(self, email: str, subject: str, message: str, response,
+                     customer_context: Dict) -> Dict[str, Any]:
+        """
+        Résultat d'une requête soumise par batch_request, au format de process_customer_message
+        
+        Args:
+            response: Message de l'API (résultat 'succeeded' d'un lot)
+            
+        Returns:
+            Résultat complet, ou {"error"} si la sortie est inexploitable ;
+            tokens de l'appel dans "usage" dans les deux cas
+        """
+        output = _CombinedOutput()
+        output.feed("".join(block.text for block in response.content if getattr(block, "text", None)))
+        usage = self._new_usage()
+        self._add_usage(usage, response)
+        if not output.complete:
+            self._count_structured('wasted_combined')
+            return {"error": "Sortie combinée inexploitable", "usage": usage}
+        
+        classification = self._classification_metadata(output.classification, customer_context, response.model)
+        result = self._build_result(email, subject, message, classification, output.response,
+                                    customer_context, model=response.model)
+        result.update({"processing_mode": COMBINED_MODE, "usage": usage})
+        return result
+    
+    def process_customer_message(self, email: str, message: str, subject: str = "", context: Dict = None,
+                                 on_text: Optional[Callable[[str], None]] = None,
+                                 mode: Optional[str] = None, classification: Dict = None) -> Dict[str, Any]:
         """
         Traite complètement un message client avec Claude
         
@@ -275,79 +860,425 @@ Génère maintenant une réponse UNIQUE et PERSONNALISÉE:"""
             message: Message du client
             subject: Sujet du message
             context: Contexte client (commandes, historique)
+            on_text: Callback de streaming de la réponse (voir generate_response)
+            mode: 'combined' (un appel) ou 'two_step' (classification puis réponse) ;
+                CLAUDE_PROCESSING_MODE par défaut
+            classification: Classification déjà connue (message d'une rafale), seule
+                la réponse est alors générée ; de même pour une classification locale sûre
             
         Returns:
             Dict avec classification, réponse et métadonnées
         """
         try:
             customer_context = context or {}
+            mode = self.resolve_mode(mode)
+            usage = self._new_usage()
+            known = (self._known_classification(classification, customer_context)
+                     or self._local_classification(message, subject, customer_context))
+            
+            # Classification déjà connue ou en cache : seule la réponse reste à générer
+            combined = None
+            cache_first = known is not None or (mode == COMBINED_MODE and self.is_ready and bool(
+                self._cache_call('has_classification', message, subject, customer_context)))
+            if mode == COMBINED_MODE and self.is_ready and not cache_first:
+                combined = self._combined_call(message, subject, customer_context, on_text, usage)
+            
+            if combined:
+                classification, response = combined
+            elif mode == SPECULATIVE_MODE and self.is_ready and known is None:
+                # 2-3. Classification Claude et réponse spéculative en parallèle
+                classification, response = self._speculative_call(message, subject, customer_context,
+                                                                  on_text, usage)
+            else:
+                # 2. Classifier le message
+                classification = known or self.classify_message(message, subject, customer_context, usage=usage)
+                
+                # 3. Générer la réponse
+                response = self.generate_response(message, classification, customer_context,
+                                                  on_text=on_text, usage=usage)
+            
+            self._record_mode_usage(mode, usage, fallback=mode == COMBINED_MODE and not combined and not cache_first)
+            result = self._build_result(email, subject, message, classification, response, customer_context,
+                                        usage.get("model", "fallback"))
+            # Mode réellement utilisé (le mode combiné peut retomber sur deux appels)
+            result.update({"processing_mode": self._effective_mode(mode, combined, known), "usage": usage})
+            return result
+            
+        except Exception as e:
+            print(f"Erreur traitement message: {e}")
+            return self._error_result(email, e)
+    
+    async def aprocess_customer_message(self, email: str, message: str, subject: str = "", context: Dict = None,
+                                        on_text: Optional[Callable[[str], None]] = None,
+                                        mode: Optional[str] = None, classification: Dict = None) -> Dict[str, Any]:
+        """Version asynchrone de process_customer_message (serveur ASGI)"""
+        try:
+            customer_context = context or {}
+            mode = self.resolve_mode(mode)
+            usage = self._new_usage()
+            known = (self._known_classification(classification, customer_context)
+                     or self._local_classification(message, subject, customer_context))
+            
+            combined = None
+            cache_first = known is not None or (mode == COMBINED_MODE and self.is_ready and bool(
+                await self._acache_call('has_classification', message, subject, customer_context)))
+            if mode == COMBINED_MODE and self.is_ready and not cache_first:
+                combined = await self._acombined_call(message, subject, customer_context, on_text, usage)
+            
+            if combined:
+                classification, response = combined
+            elif mode == SPECULATIVE_MODE and self.is_ready and known is None:
+                classification, response = await self._aspeculative_call(message, subject, customer_context,
+                                                                         on_text, usage)
+            else:
+                classification = known or await self.aclassify_message(message, subject, customer_context,
+                                                                       usage=usage)
+                response = await self.agenerate_response(message, classification, customer_context,
+                                                         on_text=on_text, usage=usage)
             
-            # 2. Classifier le message
-            classification = self.classify_message(message, subject, customer_context)
-            
-            # 3. Générer la réponse
-            response = self.generate_response(message, classification, customer_context)
-            
-            # 4. Créer le ticket ID
-            ticket_id = f"CL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            
-            # 5. Calculer le score de qualité
-            quality_score = self._calculate_quality_score(
-                classification, 
-                len(response), 
-                bool(customer_context.get("client"))
-            )
-            
-            return {
-                "email": email,
-                "subject": subject,
-                "message": message,
-                "category": classification.get("category"),
-                "urgency": classification.get("urgency"),
-                "sentiment": classification.get("sentiment"),
-                "key_elements": classification.get("key_elements", []),
-                "requires_human": classification.get("requires_human", False),
-                "confidence": classification.get("confidence", 0.85),
-                "response": response,
-                "quality_score": quality_score,
-                "ticket_id": ticket_id,
-                "processed_at": datetime.now().isoformat(),
-                "customer_context": customer_context,
-                "model": "claude-3-sonnet-20240229",
-                "has_customer_data": bool(customer_context.get("client"))
-            }
+            self._record_mode_usage(mode, usage, fallback=mode == COMBINED_MODE and not combined and not cache_first)
+            result = self._build_result(email, subject, message, classification, response, customer_context,
+                                        usage.get("model", "fallback"))
+            # Mode réellement utilisé (le mode combiné peut retomber sur deux appels)
+            result.update({"processing_mode": self._effective_mode(mode, combined, known), "usage": usage})
+            return result
             
         except Exception as e:
             print(f"Erreur traitement message: {e}")
-            return {
-                "email": email,
-                "error": str(e),
-                "processed_at": datetime.now().isoformat(),
-                "model": "claude-3-sonnet-20240229 (erreur)"
-            }
+            return self._error_result(email, e)
+    
+    def _speculative_call(self, message: str, subject: str, customer_context: Dict,
+                          on_text: Optional[Callable[[str], None]], usage: Dict):
+        """
+        Génère la réponse sur la classification locale pendant que Claude classifie.
+        La réponse est gardée si la catégorie et le niveau de modèle choisi par le routage
+        concordent (_speculation_matches), sinon abandonnée et régénérée.
+        
+        Returns:
+            (classification, réponse)
+        """
+        local = self._local_guess(message, subject)
+        stream = _SpeculativeStream(on_text)
+        classification_usage = self._new_usage()
+        timings = {}
+        
+        def classify():
+            started = time.perf_counter()
+            try:
+                return self.classify_message(message, subject, customer_context, usage=classification_usage)
+            finally:
+                timings['classification'] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        future = self._speculation_pool().submit(classify)
+        future.add_done_callback(lambda done: stream.resolve(
+            not done.exception() and self._speculation_matches(local, done.result())))
+        
+        speculative_usage = self._new_usage()
+        response = self.generate_response(message, local, customer_context, on_text=stream.feed,
+                                          usage=speculative_usage, should_stop=stream.should_stop)
+        timings['generation'] = time.perf_counter() - started
+        classification = future.result()
+        
+        return self._speculation_outcome(
+            message, customer_context, on_text, usage, local, classification, response,
+            classification_usage, speculative_usage, timings, started,
+            lambda: self.generate_response(message, classification, customer_context, on_text=on_text, usage=usage)
+        )
+    
+    async def _aspeculative_call(self, message: str, subject: str, customer_context: Dict,
+                                 on_text: Optional[Callable[[str], None]], usage: Dict):
+        """Version asynchrone de _speculative_call (tâche asyncio au lieu d'un thread)"""
+        local = self._local_guess(message, subject)
+        stream = _SpeculativeStream(on_text)
+        classification_usage = self._new_usage()
+        timings = {}
+        
+        async def classify():
+            started = time.perf_counter()
+            try:
+                return await self.aclassify_message(message, subject, customer_context, usage=classification_usage)
+            finally:
+                timings['classification'] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        task = asyncio.ensure_future(classify())
+        task.add_done_callback(lambda done: stream.resolve(
+            not done.cancelled() and not done.exception() and self._speculation_matches(local, done.result())))
+        
+        speculative_usage = self._new_usage()
+        try:
+            response = await self.agenerate_response(message, local, customer_context, on_text=stream.feed,
+                                                     usage=speculative_usage, should_stop=stream.should_stop)
+        except BaseException:
+            task.cancel()
+            raise
+        timings['generation'] = time.perf_counter() - started
+        classification = await task
+        
+        outcome = self._speculation_outcome(
+            message, customer_context, on_text, usage, local, classification, response,
+            classification_usage, speculative_usage, timings, started, None
+        )
+        if outcome[1] is None:
+            response = await self.agenerate_response(message, classification, customer_context,
+                                                     on_text=on_text, usage=usage)
+            outcome = (classification, response)
+        return outcome
+    
+    def _speculation_outcome(self, message, customer_context, on_text, usage, local, classification, response,
+                             classification_usage, speculative_usage, timings, started, regenerate):
+        """
+        Fusionne les compteurs et met à jour les métriques de spéculation
+        
+        Returns:
+            (classification, réponse) ; réponse None si elle reste à régénérer (version asynchrone)
+        """
+        for counters in (classification_usage, speculative_usage):
+            for key, value in counters.items():
+                usage[key] = value if key == "model" else usage.get(key, 0) + value
+        
+        hit = self._speculation_matches(local, classification) and bool(response)
+        with self._stats_lock:
+            self.speculation_stats['speculations'] += 1
+            if hit:
+                self.speculation_stats['hits'] += 1
+                # Gain par rapport à l'enchaînement classification puis génération
+                sequential = timings.get('classification', 0) + timings['generation']
+                self.speculation_stats['latency_saved_ms'] += max(
+                    0.0, (sequential - (time.perf_counter() - started)) * 1000)
+            else:
+                self.speculation_stats['misses'] += 1
+        
+        if hit:
+            return classification, response
+        print(f"↩️ Spéculation rejetée: {local['category']}/{self.router.tier(local)} (local) ≠ "
+              f"{classification.get('category')}/{self.router.tier(classification)} (Claude)")
+        return classification, regenerate() if regenerate else None
+    
+    def _speculation_matches(self, local: Dict, classification: Dict) -> bool:
+        """
+        La réponse générée sur la classification locale vaut pour celle de Claude : même
+        catégorie et même niveau de modèle (un message que Claude juge urgent, négatif ou
+        à escalader n'hérite pas de la réponse du modèle rapide)
+        """
+        return (classification.get("category") == local["category"]
+                and self.router.tier(classification) == self.router.tier(local))
+    
+    def _speculation_pool(self) -> ThreadPoolExecutor:
+        """Threads des classifications lancées en parallèle (créés au premier usage)"""
+        with self._stats_lock:
+            if self._speculation_executor is None:
+                self._speculation_executor = ThreadPoolExecutor(max_workers=8,
+                                                                thread_name_prefix="claude-speculation")
+            return self._speculation_executor
+    
+    def _effective_mode(self, mode: str, combined, known: Optional[Dict]) -> str:
+        """Mode réellement utilisé (le mode combiné peut retomber sur deux appels)"""
+        if combined:
+            return COMBINED_MODE
+        if mode == SPECULATIVE_MODE and self.is_ready and known is None:
+            return SPECULATIVE_MODE
+        return TWO_STEP_MODE
+    
+    def _build_result(self, email: str, subject: str, message: str, classification: Dict,
+                      response: str, customer_context: Dict, model: str = CLASSIFICATION_MODEL) -> Dict[str, Any]:
+        """Assemble le résultat complet d'un traitement (model : modèle qui a rédigé la réponse)"""
+        # 4. Créer le ticket ID
+        ticket_id = f"CL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        
+        # 5. Calculer le score de qualité
+        quality_score = self._calculate_quality_score(
+            classification, 
+            len(response), 
+            bool(customer_context.get("client"))
+        )
+        
+        return {
+            "email": email,
+            "subject": subject,
+            "message": message,
+            "category": classification.get("category"),
+            "urgency": classification.get("urgency"),
+            "sentiment": classification.get("sentiment"),
+            "key_elements": classification.get("key_elements", []),
+            "requires_human": classification.get("requires_human", False),
+            "confidence": classification.get("confidence", 0.85),
+            "response": response,
+            "quality_score": quality_score,
+            "ticket_id": ticket_id,
+            "processed_at": datetime.now().isoformat(),
+            "customer_context": customer_context,
+            "model": model,
+            # Origine de la classification (modèle Claude, "local", "cache", "cluster" ou "fallback")
+            "classified_by": classification.get("model"),
+            "has_customer_data": bool(customer_context.get("client"))
+        }
+    
+    @staticmethod
+    def resolve_mode(mode: Optional[str] = None) -> str:
+        """Mode de traitement effectif (mode inconnu ou absent : mode par défaut)"""
+        if mode in PROCESSING_MODES:
+            return mode
+        return DEFAULT_PROCESSING_MODE if DEFAULT_PROCESSING_MODE in PROCESSING_MODES else TWO_STEP_MODE
+    
+    @staticmethod
+    def _new_usage() -> Dict[str, int]:
+        return {"api_calls": 0, "cache_hits": 0, "input_tokens": 0, "output_tokens": 0,
+                "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+    
+    @staticmethod
+    def _add_usage(usage: Optional[Dict], response) -> Dict[str, int]:
+        """
+        Ajoute les tokens d'une réponse de l'API aux compteurs du message
+        
+        Returns:
+            Tokens de cet appel
+        """
+        response_usage = getattr(response, "usage", None)
+        # input_tokens exclut les tokens du préfixe lus ou écrits dans le cache de prompt
+        call_usage = {
+            "input_tokens": getattr(response_usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(response_usage, "output_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(response_usage, "cache_read_input_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(response_usage, "cache_creation_input_tokens", 0) or 0
+        }
+        if usage is not None:
+            usage["api_calls"] += 1
+            for key, value in call_usage.items():
+                usage[key] = usage.get(key, 0) + value
+            # Modèle du dernier appel du message : celui qui a rédigé la réponse
+            usage["model"] = getattr(response, "model", None) or usage.get("model")
+        return call_usage
+    
+    @staticmethod
+    def _set_model(usage: Optional[Dict], model: str):
+        """Origine de la réponse quand aucun modèle ne l'a rédigée (cache, secours)"""
+        if usage is not None:
+            usage["model"] = model
+    
+    @staticmethod
+    def _response_model(request: Dict, response) -> str:
+        """Modèle ayant réellement répondu (celui de la requête si l'API ne le renvoie pas)"""
+        return getattr(response, "model", None) or request["model"]
+    
+    def _record_call(self, call: str, request: Dict, response, call_usage: Dict, classification: Dict = None):
+        """
+        Transmet les tokens d'un appel au budget (plafond du même groupe que la requête)
+        et au routeur (consommation par modèle)
+        """
+        self.router.record(self._response_model(request, response), call_usage)
+        classification = classification or {}
+        self.token_budget.record(call, classification.get("category"), classification.get("urgency"),
+                                 call_usage["output_tokens"], request.get("max_tokens"),
+                                 getattr(response, "stop_reason", None))
+    
+    def _cache_call(self, method: str, *args):
+        """Appelle le cache de réponses ; une erreur de cache ne bloque jamais le traitement"""
+        if self.response_cache is None:
+            return None
+        try:
+            return getattr(self.response_cache, method)(*args)
+        except Exception as e:
+            print(f"⚠️ Erreur cache de réponses ({method}): {e}")
+            return None
+    
+    async def _acache_call(self, method: str, *args):
+        """Version asynchrone de _cache_call (SQLite hors de la boucle d'événements)"""
+        if self.response_cache is None:
+            return None
+        return await asyncio.to_thread(self._cache_call, method, *args)
+    
+    def _known_classification(self, classification: Optional[Dict], customer_context: Dict) -> Optional[Dict]:
+        """Classification fournie par l'appelant (rafale de messages similaires)"""
+        if not classification:
+            return None
+        return self._classification_metadata(dict(classification), customer_context, "cluster")
+    
+    def _local_classification(self, message: str, subject: str, customer_context: Dict) -> Optional[Dict]:
+        """
+        Classification du classifieur local si sa confiance atteint le seuil (sans appel
+        à Claude) ; None sinon, ou si le message fait partie de l'échantillon audité
+        """
+        if self.local_classifier is None:
+            return None
+        prediction = self.local_classifier.predict(message, subject)
+        if prediction["confidence"] < self.local_threshold or self._audited(message):
+            return None
+        with self._stats_lock:
+            self.local_stats['decisions'] += 1
+        return self._classification_metadata(prediction, customer_context, "local")
+    
+    def _audited(self, message: str) -> bool:
+        """Échantillon stable (même décision à chaque appel pour un message) classifié par Claude"""
+        return zlib.crc32(message.encode('utf-8')) % 10000 < self.local_audit_rate * 10000
+    
+    def _local_guess(self, message: str, subject: str = "") -> Dict[str, Any]:
+        """Classification estimée avant Claude (routage du mode combiné, spéculation)"""
+        if self.local_classifier is not None:
+            return self.local_classifier.predict(message, subject)
+        return self._fallback_classification(message)
+    
+    def _compare_local(self, message: str, subject: str, classification: Dict):
+        """Concordance de la catégorie locale avec celle de Claude"""
+        if self.local_classifier is None:
+            return
+        prediction = self.local_classifier.predict(message, subject)
+        agree = prediction["category"] == classification.get("category")
+        with self._stats_lock:
+            self.local_stats['compared'] += 1
+            self.local_stats['agreements'] += int(agree)
+            if prediction["confidence"] >= self.local_threshold:
+                self.local_stats['audits'] += 1
+                self.local_stats['audit_agreements'] += int(agree)
+    
+    def _cached_classification(self, cached: Dict, customer_context: Dict, usage: Optional[Dict]) -> Dict[str, Any]:
+        if usage is not None:
+            usage["cache_hits"] += 1
+        return self._classification_metadata(cached, customer_context, "cache")
+    
+    @staticmethod
+    def _cached_response(text: str, on_text: Optional[Callable[[str], None]], usage: Optional[Dict]) -> str:
+        if usage is not None:
+            usage["cache_hits"] += 1
+            usage["model"] = "cache"
+        if on_text:
+            on_text(text)
+        return text
+    
+    def _record_mode_usage(self, mode: str, usage: Dict, fallback: bool = False):
+        with self._stats_lock:
+            stats = self.mode_stats[mode]
+            stats["messages"] += 1
+            stats["fallbacks"] += int(fallback)
+            for key, value in usage.items():
+                if key != "model":
+                    stats[key] += value
+    
+    def _error_result(self, email: str, error: Exception) -> Dict[str, Any]:
+        """Résultat retourné quand le traitement échoue"""
+        return {
+            "email": email,
+            "error": str(error),
+            "processed_at": datetime.now().isoformat(),
+            "model": f"{CLASSIFICATION_MODEL} (erreur)"
+        }
     
     def _fallback_classification(self, message: str) -> Dict[str, Any]:
-        """Classification de secours basée sur mots-clés"""
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ['retard', 'livraison', 'reçu', 'arrivé', 'expédition']):
-            category = 'retard_livraison'
-        elif any(word in message_lower for word in ['remboursement', 'rembourser', 'annuler']):
-            category = 'remboursement'
-        elif any(word in message_lower for word in ['défectueux', 'cassé', 'abîmé', 'problème']):
-            category = 'produit_defectueux'
-        elif any(word in message_lower for word in ['mécontent', 'insatisfait', 'plainte']):
-            category = 'reclamation'
-        else:
-            category = 'information_commande'
+        """Classification de secours basée sur mots-clés (automation.keyword_classifier)"""
+        keywords = get_keyword_classifier().classify(message)
+        
+        # Signes d'escalade : le message est traité comme urgent et négatif (grand modèle au routage)
+        escalation = "escalation" in keywords["markers"]
             
         return {
-            "category": category,
-            "urgency": 3,
-            "sentiment": "neutre",
+            "category": keywords["category"] or 'information_commande',
+            "urgency": 4 if escalation else 3,
+            "sentiment": "negatif" if escalation else "neutre",
             "key_elements": [],
             "requires_human": False,
-            "confidence": 0.6,
+            # Faible sans mot-clé ou quand deux catégories sont proches
+            "confidence": keywords["confidence"],
             "model": "fallback"
         }
     
@@ -533,6 +1464,72 @@ Kevin - Support Client"""
             "claude_available": ANTHROPIC_AVAILABLE,
             "claude_ready": self.is_ready,
             "api_key_configured": bool(self.api_key),
-            "model": "claude-3-sonnet-20240229" if self.is_ready else None,
+            "api_base_url": self.base_url,
+            "model": self.router.classification_model if self.is_ready else None,
+            "default_mode": self.resolve_mode(),
+            "prompt_caching": PROMPT_CACHING,
+            "modes": self._mode_status(),
+            "token_budget": self.token_budget.get_status(),
+            "speculation": self._speculation_status(),
+            "resilience": self.resilience.get_status(),
+            "routing": self.router.get_status(),
+            "structured_output": self._structured_status(),
+            "local_classifier": self._local_status(),
             "last_check": datetime.now().isoformat()
-        } 
\ No newline at end of file
+        }
+    
+    def _speculation_status(self) -> Dict[str, Any]:
+        """Taux de réussite de la génération spéculative et latence gagnée"""
+        with self._stats_lock:
+            stats = dict(self.speculation_stats)
+        count = stats['speculations']
+        stats['hit_rate'] = round(stats['hits'] / count, 3) if count else None
+        stats['latency_saved_ms'] = round(stats['latency_saved_ms'])
+        stats['latency_saved_ms_per_hit'] = round(stats['latency_saved_ms'] / stats['hits']) if stats['hits'] else None
+        return stats
+    
+    def _structured_status(self) -> Dict[str, Any]:
+        """Classifications par outil ou par texte, et appels perdus pour 1 000 messages"""
+        with self._stats_lock:
+            stats = dict(self.structured_stats)
+            messages = sum(values['messages'] for values in self.mode_stats.values())
+        wasted = stats['wasted_classification'] + stats['wasted_combined']
+        stats.update({
+            'tool_use_enabled': CLASSIFICATION_TOOL_USE,
+            'wasted_calls': wasted,
+            'wasted_calls_per_1000_messages': round(wasted * 1000 / messages, 1) if messages else None
+        })
+        return stats
+    
+    def _local_status(self) -> Dict[str, Any]:
+        """Appels de classification évités et concordance du classifieur local avec Claude"""
+        if self.local_classifier is None:
+            return {'enabled': False}
+        with self._stats_lock:
+            stats = dict(self.local_stats)
+        stats.update({
+            'enabled': True,
+            'threshold': self.local_threshold,
+            'audit_rate': self.local_audit_rate,
+            'agreement_rate': round(stats['agreements'] / stats['compared'], 3) if stats['compared'] else None,
+            # Estimation de la précision des décisions prises sans Claude
+            'audit_agreement_rate': (round(stats['audit_agreements'] / stats['audits'], 3)
+                                     if stats['audits'] else None),
+            'model': self.local_classifier.get_status()
+        })
+        return stats
+    
+    def _mode_status(self) -> Dict[str, Any]:
+        """Appels et tokens moyens par message pour chaque mode de traitement"""
+        with self._stats_lock:
+            stats = {mode: dict(values) for mode, values in self.mode_stats.items()}
+        for values in stats.values():
+            count = values["messages"]
+            for key in ("api_calls", "input_tokens", "output_tokens"):
+                values[f"{key}_per_message"] = round(values[key] / count, 1) if count else None
+            # Part des tokens d'entrée servis par le cache de prompt
+            prompt_tokens = (values["input_tokens"] + values["cache_read_input_tokens"]
+                             + values["cache_creation_input_tokens"])
+            values["prompt_cache_read_ratio"] = (round(values["cache_read_input_tokens"] / prompt_tokens, 3)
+                                                 if prompt_tokens else None)
+        return stats 
\ No newline at end of file
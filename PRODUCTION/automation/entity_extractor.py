@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extraction des Entités d'un Message Client
+Numéros de commande (CMD-AAAAMMJJhhmmss-NN émis par /api/orders et anciens
+numéros #123), montants, dates et produits du catalogue, en un seul parcours :
+une expression compilée dont la dernière alternative découpe les mots, puis un
+trie de mots sur les noms de produits (tables produits / products).
+Le texte est normalisé comme pour la classification (automation.keyword_classifier).
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from automation.keyword_classifier import normalize
+
+MONTHS = ("janvier", "fevrier", "mars", "avril", "mai", "juin", "juillet",
+          "aout", "septembre", "octobre", "novembre", "decembre")
+
+# Préfixe (en caractères) à partir duquel un début de nom propre à un seul produit le désigne
+MIN_PRODUCT_PREFIX = 6
+
+# Alternatives essayées dans l'ordre à chaque position (texte normalisé) : les mots
+# commençant par une lettre juste après les numéros de commande (la plupart des positions
+# s'arrêtent là), les montants avant les dates ("12.50 €"), puis les mots restants.
+# Seuls "n°" et "no." introduisent seuls un numéro ("no 3 colis" n'en est pas un), et une
+# date numérique sans "/" doit avoir une année ("3.5 kg" n'est pas une date)
+_ENTITY_PATTERN = re.compile(r"""
+    (?P<cmd>\bcmd-\d{14}-\d{2}\b)
+  | \#\s?(?P<hash>\d{1,10})\b
+  | \b(?:(?:commande|order|numero)\s*(?:n[o°]\.?\s*|numero\s*)?|n°\s*|no\.\s*):?\s*(?P<ref>\d{1,10})\b
+  | (?P<word>[a-z][a-z0-9]*)
+  | (?P<amount>\d+(?:[.,]\d{1,2})?)\s*(?:€|eur\b|euros?\b)
+  | €\s*(?P<amount_before>\d+(?:[.,]\d{1,2})?)
+  | (?P<iso_date>\b\d{4}-\d{2}-\d{2}\b)
+  | \b(?P<day>\d{1,2})(?P<separator>[/.-])(?P<month>\d{1,2})(?:(?P=separator)(?P<year>\d{4}|\d{2}))?\b
+  | \b(?P<named_day>1er|\d{1,2})\s+(?P<month_name>""" + "|".join(MONTHS) + r""")(?:\s+(?P<named_year>\d{4}))?\b
+  | (?P<number>[0-9][a-z0-9]*)
+""", re.VERBOSE)
+
+
+def _date(day: str, month: int, year: Optional[str]) -> Optional[str]:
+    """Date ISO (--MM-JJ sans année), None si le jour ou le mois est impossible"""
+    day = 1 if day == "1er" else int(day)
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    if not year:
+        return f"--{month:02d}-{day:02d}"
+    year = int(year) + (2000 if len(year) == 2 else 0)
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def load_product_catalog(conn) -> List[Tuple[Any, str]]:
+    """
+    (id, nom) des produits de la table produits (celle des commandes), ou de
+    l'ancienne table products si produits n'existe pas
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'produits' in tables:
+        return [(row[0], row[1]) for row in conn.execute('SELECT id, nom FROM produits')]
+    if 'products' in tables:
+        return [(row[0], row[1]) for row in conn.execute('SELECT id, name FROM products')]
+    return []
+
+
+class _TrieNode:
+    __slots__ = ('children', 'products', 'product')
+
+    def __init__(self):
+        self.children = {}
+        self.products = set()   # Produits dont le nom passe par ce nœud
+        self.product = None     # Produit dont le nom complet s'arrête ici
+
+
+class EntityExtractor:
+    """Numéros de commande, montants, dates et produits cités dans un message"""
+
+    def __init__(self, products: Iterable[Tuple[Any, str]] = ()):
+        """
+        Args:
+            products: (id, nom) des produits du catalogue (load_product_catalog)
+        """
+        self.product_count = 0
+        self._trie = _TrieNode()
+        self.load_products(products)
+
+    def load_products(self, products: Iterable[Tuple[Any, str]]):
+        """Remplace le catalogue (trie reconstruit puis échangé d'un bloc)"""
+        trie, count = _TrieNode(), 0
+        for product_id, name in products:
+            words = re.findall(r"[a-z0-9]+", normalize(name or ""))
+            if not words:
+                continue
+            key = (product_id, name)
+            count += 1
+            node = trie
+            for word in words:
+                node = node.children.setdefault(word, _TrieNode())
+                node.products.add(key)
+            node.product = key
+        self._trie, self.product_count = trie, count
+
+    def extract(self, text: str) -> Dict[str, List]:
+        """
+        Returns:
+            Dict avec order_ids (chaînes, 'CMD-...' ou '123'), amounts (float),
+            dates (ISO, '--MM-JJ' sans année) et products ({'id', 'name'}),
+            dans l'ordre du texte et sans doublon
+        """
+        order_ids, amounts, dates, words = [], [], [], []
+        for match in _ENTITY_PATTERN.finditer(normalize(text or "")):
+            kind = match.lastgroup
+            if kind in ('word', 'number'):
+                words.append(match.group(kind))
+            elif kind == 'cmd':
+                order_ids.append(match.group('cmd').upper())
+            elif kind in ('hash', 'ref'):
+                order_ids.append(match.group(kind))
+            elif kind in ('amount', 'amount_before'):
+                amounts.append(float(match.group(kind).replace(',', '.')))
+            elif kind == 'iso_date':
+                year, month, day = match.group('iso_date').split('-')
+                dates.append(_date(day, int(month), year))
+            elif kind in ('day', 'separator', 'month', 'year'):
+                if match.group('separator') == '/' or match.group('year'):
+                    dates.append(_date(match.group('day'), int(match.group('month')), match.group('year')))
+            else:
+                dates.append(_date(match.group('named_day'), MONTHS.index(match.group('month_name')) + 1,
+                                   match.group('named_year')))
+        return {
+            "order_ids": list(dict.fromkeys(order_ids)),
+            "amounts": list(dict.fromkeys(amounts)),
+            "dates": list(dict.fromkeys(date for date in dates if date)),
+            "products": [{"id": product_id, "name": name}
+                         for product_id, name in dict.fromkeys(self._match_products(words))]
+        }
+
+    def _match_products(self, words: List[str]) -> List[Tuple[Any, str]]:
+        """
+        Produits cités : nom complet, ou début de nom propre à un seul produit
+        (au moins MIN_PRODUCT_PREFIX caractères) ; la correspondance la plus longue l'emporte
+        """
+        found = []
+        index = 0
+        while index < len(words):
+            node, chars, best, end = self._trie, 0, None, index
+            for position in range(index, len(words)):
+                node = node.children.get(words[position])
+                if node is None:
+                    break
+                chars += len(words[position])
+                if node.product is not None:
+                    best, end = node.product, position
+                elif len(node.products) == 1 and chars >= MIN_PRODUCT_PREFIX:
+                    best, end = next(iter(node.products)), position
+            if best is None:
+                index += 1
+            else:
+                found.append(best)
+                index = end + 1
+        return found
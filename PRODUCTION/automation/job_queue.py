@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File de Traitement Asynchrone des Messages Client
+La table messages sert de file durable : un message 'nouveau' est réclamé
+par un worker ('en_cours') puis marqué 'traite' par le handler, ou 'erreur'
+(statut terminal, jamais repris) après la dernière tentative.
+"""
+
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import pytz
+
+PARIS_TZ = pytz.timezone('Europe/Paris')
+
+
+class MessageJobQueue:
+    """Pool de workers en arrière-plan alimenté par la table messages"""
+
+    def __init__(self, db_pool, handler: Callable[[int, Dict], Any], workers: int = 4,
+                 max_retries: int = 2, lease_seconds: int = 300,
+                 on_failure: Optional[Callable[[int, str], Any]] = None,
+                 on_skipped: Optional[Callable[[int], Any]] = None):
+        """
+        Initialise la file de traitement
+
+        Args:
+            db_pool: Pool de connexions (SQLiteConnectionPool) vers la base des messages
+            handler: Fonction appelée avec (message_id, options) pour traiter un message
+            workers: Nombre de threads de traitement
+            max_retries: Nombre de nouvelles tentatives après une erreur du handler
+            lease_seconds: Durée après laquelle un message 'en_cours' abandonné est repris
+            on_failure: Fonction appelée avec (message_id, erreur) quand un message
+                passe au statut 'erreur' après sa dernière tentative
+            on_skipped: Fonction appelée avec message_id quand un message de la file
+                n'est pas traité par ce processus (déjà traité ou réclamé ailleurs)
+        """
+        self.db_pool = db_pool
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.lease_seconds = lease_seconds
+        self.on_failure = on_failure
+        self.on_skipped = on_skipped
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._running = False
+        self._options = {}
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+        # Messages terminés récemment (pour le long-polling)
+        self._finished = OrderedDict()
+        self._finished_max = 1000
+        self._done = threading.Condition()
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retried': 0,
+            'recovered': 0
+        }
+
+    def start(self):
+        """Reprend les messages en attente puis démarre les workers"""
+        if self._running:
+            return
+
+        self._running = True
+        self.recover()
+
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"message-worker-{index + 1}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        print(f"✅ [JobQueue] {self.workers} workers démarrés")
+
+    def stop(self, timeout: float = 5.0):
+        """Arrête les workers après la fin des traitements en cours"""
+        if not self._running:
+            return
+
+        self._running = False
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        print("🔌 [JobQueue] Workers arrêtés")
+
+    def submit(self, message_id: int, options: Optional[Dict] = None):
+        """Ajoute un message déjà enregistré (statut 'nouveau') à la file"""
+        with self._lock:
+            if options:
+                self._options[message_id] = options
+            self.stats['submitted'] += 1
+        self._queue.put(message_id)
+
+    def recover(self) -> int:
+        """
+        Remet en file les messages non traités (redémarrage, crash d'un worker)
+
+        Returns:
+            Nombre de messages remis en file
+        """
+        try:
+            stale_before = datetime.now(PARIS_TZ) - timedelta(seconds=self.lease_seconds)
+
+            with self.db_pool.connection() as conn:
+                # Libérer les messages réclamés par un worker disparu
+                # (ceux d'un lot de la Message Batches API restent au traitement par lots)
+                conn.execute('''
+                    UPDATE messages SET status = 'nouveau'
+                    WHERE status = 'en_cours' AND updated_at < ? AND batch_id IS NULL
+                ''', (stale_before,))
+
+                rows = conn.execute(
+                    "SELECT id FROM messages WHERE status = 'nouveau' ORDER BY id"
+                ).fetchall()
+        except Exception as e:
+            print(f"⚠️ [JobQueue] Erreur reprise des messages: {e}")
+            return 0
+
+        for row in rows:
+            self._queue.put(row['id'])
+
+        with self._lock:
+            self.stats['recovered'] += len(rows)
+
+        if rows:
+            print(f"🔄 [JobQueue] {len(rows)} messages en attente remis en file")
+        return len(rows)
+
+    def claim(self, message_id: int) -> bool:
+        """Passe le message en 'en_cours' si aucun autre worker ne l'a pris"""
+        with self.db_pool.connection() as conn:
+            cursor = conn.execute('''
+                UPDATE messages SET status = 'en_cours', updated_at = ?
+                WHERE id = ? AND status = 'nouveau'
+            ''', (datetime.now(PARIS_TZ), message_id))
+            return cursor.rowcount == 1
+
+    def release(self, message_id: int):
+        """Remet un message 'en_cours' au statut 'nouveau' après un échec"""
+        with self.db_pool.connection() as conn:
+            conn.execute('''
+                UPDATE messages SET status = 'nouveau', updated_at = ?
+                WHERE id = ? AND status = 'en_cours'
+            ''', (datetime.now(PARIS_TZ), message_id))
+
+    def fail(self, message_id: int, error: str):
+        """Passe un message 'en_cours' au statut terminal 'erreur' (plus jamais remis en file)"""
+        with self.db_pool.connection() as conn:
+            conn.execute('''
+                UPDATE messages SET status = 'erreur', processing_error = ?, updated_at = ?
+                WHERE id = ? AND status = 'en_cours'
+            ''', (error[:500], datetime.now(PARIS_TZ), message_id))
+
+    def _worker_loop(self):
+        while True:
+            message_id = self._queue.get()
+            if message_id is None:
+                break
+
+            try:
+                if not self.claim(message_id):
+                    with self._lock:
+                        self._options.pop(message_id, None)
+                    if self.on_skipped:
+                        self.on_skipped(message_id)
+                    continue
+                self._run(message_id)
+            except Exception as e:
+                print(f"❌ [JobQueue] Erreur worker sur message {message_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _run(self, message_id: int):
+        with self._lock:
+            options = self._options.get(message_id, {})
+
+        try:
+            self.handler(message_id, options)
+        except Exception as e:
+            print(f"❌ [JobQueue] Échec traitement message {message_id}: {e}")
+
+            with self._lock:
+                attempts = self._attempts.get(message_id, 0) + 1
+                self._attempts[message_id] = attempts
+                failed = attempts > self.max_retries
+                retry = not failed and self._running
+                self.stats['failed' if failed else 'retried'] += 1
+                if not retry:
+                    self._attempts.pop(message_id, None)
+                    self._options.pop(message_id, None)
+
+            if not failed:
+                # Arrêt en cours : le message reste 'nouveau' et sera repris au redémarrage
+                self.release(message_id)
+                if retry:
+                    self._queue.put(message_id)
+                return
+
+            self.fail(message_id, str(e))
+            print(f"🛑 [JobQueue] Message {message_id} abandonné après {attempts} tentatives")
+            if self.on_failure:
+                try:
+                    self.on_failure(message_id, str(e))
+                except Exception as callback_error:
+                    print(f"⚠️ [JobQueue] Erreur notification échec message {message_id}: {callback_error}")
+            self._mark_finished(message_id)
+            return
+
+        with self._lock:
+            self._attempts.pop(message_id, None)
+            self._options.pop(message_id, None)
+            self.stats['completed'] += 1
+
+        self._mark_finished(message_id)
+
+    def _mark_finished(self, message_id: int):
+        """Réveille les long-pollings en attente du message (traité ou en erreur)"""
+        with self._done:
+            self._finished[message_id] = True
+            while len(self._finished) > self._finished_max:
+                self._finished.popitem(last=False)
+            self._done.notify_all()
+
+    def wait_for(self, message_id: int, timeout: float) -> bool:
+        """
+        Attend la fin du traitement d'un message (long-polling)
+
+        Returns:
+            True si le traitement du message (réussi ou abandonné) s'est terminé
+            dans ce processus avant le délai
+        """
+        with self._done:
+            return self._done.wait_for(lambda: message_id in self._finished, timeout)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état de la file pour le monitoring"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'running': self._running,
+            'workers': self.workers,
+            'pending': self._queue.qsize()
+        })
+        return stats
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classification par Mots-Clés (moteur commun aux chemins de secours)
+Les tables de mots-clés pondérés sont compilées une seule fois en automate
+d'Aho-Corasick ; le texte est normalisé (casse et accents) en une passe puis
+parcouru une seule fois pour obtenir le score de chaque catégorie. Utilisé par
+ClaudeAgent (classification locale), SupportAgent et la simulation de l'interface web.
+"""
+
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+# Mots-clés normalisés (minuscules, sans accents) et leur poids, par catégorie : un
+# radical couvre ses dérivés ("rembours"). L'ordre des catégories départage les égalités.
+CATEGORY_KEYWORDS = {
+    "retard_livraison": {
+        "retard": 2, "livraison": 1, "delai": 1, "arrive": 1, "transporteur": 1, "suivi": 1,
+        "ou est": 1, "quand": 0.5, "expedition": 1, "colis": 1, "recu": 0.5
+    },
+    "remboursement": {
+        "rembours": 2, "annuler": 1, "argent": 1,
+        "paiement": 0.5, "retour": 1, "recu": 0.5
+    },
+    "produit_defectueux": {
+        "defectueux": 3, "casse": 3, "abime": 3, "endommage": 3, "defaut": 1, "probleme": 1,
+        "marche pas": 1, "fonctionne pas": 1, "mauvais etat": 1, "qualite": 0.5
+    },
+    "information_commande": {
+        "information": 1, "detail": 1, "statut": 1, "facture": 1, "confirmation": 1,
+        "etat": 0.5, "resume": 0.5, "liste": 0.5, "contenu": 0.5, "recu": 0.5
+    },
+    "reclamation": {
+        "mecontent": 2, "insatisfait": 2, "plainte": 2, "reclamation": 2
+    }
+}
+
+# Marqueurs détectés dans le même parcours, sans effet sur les scores
+ESCALATION_KEYWORDS = ("urgent", "immediatement", "inadmissible", "inacceptable", "scandale", "avocat")
+
+# Catégories ayant des réponses types (Notion, simulation de l'interface web)
+TEMPLATE_CATEGORIES = ("retard_livraison", "remboursement", "produit_defectueux", "information_commande")
+
+# Libellés des catégories dans les réponses types
+CATEGORY_LABELS = {
+    "retard_livraison": "Retard de livraison",
+    "remboursement": "Remboursement",
+    "produit_defectueux": "Produit défectueux",
+    "information_commande": "Information commande",
+    "reclamation": "Réclamation"
+}
+
+
+def _normalization_table() -> tuple:
+    """
+    Table de str.translate indexée par point de code (latin et ponctuation
+    typographique) : majuscules et lettres accentuées vers la minuscule sans accent.
+    Un tuple évite l'exception levée par un dict pour chaque caractère inchangé.
+    """
+    table = []
+    for code in range(0x2020):
+        char = chr(code)
+        base = "".join(c for c in unicodedata.normalize("NFKD", char.lower()) if not unicodedata.combining(c))
+        table.append(base if 0x41 <= code < 0x250 and base else char)
+    # Apostrophes typographiques et ligatures courantes en français
+    for char, base in (("’", "'"), ("œ", "oe"), ("Œ", "oe"), ("æ", "ae"), ("Æ", "ae")):
+        table[ord(char)] = base
+    return tuple(table)
+
+
+_NORMALIZE = _normalization_table()
+
+
+def normalize(text: str) -> str:
+    """Minuscules sans accents, en une seule passe sur le texte (caractères au-delà de la table inchangés)"""
+    return text.translate(_NORMALIZE)
+
+
+class KeywordAutomaton:
+    """Automate d'Aho-Corasick : toutes les occurrences de tous les mots-clés en un parcours"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(keywords))
+        goto = [{}]
+        outputs = [set()]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append(set())
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].add(index)
+
+        # Liens d'échec en largeur, puis transitions complètes (automate déterministe) :
+        # le parcours ne suit plus aucun lien d'échec
+        fail = [0] * len(goto)
+        self._delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions = dict(self._delta[fail[state]])
+            transitions.update(goto[state])
+            self._delta[state] = transitions
+            for char, child in goto[state].items():
+                fail[child] = self._delta[fail[state]].get(char, 0) if state else 0
+                outputs[child] |= outputs[fail[child]]
+                queue.append(child)
+        self._outputs = [frozenset(output) for output in outputs]
+
+    def search(self, text: str) -> set:
+        """Indices (dans self.keywords) des mots-clés présents dans le texte déjà normalisé"""
+        delta, outputs = self._delta, self._outputs
+        found = set()
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+
+class KeywordClassifier:
+    """Scores pondérés par catégorie et marqueurs, en un parcours du texte"""
+
+    def __init__(self, tables: Dict[str, Dict[str, float]] = None,
+                 markers: Optional[Dict[str, Iterable[str]]] = None):
+        """
+        Args:
+            tables: Mots-clés et poids par catégorie (CATEGORY_KEYWORDS par défaut)
+            markers: Listes de mots-clés signalés sans score ({'escalation': ESCALATION_KEYWORDS} par défaut)
+        """
+        self.tables = CATEGORY_KEYWORDS if tables is None else tables
+        self.markers = {"escalation": ESCALATION_KEYWORDS} if markers is None else markers
+        self.categories = list(self.tables)
+
+        # Un mot-clé peut compter pour plusieurs catégories ou marqueurs
+        self._targets = {}
+        for category, keywords in self.tables.items():
+            for keyword, weight in keywords.items():
+                self._targets.setdefault(normalize(keyword), []).append((category, weight))
+        for marker, keywords in self.markers.items():
+            for keyword in keywords:
+                self._targets.setdefault(normalize(keyword), []).append((marker, None))
+        self.automaton = KeywordAutomaton(self._targets)
+
+    def classify(self, text: str, among: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Classifie un texte (chaque mot-clé compte une fois, quel que soit son nombre d'occurrences)
+
+        Args:
+            among: Catégories admises (toutes par défaut)
+
+        Returns:
+            Dict avec category (None sans mot-clé), score, scores, confidence,
+            markers (marqueurs trouvés) et keywords (mots-clés trouvés)
+        """
+        found = self.automaton.search(normalize(text or ""))
+        scores = dict.fromkeys(self.categories, 0.0)
+        markers = set()
+        keywords = [self.automaton.keywords[index] for index in sorted(found)]
+        for keyword in keywords:
+            for target, weight in self._targets[keyword]:
+                if weight is None:
+                    markers.add(target)
+                else:
+                    scores[target] += weight
+
+        # Meilleure catégorie admise (la première en cas d'égalité) et deuxième score
+        best, top, second = None, 0.0, 0.0
+        for category in self.categories:
+            if among is not None and category not in among:
+                continue
+            score = scores[category]
+            if best is None or score > top:
+                best, top, second = category, score, top
+            elif score > second:
+                second = score
+        return {
+            "category": best if top > 0 else None,
+            "score": top,
+            "scores": scores,
+            "confidence": self._confidence(top, second),
+            "markers": markers,
+            "keywords": keywords
+        }
+
+    @staticmethod
+    def _confidence(top: float, second: float) -> float:
+        """Confiance selon le score et l'écart avec la deuxième catégorie (0,5 sans mot-clé)"""
+        if top <= 0:
+            return 0.5
+        margin = (top - second) / top
+        return round(min(0.95, 0.5 + 0.25 * margin + 0.05 * min(top, 4)), 2)
+
+    def label(self, text: str, among: Optional[Iterable[str]] = None,
+              default: Optional[str] = None) -> Optional[str]:
+        """Libellé de la catégorie (CATEGORY_LABELS) ou `default` sans mot-clé"""
+        category = self.classify(text, among)["category"]
+        return CATEGORY_LABELS.get(category, category) if category else default
+
+
+_default_classifier = None
+
+
+def get_keyword_classifier() -> KeywordClassifier:
+    """Classifieur partagé, compilé au premier usage"""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = KeywordClassifier()
+    return _default_classifier
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classifieur Local TF-IDF + Régression Logistique (NumPy)
+Appris sur les messages déjà classifiés par Claude (catégorie, urgence, sentiment),
+enregistré dans un fichier .npz compact. ClaudeAgent l'utilise pour se passer de
+l'appel de classification quand la confiance locale dépasse un seuil.
+
+Usage (depuis PRODUCTION/) :
+    python automation/local_classifier.py train                # data/local_classifier.npz
+    python automation/local_classifier.py train --max-features 4000 --epochs 300
+    python automation/local_classifier.py predict "Mon colis n'est jamais arrivé"
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+if __name__ == '__main__':
+    # Exécuté comme script : les modules du projet sont relatifs à PRODUCTION/
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automation.keyword_classifier import normalize
+from automation.structured_output import CATEGORIES, SENTIMENTS
+
+# Champs appris, dans l'ordre des colonnes lues en base
+HEADS = ("category", "urgency", "sentiment")
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Mots normalisés (2 caractères et plus) et bigrammes de mots"""
+    words = [word for word in _WORD.findall(normalize(text or "")) if len(word) > 1]
+    return words + [f"{first}_{second}" for first, second in zip(words, words[1:])]
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class _SparseRows:
+    """Matrice creuse ligne par ligne (format CSR) des vecteurs TF-IDF d'un lot de messages"""
+
+    def __init__(self, rows):
+        """rows: (indices, valeurs) de chaque ligne, listes ou tableaux"""
+        lengths = [len(indices) for indices, _ in rows]
+        self.indptr = np.cumsum([0] + lengths)
+        self.indices = np.fromiter(chain.from_iterable(indices for indices, _ in rows), dtype=np.int64,
+                                   count=self.indptr[-1])
+        self.data = np.fromiter(chain.from_iterable(values for _, values in rows), dtype=np.float32,
+                                count=self.indptr[-1])
+        self.row_of = np.repeat(np.arange(len(rows)), lengths)
+        self.shape = len(rows)
+
+    def dot(self, weights):
+        """X @ W (sommes par ligne contiguës : reduceat plutôt qu'une accumulation indexée)"""
+        result = np.zeros((self.shape, weights.shape[1]), dtype=np.float32)
+        filled = self.indptr[1:] > self.indptr[:-1]
+        if filled.any():
+            products = self.data[:, None] * weights[self.indices]
+            result[filled] = np.add.reduceat(products, self.indptr[:-1][filled], axis=0)
+        return result
+
+    def tdot(self, gradient, features):
+        """X.T @ G"""
+        result = np.zeros((features, gradient.shape[1]), dtype=np.float32)
+        np.add.at(result, self.indices, self.data[:, None] * gradient[self.row_of])
+        return result
+
+
+class LocalClassifier:
+    """Prédiction de la catégorie, de l'urgence et du sentiment d'un message"""
+
+    def __init__(self, vocabulary: Iterable[str], idf, heads: Dict[str, Dict[str, Any]],
+                 meta: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            vocabulary: Termes (mots et bigrammes), dans l'ordre des lignes des poids
+            idf: Poids IDF de chaque terme
+            heads: Par champ appris : weights (termes x classes), bias, labels
+            meta: Informations d'entraînement (date, lignes, précision)
+        """
+        self.vocabulary = {term: index for index, term in enumerate(vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.heads = heads
+        self.meta = meta or {}
+        self._idf = self.idf.tolist()
+        self._compile()
+
+    def _compile(self):
+        """Poids des champs juxtaposés : une seule lecture des lignes du message pour tous les champs"""
+        self._slices, start = {}, 0
+        for head, model in self.heads.items():
+            self._slices[head] = slice(start, start + len(model['labels']))
+            start += len(model['labels'])
+        if self.heads:
+            self._weights = np.hstack([model['weights'] for model in self.heads.values()]).astype(np.float32)
+            self._bias = np.concatenate([model['bias'] for model in self.heads.values()]).astype(np.float32)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        """Charge un modèle enregistré par save()"""
+        with np.load(path, allow_pickle=False) as data:
+            heads = {
+                head: {
+                    'weights': data[f"{head}_weights"],
+                    'bias': data[f"{head}_bias"],
+                    'labels': [str(label) for label in data[f"{head}_labels"]]
+                }
+                for head in HEADS if f"{head}_weights" in data
+            }
+            return cls([str(term) for term in data["vocabulary"]], data["idf"], heads,
+                       json.loads(str(data["meta"])))
+
+    def save(self, path: str):
+        arrays = {
+            "vocabulary": np.array(sorted(self.vocabulary, key=self.vocabulary.get)),
+            "idf": self.idf,
+            "meta": np.array(json.dumps(self.meta, ensure_ascii=False))
+        }
+        for head, model in self.heads.items():
+            arrays.update({
+                f"{head}_weights": model['weights'].astype(np.float32),
+                f"{head}_bias": model['bias'].astype(np.float32),
+                f"{head}_labels": np.array(model['labels'])
+            })
+        np.savez_compressed(path, **arrays)
+
+    def vectorize(self, text: str):
+        indices, values = self._vector(tokenize(text))
+        return np.array(indices, dtype=np.int64), np.array(values, dtype=np.float32)
+
+    def _vector(self, tokens: List[str]):
+        """(indices, valeurs) du vecteur TF-IDF normalisé (tf sous-linéaire), termes inconnus ignorés"""
+        counts = {}
+        for index in map(self.vocabulary.get, tokens):
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        if not counts:
+            return [], []
+        # Quelques dizaines de termes par message : plus rapide en Python qu'en petits tableaux NumPy
+        idf = self._idf
+        values = [(1.0 + math.log(count)) * idf[index] for index, count in counts.items()]
+        norm = math.sqrt(sum(value * value for value in values))
+        return list(counts), [value / norm for value in values]
+
+    def predict(self, message: str, subject: str = "") -> Dict[str, Any]:
+        """
+        Classification au format de ClaudeAgent ; confidence est la probabilité de
+        la catégorie prédite (0 si aucun terme du message n'est connu)
+        """
+        indices, values = self.vectorize(f"{subject} {message}")
+        result, probabilities = {}, {}
+        scores = values @ self._weights[indices] + self._bias if len(indices) and self.heads else None
+        for head, model in self.heads.items():
+            if scores is None:
+                result[head], probabilities[head] = None, 0.0
+                continue
+            head_scores = scores[self._slices[head]].tolist()
+            best = max(range(len(head_scores)), key=head_scores.__getitem__)
+            total = sum(math.exp(score - head_scores[best]) for score in head_scores)
+            result[head], probabilities[head] = model['labels'][best], 1.0 / total
+
+        return self._classification(result, probabilities.get('category', 0.0))
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Classifie un lot de textes (sujet et message déjà réunis) : un produit creux
+        pour tout le lot et des softmax vectorisés, au lieu d'un calcul par message
+        """
+        if not texts or not self.heads:
+            return [self.predict(text) for text in texts]
+        matrix = _SparseRows([self._vector(tokenize(text)) for text in texts])
+        scores = matrix.dot(self._weights) + self._bias
+        known = matrix.indptr[1:] > matrix.indptr[:-1]
+
+        columns = {}
+        for head, model in self.heads.items():
+            proba = _softmax(scores[:, self._slices[head]])
+            best = proba.argmax(axis=1)
+            labels = np.array(model['labels'], dtype=object)[best]
+            columns[head] = (np.where(known, labels, None).tolist(),
+                             np.where(known, proba[np.arange(len(texts)), best], 0.0).tolist())
+
+        confidences = columns['category'][1] if 'category' in columns else [0.0] * len(texts)
+        return [
+            self._classification({head: values[0][row] for head, values in columns.items()}, confidences[row])
+            for row in range(len(texts))
+        ]
+
+    @staticmethod
+    def _classification(result: Dict[str, Any], confidence: float) -> Dict[str, Any]:
+        urgency = int(result['urgency']) if result.get('urgency') else 3
+        return {
+            "category": result.get('category') or "autre",
+            "urgency": urgency,
+            "sentiment": result.get('sentiment') or "neutre",
+            "key_elements": [],
+            "requires_human": urgency >= 5,
+            "confidence": round(confidence, 4),
+            "model": "local"
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return dict(self.meta, terms=len(self.vocabulary))
+
+
+def load_training_rows(db_path: str, limit: Optional[int] = None) -> List[sqlite3.Row]:
+    """
+    Messages traités dont la classification vient de Claude (ni secours, ni cache, ni
+    modèle local) ; model_used pour les messages antérieurs à la colonne classified_by
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+        source = ("COALESCE(classified_by, model_used)" if 'classified_by' in columns else "model_used")
+        query = f'''
+            SELECT subject, message, category, urgency, sentiment FROM messages
+            WHERE status IN ('traite', 'ferme') AND category IS NOT NULL AND {source} LIKE 'claude%'
+            ORDER BY id DESC
+        '''
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def train(rows, max_features: int = 5000, min_df: int = 2, epochs: int = 200, learning_rate: float = 0.5,
+          l2: float = 1e-4, holdout: float = 0.2, seed: int = 0) -> LocalClassifier:
+    """
+    Apprend le vocabulaire, l'IDF et une régression logistique multinomiale par champ
+    (descente de gradient Adam sur le lot complet). Une part des lignes est gardée
+    pour mesurer la précision, puis le modèle final est appris sur toutes les lignes.
+    """
+    rows = [row for row in rows if row['category'] in CATEGORIES]
+    documents = [tokenize(f"{row['subject'] or ''} {row['message']}") for row in rows]
+    order = np.random.default_rng(seed).permutation(len(rows))
+    split = int(len(rows) * (1 - holdout)) if holdout else len(rows)
+    evaluation = _fit(rows, documents, order[:split], max_features, min_df, epochs, learning_rate, l2)
+    metrics = _evaluate(evaluation, [rows[i] for i in order[split:]]) if split < len(rows) else {}
+
+    model = _fit(rows, documents, order, max_features, min_df, epochs, learning_rate, l2)
+    model.meta = {
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': len(rows),
+        'holdout_rows': len(rows) - split,
+        **metrics
+    }
+    return model
+
+
+def _fit(rows, documents, selection, max_features, min_df, epochs, learning_rate, l2) -> LocalClassifier:
+    document_frequency = Counter(term for index in selection for term in set(documents[index]))
+    vocabulary = [term for term, count in document_frequency.most_common(max_features) if count >= min_df]
+    idf = np.array([math.log((1 + len(selection)) / (1 + document_frequency[term])) + 1 for term in vocabulary],
+                   dtype=np.float32)
+    model = LocalClassifier(vocabulary, idf, {})
+    matrix = _SparseRows([model._vector(documents[index]) for index in selection])
+
+    for head in HEADS:
+        values = [str(rows[index][head]) if rows[index][head] is not None else None for index in selection]
+        labels = sorted({value for value in values if value is not None})
+        if head == 'sentiment':
+            labels = [label for label in SENTIMENTS if label in labels]
+        if len(labels) < 2:
+            continue
+        targets = np.zeros((len(selection), len(labels)), dtype=np.float32)
+        for row, value in enumerate(values):
+            if value in labels:
+                targets[row, labels.index(value)] = 1.0
+        weights, bias = _logistic_regression(matrix, targets, len(vocabulary), epochs, learning_rate, l2)
+        model.heads[head] = {'weights': weights, 'bias': bias, 'labels': labels}
+    model._compile()
+    return model
+
+
+def _logistic_regression(matrix: _SparseRows, targets, features, epochs, learning_rate, l2):
+    """Régression logistique multinomiale (softmax), Adam sur le lot complet"""
+    classes = targets.shape[1]
+    known = targets.sum(axis=1) > 0
+    count = max(1, int(known.sum()))
+    params = [np.zeros((features, classes), dtype=np.float32), np.zeros(classes, dtype=np.float32)]
+    moments = [[np.zeros_like(param), np.zeros_like(param)] for param in params]
+    for step in range(1, epochs + 1):
+        error = (_softmax(matrix.dot(params[0]) + params[1]) - targets) * known[:, None]
+        gradients = [matrix.tdot(error, features) / count + l2 * params[0], error.sum(axis=0) / count]
+        for param, gradient, moment in zip(params, gradients, moments):
+            moment[0] = 0.9 * moment[0] + 0.1 * gradient
+            moment[1] = 0.999 * moment[1] + 0.001 * gradient ** 2
+            param -= learning_rate * (moment[0] / (1 - 0.9 ** step)) / (np.sqrt(moment[1] / (1 - 0.999 ** step)) + 1e-8)
+    return params
+
+
+def _evaluate(model: LocalClassifier, rows) -> Dict[str, Any]:
+    """Précision par champ et précision/couverture de la catégorie par seuil de confiance"""
+    predictions = [model.predict(row['message'], row['subject'] or "") for row in rows]
+    metrics = {}
+    for head in HEADS:
+        pairs = [(str(prediction[head]), str(row[head])) for prediction, row in zip(predictions, rows)
+                 if row[head] is not None]
+        metrics[f"{head}_accuracy"] = round(sum(a == b for a, b in pairs) / len(pairs), 3) if pairs else None
+    thresholds = {}
+    for threshold in (0.6, 0.7, 0.8, 0.9, 0.95):
+        kept = [(prediction, row) for prediction, row in zip(predictions, rows) if prediction['confidence'] >= threshold]
+        thresholds[str(threshold)] = {
+            'coverage': round(len(kept) / len(rows), 3) if rows else None,
+            'accuracy': round(sum(p['category'] == r['category'] for p, r in kept) / len(kept), 3) if kept else None
+        }
+    metrics['category_thresholds'] = thresholds
+    return metrics
+
+
+def main():
+    from config import LOCAL_CLASSIFIER_CONFIG
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Classifieur local TF-IDF + régression logistique")
+    parser.add_argument('command', choices=('train', 'predict'))
+    parser.add_argument('text', nargs='?', default="", help="Message à classifier (predict)")
+    parser.add_argument('--db', default=os.path.join(base_dir, 'data', 'crm_ecommerce.db'))
+    parser.add_argument('--model', default=os.path.join(base_dir, LOCAL_CLASSIFIER_CONFIG['model_path']))
+    parser.add_argument('--limit', type=int, default=None, help="Messages les plus récents utilisés")
+    parser.add_argument('--min-rows', type=int, default=200, help="Messages classifiés nécessaires")
+    parser.add_argument('--max-features', type=int, default=5000)
+    parser.add_argument('--epochs', type=int, default=200)
+    args = parser.parse_intermixed_args()
+
+    if args.command == 'predict':
+        started = time.perf_counter()
+        model = LocalClassifier.load(args.model)
+        loaded = time.perf_counter()
+        prediction = model.predict(args.text)
+        print(f"⏱️ Chargement {1000 * (loaded - started):.1f} ms, "
+              f"classification {1e6 * (time.perf_counter() - loaded):.0f} µs")
+        print(json.dumps(prediction, ensure_ascii=False, indent=2))
+        return 0
+
+    rows = load_training_rows(args.db, args.limit)
+    if len(rows) < args.min_rows:
+        print(f"❌ {len(rows)} messages classifiés par Claude, {args.min_rows} nécessaires (--min-rows)")
+        return 1
+    print(f"🧠 Entraînement sur {len(rows)} messages...")
+    started = time.perf_counter()
+    model = train(rows, max_features=args.max_features, epochs=args.epochs)
+    model.save(args.model)
+    print(f"✅ Modèle enregistré: {args.model} ({os.path.getsize(args.model) // 1024} Ko, "
+          f"{len(model.vocabulary)} termes, {time.perf_counter() - started:.1f} s)")
+    print(json.dumps(model.meta, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
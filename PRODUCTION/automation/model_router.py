@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Routage des Messages entre Modèles Claude
+Un modèle rapide et économique pour les messages peu urgents dont la
+classification est sûre, le grand modèle pour les messages urgents, négatifs
+ou nécessitant un humain. Les appels, tokens et coûts estimés sont suivis par
+modèle pour comparer les deux niveaux.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+FAST_TIER = "fast"
+LARGE_TIER = "large"
+
+# Prix indicatifs en $ par million de tokens (entrée, sortie), par famille de modèle
+MODEL_PRICES = {
+    'haiku': (0.8, 4.0),
+    'sonnet': (3.0, 15.0),
+    'opus': (15.0, 75.0)
+}
+
+
+def estimate_cost(model: str, usage: Dict[str, int]) -> float:
+    """Coût estimé d'un appel en dollars (lecture du cache de prompt à 10 %, écriture à 125 %)"""
+    family = next((name for name in MODEL_PRICES if name in (model or '')), None)
+    if family is None:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[family]
+    input_tokens = (usage.get('input_tokens', 0)
+                    + 0.1 * usage.get('cache_read_input_tokens', 0)
+                    + 1.25 * usage.get('cache_creation_input_tokens', 0))
+    return (input_tokens * input_price + usage.get('output_tokens', 0) * output_price) / 1_000_000
+
+
+class ModelRouter:
+    """Choix du modèle par message selon l'urgence, le sentiment et la confiance de la classification"""
+
+    def __init__(self, fast_model: str, large_model: str, classification_model: Optional[str] = None,
+                 enabled: bool = True, max_fast_urgency: int = 3, min_confidence: float = 0.7,
+                 large_sentiments: Iterable[str] = ('negatif', 'tres_negatif'),
+                 large_categories: Iterable[str] = ('reclamation',)):
+        """
+        Args:
+            fast_model: Modèle rapide et économique
+            large_model: Modèle utilisé pour les cas sensibles (et pour tout si le routage est désactivé)
+            classification_model: Modèle des appels de classification seule (grand modèle par
+                défaut : le préfixe système mis en cache, ~1,5k tokens, est sous le minimum
+                cachable des modèles Haiku, 2048 tokens)
+            enabled: False : tous les messages vont au grand modèle
+            max_fast_urgency: Urgence maximale pour le modèle rapide
+            min_confidence: Confiance minimale de la classification pour le modèle rapide
+            large_sentiments: Sentiments toujours traités par le grand modèle
+            large_categories: Catégories toujours traitées par le grand modèle
+        """
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.classification_model = classification_model or large_model
+        self.enabled = enabled
+        self.max_fast_urgency = max_fast_urgency
+        self.min_confidence = min_confidence
+        self.large_sentiments = set(large_sentiments)
+        self.large_categories = set(large_categories)
+
+        self._lock = threading.Lock()
+        self.decisions = {FAST_TIER: 0, LARGE_TIER: 0}
+        self.models = {}
+
+    def tier(self, classification: Optional[Dict]) -> str:
+        """Niveau de modèle pour une classification (locale ou Claude)"""
+        if not self.enabled or not classification:
+            return LARGE_TIER
+        if (classification.get('requires_human')
+                or classification.get('sentiment') in self.large_sentiments
+                or classification.get('category') in self.large_categories
+                or (classification.get('urgency') or 5) > self.max_fast_urgency
+                or (classification.get('confidence') or 0) < self.min_confidence):
+            return LARGE_TIER
+        return FAST_TIER
+
+    def route(self, classification: Optional[Dict]) -> str:
+        """Modèle de génération (réponse ou appel combiné) pour une classification"""
+        tier = self.tier(classification)
+        with self._lock:
+            self.decisions[tier] += 1
+        return self.fast_model if tier == FAST_TIER else self.large_model
+
+    def record(self, model: str, usage: Dict[str, int]):
+        """Enregistre les tokens d'un appel pour le modèle qui a répondu"""
+        with self._lock:
+            stats = self.models.get(model)
+            if stats is None:
+                stats = self.models[model] = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0,
+                                              'cost_usd': 0.0}
+            stats['calls'] += 1
+            stats['input_tokens'] += usage.get('input_tokens', 0)
+            stats['output_tokens'] += usage.get('output_tokens', 0)
+            stats['cost_usd'] += estimate_cost(model, usage)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Décisions de routage et consommation par modèle"""
+        with self._lock:
+            models = {model: dict(stats) for model, stats in self.models.items()}
+            decisions = dict(self.decisions)
+        for stats in models.values():
+            stats['cost_usd'] = round(stats['cost_usd'], 4)
+            stats['cost_usd_per_call'] = round(stats['cost_usd'] / stats['calls'], 5) if stats['calls'] else None
+        return {
+            'enabled': self.enabled,
+            'fast_model': self.fast_model,
+            'large_model': self.large_model,
+            'classification_model': self.classification_model,
+            'decisions': decisions,
+            'models': models
+        }
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limitation de Débit et Contrôle d'Admission
+Token bucket par expéditeur et plafond global d'appels Claude simultanés
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Tuple
+
+
+class TokenBucketLimiter:
+    """Limiteur token bucket par clé (email de l'expéditeur)"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        """
+        Args:
+            rate_per_minute: Jetons rechargés par minute et par expéditeur
+            burst: Capacité du seau (messages acceptés d'affilée)
+            max_keys: Nombre maximum d'expéditeurs suivis en mémoire
+        """
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+
+        # clé -> [jetons, dernier remplissage]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'allowed': 0,
+            'limited': 0
+        }
+
+    def acquire(self, key: str) -> Tuple[bool, float]:
+        """
+        Consomme un jeton pour la clé
+
+        Returns:
+            (autorisé, secondes avant le prochain jeton si refusé)
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[key] = bucket
+                # Oublier les expéditeurs les plus anciens (leur seau serait plein)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.stats['allowed'] += 1
+                return True, 0.0
+
+            self.stats['limited'] += 1
+            retry_after = (1 - bucket[0]) / self.rate if self.rate > 0 else 60.0
+            return False, retry_after
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du limiteur pour le monitoring"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['tracked_senders'] = len(self._buckets)
+        stats.update({
+            'rate_per_minute': round(self.rate * 60, 2),
+            'burst': self.burst
+        })
+        return stats
+
+
+class ClaudeAdmissionController:
+    """
+    Plafond global d'appels Claude en cours et file d'attente bornée
+
+    Une admission est réservée par admit() avant l'enregistrement du message, rattachée
+    au message par attach() puis libérée une seule fois par release() quand il est
+    traité ou abandonné. slot()/aslot() ne comptent que les appels en cours.
+    """
+
+    def __init__(self, max_inflight: int, max_queued: int):
+        """
+        Args:
+            max_inflight: Nombre maximum de traitements Claude simultanés
+            max_queued: Nombre maximum de messages admis en attente d'un créneau
+        """
+        self.max_inflight = max(1, max_inflight)
+        self.max_inflight_async = self.max_inflight
+        self.max_queued = max_queued
+
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._async_slots = None
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self._admitted = set()
+        self.inflight = 0
+        self.avg_duration = 10.0
+        self.stats = {
+            'admitted': 0,
+            'rejected': 0,
+            'released': 0,
+            'completed': 0
+        }
+
+    @property
+    def backlog(self) -> int:
+        """Messages admis et pas encore terminés (réservations comprises)"""
+        return self._reserved + len(self._admitted)
+
+    def admit(self) -> Tuple[bool, int]:
+        """
+        Réserve une admission si la file n'est pas saturée
+
+        Returns:
+            (admis, Retry-After en secondes si refusé)
+        """
+        with self._lock:
+            if self.backlog >= max(self.max_inflight, self.max_inflight_async) + self.max_queued:
+                self.stats['rejected'] += 1
+                return False, self._estimate_wait()
+            self._reserved += 1
+            self.stats['admitted'] += 1
+            return True, 0
+
+    def attach(self, message_id: int):
+        """Rattache l'admission réservée par admit() au message enregistré"""
+        with self._lock:
+            self._reserved = max(0, self._reserved - 1)
+            self._admitted.add(message_id)
+
+    def cancel(self):
+        """Annule une admission réservée dont le message n'a pas pu être enregistré"""
+        with self._lock:
+            self._reserved = max(0, self._reserved - 1)
+
+    def release(self, message_id: int) -> bool:
+        """
+        Libère l'admission d'un message traité ou abandonné
+
+        Returns:
+            True si le message avait une admission (False : déjà libérée, ou
+            message repris au démarrage sans admission)
+        """
+        with self._lock:
+            if message_id not in self._admitted:
+                return False
+            self._admitted.discard(message_id)
+            self.stats['released'] += 1
+            return True
+
+    def set_async_limit(self, max_inflight_async: int):
+        """
+        Plafond des appels Claude lancés depuis des coroutines (serveur ASGI), qui ne
+        coûtent pas un thread chacun ; à fixer avant le premier aslot()
+        """
+        self.max_inflight_async = max(1, max_inflight_async)
+        self._async_slots = None
+
+    def _estimate_wait(self) -> int:
+        """Délai estimé avant qu'un créneau se libère (verrou tenu)"""
+        concurrency = max(self.max_inflight, self.max_inflight_async)
+        rounds = (self.backlog - concurrency + 1) / concurrency
+        return min(60, max(1, math.ceil(rounds * self.avg_duration)))
+
+    @contextmanager
+    def slot(self):
+        """Occupe un créneau d'appel Claude (bloque tant que le plafond est atteint)"""
+        self._slots.acquire()
+        start = self._enter()
+        try:
+            yield
+        finally:
+            self._exit(start)
+            self._slots.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Occupe un créneau depuis une coroutine (attend sans bloquer la boucle)"""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_inflight_async)
+        async with self._async_slots:
+            start = self._enter()
+            try:
+                yield
+            finally:
+                self._exit(start)
+
+    def _enter(self) -> float:
+        with self._lock:
+            self.inflight += 1
+        return time.monotonic()
+
+    def _exit(self, start: float):
+        duration = time.monotonic() - start
+        with self._lock:
+            self.inflight -= 1
+            self.stats['completed'] += 1
+            # Moyenne glissante utilisée pour Retry-After
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du contrôle d'admission pour le monitoring"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                'inflight': self.inflight,
+                'admitted_messages': self.backlog,
+                'queued': max(0, self.backlog - self.inflight),
+                'max_inflight': self.max_inflight,
+                'max_inflight_async': self.max_inflight_async,
+                'max_queued': self.max_queued,
+                'avg_duration': round(self.avg_duration, 2)
+            })
+        return stats
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reclassification par Lots (messages et contacts_clients)
+Après un changement des définitions de catégories, ou pour rejouer un arriéré,
+toutes les lignes sont relues par tranches (pagination par id) et chaque tranche
+est classifiée d'un bloc : produit creux vectorisé du classifieur local
+(automation/local_classifier.py) ou, sur demande explicite, classifieur par
+mots-clés. Les changements sont écrits par executemany dans une seule
+transaction : une interruption laisse la base inchangée.
+
+Par défaut rien n'est écrit (simulation) et seules les prédictions au-dessus du
+seuil du classifieur local (LOCAL_CLASSIFIER_THRESHOLD) remplacent l'existant.
+
+Usage (depuis PRODUCTION/) :
+    python automation/relabel.py                                   # simulation, les deux tables
+    python automation/relabel.py --tables messages --status traite --apply
+    python automation/relabel.py --classifier keywords --chunk-size 10000 --apply
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import pytz
+
+PARIS_TZ = pytz.timezone('Europe/Paris')
+
+# Colonnes de chaque table : texte classifié, statut et champs de la classification
+RELABEL_TABLES = {
+    'messages': {
+        'text': ('subject', 'message'),
+        'status': 'status',
+        'fields': {'category': 'category', 'urgency': 'urgency', 'sentiment': 'sentiment'},
+        'source': 'classified_by'
+    },
+    'contacts_clients': {
+        'text': ('message_initial',),
+        'status': 'statut',
+        'fields': {'category': 'categorie', 'urgency': 'urgence', 'sentiment': 'sentiment'},
+        'source': None
+    }
+}
+
+
+class KeywordBatchClassifier:
+    """Classifieur par mots-clés avec l'interface predict_batch (catégorie seulement)"""
+
+    name = 'keywords'
+    fields = ('category',)
+
+    def __init__(self):
+        from automation.keyword_classifier import get_keyword_classifier
+        self.classifier = get_keyword_classifier()
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        return [self.classifier.classify(text) for text in texts]
+
+
+class BatchRelabeler:
+    """Reclassification de tables entières, tranche par tranche, en une transaction"""
+
+    def __init__(self, db_pool, classifier, chunk_size: int = 5000, min_confidence: float = 0.0):
+        """
+        Args:
+            db_pool: Pool de connexions vers la base
+            classifier: Objet avec predict_batch(textes) -> classifications
+                (LocalClassifier ou KeywordBatchClassifier)
+            chunk_size: Lignes lues et classifiées ensemble
+            min_confidence: Confiance minimale pour remplacer la classification existante
+        """
+        self.db_pool = db_pool
+        self.classifier = classifier
+        # Le classifieur local prédit les champs qu'il a appris, les mots-clés la catégorie seulement
+        self.fields = tuple(getattr(classifier, 'heads', None) or getattr(classifier, 'fields', ('category',)))
+        self.source = getattr(classifier, 'name', 'local')
+        self.chunk_size = max(1, chunk_size)
+        self.min_confidence = min_confidence
+
+    def relabel(self, tables: Sequence[str] = tuple(RELABEL_TABLES), status: Optional[str] = None,
+                dry_run: bool = False, purge_cache: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Reclassifie les tables dans une même transaction
+
+        Args:
+            status: Seules les lignes de ce statut sont reclassifiées (toutes par défaut)
+            dry_run: Compte les changements sans rien écrire
+            purge_cache: Supprime aussi les classifications du cache de réponses,
+                calculées avec les anciennes définitions
+
+        Returns:
+            Statistiques par table
+        """
+        results = {}
+        with self.db_pool.connection() as conn:
+            for table in tables:
+                results[table] = self._relabel_table(conn, table, status, dry_run)
+            if purge_cache and not dry_run:
+                results['response_cache'] = {'purged': self._purge_cache(conn)}
+        return results
+
+    def _relabel_table(self, conn, table: str, status: Optional[str], dry_run: bool) -> Dict[str, Any]:
+        spec = RELABEL_TABLES[table]
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        fields = [field for field in self.fields if spec['fields'].get(field) in columns]
+        source = spec['source'] if spec['source'] in columns else None
+        current = [spec['fields'][field] for field in fields]
+
+        status_clause = f" AND {spec['status']} = ?" if status else ""
+        select = (f"SELECT id, {', '.join(spec['text'] + tuple(current))} FROM {table} "
+                  f"WHERE id > ?{status_clause} ORDER BY id LIMIT ?")
+        assignments = [f"{column} = ?" for column in current] + ([f"{source} = ?"] if source else [])
+        update = f"UPDATE {table} SET {', '.join(assignments)}, updated_at = ? WHERE id = ?"
+
+        stats = {'rows': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        transitions = Counter()
+        started = time.perf_counter()
+        last_id = 0
+        texts_count = len(spec['text'])
+        while True:
+            rows = conn.execute(select, (last_id, status, self.chunk_size) if status
+                                else (last_id, self.chunk_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            predictions = self.classifier.predict_batch(
+                [" ".join(filter(None, row[1:1 + texts_count])) for row in rows])
+
+            now = datetime.now(PARIS_TZ)
+            updates = []
+            for row, prediction in zip(rows, predictions):
+                # Aucun terme reconnu ou confiance insuffisante : la classification existante est gardée
+                if not prediction.get('category') or not prediction.get('confidence') \
+                        or prediction['confidence'] < self.min_confidence:
+                    stats['skipped'] += 1
+                    continue
+                new = tuple(prediction[field] for field in fields)
+                old = tuple(row[1 + texts_count:])
+                if new == old:
+                    stats['unchanged'] += 1
+                    continue
+                if old[0] != new[0]:
+                    transitions[(old[0], new[0])] += 1
+                updates.append(new + ((self.source,) if source else ()) + (now, row[0]))
+
+            if updates and not dry_run:
+                conn.executemany(update, updates)
+            stats['rows'] += len(rows)
+            stats['updated'] += len(updates)
+
+        elapsed = time.perf_counter() - started
+        stats.update({
+            'fields': fields,
+            'seconds': round(elapsed, 2),
+            'rows_per_minute': round(stats['rows'] * 60 / elapsed) if elapsed else None,
+            'category_changes': {f"{old} -> {new}": count for (old, new), count in transitions.most_common(10)}
+        })
+        return stats
+
+    @staticmethod
+    def _purge_cache(conn) -> int:
+        from database.response_cache import CLASSIFICATION
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'response_cache'").fetchone():
+            return 0
+        return conn.execute('DELETE FROM response_cache WHERE kind = ?', (CLASSIFICATION,)).rowcount
+
+
+def load_batch_classifier(kind: str, model_path: str):
+    """
+    Classifieur local (auto, local) ou par mots-clés (keywords, choix explicite seulement :
+    les lignes reclassifiées sortent du jeu d'entraînement du classifieur local)
+    """
+    if kind == 'keywords':
+        return KeywordBatchClassifier()
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Modèle absent: {model_path} (python automation/local_classifier.py train, "
+                                f"ou --classifier keywords)")
+    from automation.local_classifier import LocalClassifier
+    return LocalClassifier.load(model_path)
+
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(base_dir)
+    from dotenv import load_dotenv
+    from config import DB_POOL_CONFIG, LOCAL_CLASSIFIER_CONFIG
+    from database.connection_pool import SQLiteConnectionPool
+
+    parser = argparse.ArgumentParser(description="Reclassification par lots des messages et contacts")
+    parser.add_argument('--tables', nargs='+', choices=tuple(RELABEL_TABLES), default=list(RELABEL_TABLES))
+    parser.add_argument('--classifier', choices=('auto', 'local', 'keywords'), default='auto',
+                        help="auto, local : classifieur local entraîné (erreur sans modèle) ; "
+                             "keywords : mots-clés, les lignes sortent du jeu d'entraînement")
+    parser.add_argument('--status', default=None, help="Seules les lignes de ce statut (toutes par défaut)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Lignes classifiées ensemble")
+    parser.add_argument('--min-confidence', type=float, default=LOCAL_CLASSIFIER_CONFIG['threshold'],
+                        help="Confiance minimale pour remplacer la classification existante "
+                             "(seuil du classifieur local par défaut)")
+    parser.add_argument('--apply', action='store_true',
+                        help="Écrit les changements (simulation sans écrire par défaut)")
+    parser.add_argument('--purge-cache', action='store_true',
+                        help="Supprime les classifications du cache de réponses")
+    parser.add_argument('--db', default=os.path.join(base_dir, 'data', 'crm_ecommerce.db'))
+    args = parser.parse_args()
+    load_dotenv()
+
+    try:
+        classifier = load_batch_classifier(args.classifier,
+                                           os.path.join(base_dir, LOCAL_CLASSIFIER_CONFIG['model_path']))
+    except (FileNotFoundError, ImportError) as e:
+        print(f"❌ Classifieur local non disponible: {e}")
+        return 1
+    dry_run = not args.apply
+    db_pool = SQLiteConnectionPool(args.db, pragmas={'busy_timeout': DB_POOL_CONFIG['busy_timeout_ms']})
+    relabeler = BatchRelabeler(db_pool, classifier, chunk_size=args.chunk_size,
+                               min_confidence=args.min_confidence)
+    print(f"🏷️ Reclassification ({relabeler.source}: {', '.join(relabeler.fields)})"
+          f"{' — simulation' if dry_run else ''}, confiance >= {args.min_confidence}...")
+    results = relabeler.relabel(args.tables, args.status, dry_run, args.purge_cache)
+    for table, stats in results.items():
+        print(f"📊 {table}: {stats}")
+    if dry_run:
+        print("ℹ️ Simulation : rien n'a été écrit (--apply pour appliquer)")
+    db_pool.close_all()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Résilience des Appels à l'API Anthropic
+Délai maximum par appel (flux compris), disjoncteur partagé (ouvert après des
+pannes de l'API ou des appels trop lents consécutifs : les appels échouent alors
+immédiatement et ClaudeAgent répond avec sa classification et ses réponses de
+secours) et requêtes couvertes optionnelles : une seconde requête identique est
+lancée si la première dépasse le p95 observé, la première réponse arrivée est gardée.
+Seules les erreurs de l'API (5xx, 429, connexion, délai) comptent pour le
+disjoncteur ; une requête invalide ou une erreur du code appelant est propagée
+sans le toucher. Pour un flux, le SLO porte sur le délai du premier fragment.
+"""
+
+import asyncio
+import math
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# États du disjoncteur
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans contacter l'API (disjoncteur ouvert)"""
+
+
+class StreamDeadlineError(TimeoutError):
+    """Flux interrompu : la génération a dépassé le délai total de l'appel"""
+
+
+def is_api_failure(error: BaseException) -> bool:
+    """Erreur imputable à l'API Anthropic (5xx, 429, connexion, délai), la seule qui compte pour le disjoncteur"""
+    if isinstance(error, StreamDeadlineError):
+        return True
+    # Le SDK n'est chargé que si un agent est configuré : sans lui, aucune erreur ne vient de l'API
+    anthropic = sys.modules.get('anthropic')
+    if anthropic is None:
+        return False
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+class CircuitBreaker:
+    """Disjoncteur à échecs consécutifs, avec appel d'essai après le délai de réarmement"""
+
+    def __init__(self, failure_threshold: int = 5, slo_seconds: float = 20.0, reset_seconds: float = 30.0):
+        """
+        Args:
+            failure_threshold: Échecs ou dépassements de SLO consécutifs avant ouverture
+            slo_seconds: Durée au-delà de laquelle un appel réussi compte comme un échec
+                (délai du premier fragment pour un flux)
+            reset_seconds: Durée d'ouverture avant un appel d'essai (semi-ouvert)
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.slo_seconds = slo_seconds
+        self.reset_seconds = reset_seconds
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {
+            'successes': 0,
+            'failures': 0,
+            'slo_violations': 0,
+            'rejected': 0,
+            'opened': 0
+        }
+
+    def allow(self) -> bool:
+        """Autorise un appel (un seul appel d'essai à la fois en semi-ouvert)"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self, duration: float):
+        with self._lock:
+            if self.slo_seconds and duration > self.slo_seconds:
+                self.stats['slo_violations'] += 1
+                self._failed()
+                return
+            self.stats['successes'] += 1
+            self._consecutive_failures = 0
+            if self.state != CLOSED:
+                print("✅ [Resilience] Disjoncteur Anthropic refermé")
+            self.state = CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self._failed()
+
+    def release_probe(self):
+        """Appel terminé sans verdict sur l'API (requête invalide, erreur de l'appelant)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _failed(self):
+        """Verrou tenu"""
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and
+                                       self._consecutive_failures >= self.failure_threshold):
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self.stats['opened'] += 1
+            print(f"🔌 [Resilience] Disjoncteur Anthropic ouvert ({self._consecutive_failures} échecs consécutifs)")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                'state': self.state,
+                'consecutive_failures': self._consecutive_failures,
+                'open_for_seconds': round(time.monotonic() - self._opened_at, 1) if self.state != CLOSED else None
+            })
+        return stats
+
+
+class LatencyTracker:
+    """Durées récentes des appels réussis, par type d'appel (et modèle)"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = {}
+
+    def record(self, kind: str, duration: float):
+        with self._lock:
+            durations = self._durations.get(kind)
+            if durations is None:
+                durations = self._durations[kind] = deque(maxlen=self.window)
+            durations.append(duration)
+
+    def percentile(self, kind: str, pct: float = 95, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            durations = sorted(self._durations.get(kind, ()))
+        if not durations or len(durations) < min_samples:
+            return None
+        return durations[max(0, min(len(durations) - 1, math.ceil(pct / 100 * len(durations)) - 1))]
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {kind: len(durations) for kind, durations in self._durations.items()}
+        status = {}
+        for kind, count in counts.items():
+            p95 = self.percentile(kind, min_samples=1)
+            status[kind] = {'samples': count, 'p95_ms': round(p95 * 1000) if p95 is not None else None}
+        return status
+
+
+class _DeadlineStream:
+    """
+    Flux de réponse (MessageStream ou AsyncMessageStream) sous délai total, qui note
+    l'arrivée du premier fragment ; les autres attributs sont ceux du flux du SDK
+    """
+
+    def __init__(self, stream, started: float, deadline: float):
+        self._stream = stream
+        self.deadline = deadline
+        self.deadline_at = started + deadline
+        self.first_fragment_at = None
+        self.expired = False
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def expire(self):
+        """Délai total atteint : ferme la connexion (lecture bloquée comprise)"""
+        self.expired = True
+        self._stream.close()
+
+    def _received(self):
+        if self.first_fragment_at is None:
+            self.first_fragment_at = time.monotonic()
+        if self.expired or time.monotonic() > self.deadline_at:
+            self.expired = True
+            raise StreamDeadlineError(f"Flux interrompu après {self.deadline:g}s")
+
+    @property
+    def text_stream(self):
+        for text in self._stream.text_stream:
+            self._received()
+            yield text
+        if self.expired:
+            raise StreamDeadlineError(f"Flux interrompu après {self.deadline:g}s")
+
+
+class _AsyncDeadlineStream(_DeadlineStream):
+    """Version asynchrone : l'attente de chaque fragment est bornée par le délai restant"""
+
+    @property
+    async def text_stream(self):
+        iterator = self._stream.text_stream.__aiter__()
+        while True:
+            try:
+                text = await asyncio.wait_for(iterator.__anext__(), max(0.0, self.deadline_at - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                self.expired = True
+                raise StreamDeadlineError(f"Flux interrompu après {self.deadline:g}s")
+            self._received()
+            yield text
+
+
+class ResilientCaller:
+    """Délai par appel, disjoncteur et requêtes couvertes autour du client Anthropic"""
+
+    def __init__(self, deadline_seconds: float = 30.0, failure_threshold: int = 5, slo_seconds: float = 20.0,
+                 reset_seconds: float = 30.0, hedge: bool = False, hedge_min_delay: float = 1.0,
+                 hedge_workers: int = 8):
+        """
+        Args:
+            deadline_seconds: Délai maximum d'un appel, génération complète d'un flux comprise
+            failure_threshold: Échecs consécutifs avant ouverture du disjoncteur
+            slo_seconds: Durée d'appel (premier fragment d'un flux) au-delà de laquelle
+                l'appel compte comme un échec
+            reset_seconds: Durée d'ouverture du disjoncteur avant un appel d'essai
+            hedge: Active les requêtes couvertes (appels non streamés seulement)
+            hedge_min_delay: Délai minimum avant la requête couverte (utilisé seul tant que le p95 est inconnu)
+            hedge_workers: Threads des appels couverts (version synchrone)
+        """
+        self.deadline = deadline_seconds
+        self.breaker = CircuitBreaker(failure_threshold, slo_seconds, reset_seconds)
+        self.latency = LatencyTracker()
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_workers = hedge_workers
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'hedged': 0,
+            'hedge_wins': 0
+        }
+
+    @staticmethod
+    def _kind(kind: str, request: Dict[str, Any]) -> str:
+        """Latences suivies par type d'appel et par modèle (p95 et couverture propres à chaque modèle)"""
+        return f"{kind}/{request['model']}" if request.get('model') else kind
+
+    def _check(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Disjoncteur Anthropic ouvert")
+
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p95 = self.latency.percentile(kind)
+        return max(self.hedge_min_delay, p95) if p95 else self.hedge_min_delay
+
+    def _succeeded(self, kind: str, started: float):
+        duration = time.monotonic() - started
+        self.latency.record(kind, duration)
+        self.breaker.record_success(duration)
+
+    def _stream_succeeded(self, kind: str, started: float, stream: _DeadlineStream):
+        """Flux terminé : latence et SLO sur le premier fragment (la génération complète dépend de sa longueur)"""
+        first_fragment = (stream.first_fragment_at or time.monotonic()) - started
+        self.latency.record(f"{kind}/first_fragment", first_fragment)
+        self.breaker.record_success(first_fragment)
+
+    def _failed(self, error: BaseException):
+        """Une erreur de l'API compte pour le disjoncteur ; les autres sont seulement propagées"""
+        if is_api_failure(error):
+            self.breaker.record_failure()
+        else:
+            # Appel d'essai terminé sans verdict sur l'API : un autre appel pourra le refaire
+            self.breaker.release_probe()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers,
+                                                    thread_name_prefix="anthropic-hedge")
+            return self._executor
+
+    def call(self, kind: str, create: Callable[..., Any], request: Dict[str, Any]):
+        """
+        Appel non streamé (client.messages.create) sous délai, disjoncteur et couverture
+
+        Raises:
+            CircuitOpenError: disjoncteur ouvert, l'API n'a pas été appelée
+        """
+        kind = self._kind(kind, request)
+        self._check()
+        started = time.monotonic()
+        delay = self._hedge_delay(kind)
+        try:
+            if delay is None:
+                response = create(**request, timeout=self.deadline)
+            else:
+                response = self._hedged(create, request, delay)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(kind, started)
+        return response
+
+    def _hedged(self, create, request, delay):
+        pool = self._pool()
+        first = pool.submit(create, **request, timeout=self.deadline)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.stats['hedged'] += 1
+        # La requête la plus lente n'est pas interrompue (client synchrone), son résultat est ignoré
+        second = pool.submit(create, **request, timeout=max(0.1, self.deadline - delay))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self._lock:
+                            self.stats['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, kind: str, create: Callable[..., Any], request: Dict[str, Any]):
+        """Version asynchrone de call (la requête perdante est annulée)"""
+        kind = self._kind(kind, request)
+        self._check()
+        started = time.monotonic()
+        delay = self._hedge_delay(kind)
+        try:
+            if delay is None:
+                response = await create(**request, timeout=self.deadline)
+            else:
+                response = await self._ahedged(create, request, delay)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded(kind, started)
+        return response
+
+    async def _ahedged(self, create, request, delay):
+        first = asyncio.ensure_future(create(**request, timeout=self.deadline))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.stats['hedged'] += 1
+        second = asyncio.ensure_future(create(**request, timeout=max(0.1, self.deadline - delay)))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            with self._lock:
+                                self.stats['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @contextmanager
+    def stream(self, kind: str, open_stream: Callable[..., Any], request: Dict[str, Any]):
+        """
+        Appel streamé (client.messages.stream) sous délai total et disjoncteur. Pas de
+        couverture : le texte reçu est déjà diffusé au client. Le timeout du SDK ne borne
+        que chaque lecture : un minuteur ferme le flux au délai total.
+
+        Raises:
+            StreamDeadlineError: génération interrompue au délai total
+        """
+        kind = self._kind(kind, request)
+        self._check()
+        started = time.monotonic()
+        stream = timer = None
+        try:
+            with open_stream(**request, timeout=self.deadline) as raw_stream:
+                stream = _DeadlineStream(raw_stream, started, self.deadline)
+                timer = threading.Timer(max(0.0, stream.deadline_at - time.monotonic()), stream.expire)
+                timer.daemon = True
+                timer.start()
+                yield stream
+        except Exception as e:
+            if stream is not None and stream.expired and not isinstance(e, StreamDeadlineError):
+                # Lecture interrompue par la fermeture du flux au délai total
+                error = StreamDeadlineError(f"Flux interrompu après {self.deadline:g}s")
+                self._failed(error)
+                raise error from e
+            self._failed(e)
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        self._stream_succeeded(kind, started, stream)
+
+    @asynccontextmanager
+    async def astream(self, kind: str, open_stream: Callable[..., Any], request: Dict[str, Any]):
+        """Version asynchrone de stream (l'attente de chaque fragment est bornée par le délai restant)"""
+        kind = self._kind(kind, request)
+        self._check()
+        started = time.monotonic()
+        try:
+            async with open_stream(**request, timeout=self.deadline) as raw_stream:
+                stream = _AsyncDeadlineStream(raw_stream, started, self.deadline)
+                yield stream
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._stream_succeeded(kind, started, stream)
+
+    def get_status(self) -> Dict[str, Any]:
+        """État du disjoncteur, latences observées et requêtes couvertes"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'deadline_seconds': self.deadline,
+            'hedge_enabled': self.hedge,
+            'breaker': self.breaker.get_status(),
+            'latency': self.latency.get_status()
+        })
+        return stats
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificateur de Révélation Différée
+Roue temporelle (hashed timer wheel) qui conserve les réponses déjà calculées
+jusqu'à leur date de révélation, sans bloquer de thread par réponse.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class DelayedRevealScheduler:
+    """Roue temporelle pour révéler des réponses après un délai"""
+
+    PENDING = 'pending'
+    REVEALED = 'revealed'
+
+    def __init__(self, tick_seconds: float = 1.0, wheel_size: int = 64, retention_seconds: int = 600):
+        """
+        Initialise la roue temporelle
+
+        Args:
+            tick_seconds: Durée d'un cran de la roue (précision de la révélation)
+            wheel_size: Nombre de crans (un tour = tick_seconds * wheel_size)
+            retention_seconds: Durée de conservation d'une réponse après révélation
+        """
+        self.tick_seconds = tick_seconds
+        self.wheel_size = wheel_size
+        self.retention_seconds = retention_seconds
+
+        self._slots = [set() for _ in range(wheel_size)]
+        self._entries = {}
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._revealed = threading.Condition(self._lock)
+        self._thread = None
+
+        self.stats = {
+            'scheduled': 0,
+            'revealed': 0,
+            'expired': 0
+        }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="reveal-scheduler", daemon=True)
+            self._thread.start()
+
+    def _place(self, key: str, entry: Dict, delay: float):
+        """Place une entrée dans le cran correspondant à son échéance (verrou tenu)"""
+        ticks = max(1, int(round(delay / self.tick_seconds)))
+        entry['rounds'] = (ticks - 1) // self.wheel_size
+        entry['slot'] = (self._cursor + ticks) % self.wheel_size
+        self._slots[entry['slot']].add(key)
+
+    def schedule(self, key: str, payload: Any, delay: float):
+        """
+        Conserve une réponse jusqu'à sa date de révélation
+
+        Args:
+            key: Identifiant de la réponse (ticket_id)
+            payload: Réponse déjà calculée
+            delay: Délai avant révélation en secondes
+        """
+        with self._lock:
+            self._discard(key)
+            entry = {
+                'payload': payload,
+                'state': self.PENDING,
+                'reveal_at': time.time() + delay
+            }
+            self._place(key, entry, delay)
+            self._entries[key] = entry
+            self.stats['scheduled'] += 1
+            self._ensure_started()
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._slots[entry['slot']].discard(key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Retourne l'état d'une réponse planifiée
+
+        Returns:
+            None si la clé est inconnue, sinon un dict avec 'state'
+            et 'payload' (révélée) ou 'remaining' (en attente)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['state'] == self.REVEALED:
+                return {'state': self.REVEALED, 'payload': entry['payload']}
+            return {
+                'state': self.PENDING,
+                'remaining': max(0.0, round(entry['reveal_at'] - time.time(), 1))
+            }
+
+    def wait_for(self, key: str, timeout: float) -> bool:
+        """Attend la révélation d'une réponse (long-polling)"""
+        with self._revealed:
+            return self._revealed.wait_for(
+                lambda: key not in self._entries or self._entries[key]['state'] == self.REVEALED,
+                timeout
+            )
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.tick_seconds
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            self._advance()
+
+    def _advance(self):
+        """Avance la roue d'un cran et traite les entrées arrivées à échéance"""
+        with self._lock:
+            self._cursor = (self._cursor + 1) % self.wheel_size
+            slot = self._slots[self._cursor]
+            due = []
+
+            for key in list(slot):
+                entry = self._entries[key]
+                if entry['rounds'] > 0:
+                    entry['rounds'] -= 1
+                else:
+                    slot.discard(key)
+                    due.append((key, entry))
+
+            revealed = False
+            for key, entry in due:
+                if entry['state'] == self.PENDING:
+                    # Révéler puis replanifier l'expiration
+                    entry['state'] = self.REVEALED
+                    self._place(key, entry, self.retention_seconds)
+                    self.stats['revealed'] += 1
+                    revealed = True
+                else:
+                    del self._entries[key]
+                    self.stats['expired'] += 1
+
+            if revealed:
+                self._revealed.notify_all()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne l'état du planificateur pour le monitoring"""
+        with self._lock:
+            pending = sum(1 for entry in self._entries.values() if entry['state'] == self.PENDING)
+            stats = dict(self.stats)
+            stats.update({
+                'pending': pending,
+                'retained': len(self._entries) - pending
+            })
+        return stats
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sortie Structurée de la Classification Claude
+Outil (tool use) dont le schéma JSON contraint les champs de la classification,
+extraction tolérante du JSON des réponses texte (mode combiné, lots, outil
+désactivé) et normalisation des types, pour qu'aucun appel payé ne soit perdu
+sur une virgule ou un bloc de code autour du JSON.
+"""
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+CATEGORIES = ("retard_livraison", "remboursement", "produit_defectueux",
+              "information_commande", "reclamation", "autre")
+SENTIMENTS = ("positif", "neutre", "negatif", "tres_negatif")
+
+CLASSIFICATION_TOOL_NAME = "classify_message"
+
+# Outil imposé par tool_choice : Claude renvoie directement un objet conforme au schéma
+CLASSIFICATION_TOOL = {
+    "name": CLASSIFICATION_TOOL_NAME,
+    "description": "Enregistre l'analyse du message client (catégorie, urgence, sentiment, éléments clés).",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "category": {"type": "string", "enum": list(CATEGORIES)},
+            "urgency": {"type": "integer", "minimum": 1, "maximum": 5,
+                        "description": "Niveau d'urgence, 5 = très urgent"},
+            "sentiment": {"type": "string", "enum": list(SENTIMENTS)},
+            "key_elements": {"type": "array", "items": {"type": "string"}},
+            "requires_human": {"type": "boolean"},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+        },
+        "required": ["category", "urgency", "sentiment", "key_elements", "requires_human", "confidence"]
+    }
+}
+
+# Virgule finale avant une accolade ou un crochet fermant
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _balanced_object(text: str, start: int) -> Optional[str]:
+    """Objet JSON commençant à `start` (accolades équilibrées, hors chaînes)"""
+    depth = 0
+    in_string = escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return None
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Premier objet JSON exploitable d'une réponse texte : texte ou bloc de code
+    autour, virgules finales tolérés
+
+    Returns:
+        L'objet, ou None si la réponse n'en contient aucun
+    """
+    if not text:
+        return None
+    start = text.find("{")
+    while start != -1:
+        candidate = _balanced_object(text, start) or ""
+        for attempt in filter(None, (candidate, _TRAILING_COMMA.sub(r"\1", candidate))):
+            try:
+                value = json.loads(attempt)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, dict):
+                return value
+        start = text.find("{", start + 1)
+    return None
+
+
+def _clamp(value, low, high, cast):
+    return max(low, min(high, cast(value)))
+
+
+def normalize_classification(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Champs de la classification avec les types attendus (valeurs hors liste ou
+    hors bornes ramenées à la plus proche valeur admise)
+
+    Raises:
+        ValueError: catégorie absente ou champ numérique illisible
+    """
+    if not isinstance(data, dict) or not data.get("category"):
+        raise ValueError("Classification sans catégorie")
+    category = str(data["category"]).strip().lower()
+    sentiment = str(data.get("sentiment") or "neutre").strip().lower()
+    key_elements = data.get("key_elements") or []
+    if isinstance(key_elements, str):
+        key_elements = [key_elements]
+    requires_human = data.get("requires_human", False)
+    if isinstance(requires_human, str):
+        requires_human = requires_human.strip().lower() in ("true", "1", "oui", "yes")
+    try:
+        urgency = _clamp(data.get("urgency", 3), 1, 5, lambda value: int(float(value)))
+        confidence = _clamp(data.get("confidence", 0.85), 0.0, 1.0, float)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Classification illisible: {e}")
+
+    result = dict(data)
+    result.update({
+        "category": category if category in CATEGORIES else "autre",
+        "urgency": urgency,
+        "sentiment": sentiment if sentiment in SENTIMENTS else "neutre",
+        "key_elements": [str(element) for element in key_elements],
+        "requires_human": bool(requires_human),
+        "confidence": confidence
+    })
+    return result
+
+
+def classification_from_response(response):
+    """
+    Classification d'une réponse de l'API : entrée du bloc tool_use, sinon JSON extrait du texte
+
+    Returns:
+        (classification normalisée, 'tool_use' ou 'text')
+
+    Raises:
+        ValueError: aucune classification exploitable (l'appel est perdu)
+    """
+    texts = []
+    for block in getattr(response, "content", None) or []:
+        if getattr(block, "type", None) == "tool_use" and getattr(block, "name", None) == CLASSIFICATION_TOOL_NAME:
+            return normalize_classification(dict(block.input)), "tool_use"
+        if getattr(block, "type", None) == "text":
+            texts.append(block.text)
+    data = extract_json_object("".join(texts))
+    if data is None:
+        raise ValueError("Aucun JSON de classification dans la réponse")
+    return normalize_classification(data), "text"
@@ -1,12 +1,12 @@
 """
 Agent IA pour l'automatisation du support client e-commerce
 """
-import re
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-import openai
 
 from database.db_manager import DatabaseManager
+from automation.keyword_classifier import get_keyword_classifier, TEMPLATE_CATEGORIES
+from automation.entity_extractor import EntityExtractor
 from notion.notion_manager import NotionManager
 from config import OPENAI_CONFIG
 
@@ -14,13 +14,19 @@ from config import OPENAI_CONFIG
 class SupportAgent:
     """Agent IA pour automatiser les réponses du support client"""
     
-    def __init__(self):
-        self.db = DatabaseManager()
-        self.notion = NotionManager()
-        
-        # Configuration OpenAI (optionnel)
+    def __init__(self, db_manager: Optional[DatabaseManager] = None,
+                 notion_manager: Optional[NotionManager] = None):
+        # Réutiliser les gestionnaires de l'application s'ils sont fournis
+        self.db = db_manager if db_manager is not None else DatabaseManager()
+        self.notion = notion_manager if notion_manager is not None else NotionManager()
+        self.entities = EntityExtractor()
+        
+        # Configuration OpenAI (optionnel, le SDK n'est chargé que si une clé est définie)
+        self.openai = None
         if OPENAI_CONFIG.get('api_key'):
+            import openai
             openai.api_key = OPENAI_CONFIG['api_key']
+            self.openai = openai
             self.ai_enabled = True
         else:
             self.ai_enabled = False
@@ -45,8 +51,9 @@ class SupportAgent:
         if commande_id:
             commande = self.db.get_commande_by_id(commande_id)
         else:
-            # Essayer d'extraire l'ID de commande du message
-            commande_id = self._extract_order_id(message)
+            # Premier numéro de commande de la table commande (#123, commande n° 123) cité dans le message
+            commande_id = next((int(order_id) for order_id in self.entities.extract(message)['order_ids']
+                                if order_id.isdigit()), None)
             if commande_id:
                 commande = self.db.get_commande_by_id(commande_id)
         
@@ -96,59 +103,9 @@ class SupportAgent:
             'commande_info': commande if commande else None
         }
     
-    def _extract_order_id(self, message: str) -> Optional[int]:
-        """Extrait l'ID de commande du message"""
-        # Recherche des patterns courants pour les numéros de commande
-        patterns = [
-            r'commande[^\d]*(\d+)',
-            r'#(\d+)',
-            r'n[°u]m[eé]ro[^\d]*(\d+)',
-            r'order[^\d]*(\d+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message.lower())
-            if match:
-                return int(match.group(1))
-        
-        return None
-    
     def _classify_message(self, message: str) -> str:
-        """Classifie le message selon les catégories définies"""
-        message_lower = message.lower()
-        
-        # Mots-clés par catégorie
-        categories = {
-            "Retard de livraison": [
-                "retard", "livraison", "délai", "reçu", "arrivé", "transporteur", 
-                "suivi", "où est", "quand", "expédition"
-            ],
-            "Remboursement": [
-                "remboursement", "rembourser", "annuler", "argent", "paiement", 
-                "remboursé", "reçu", "satisfait", "retour"
-            ],
-            "Produit défectueux": [
-                "défectueux", "cassé", "abîmé", "défaut", "problème", "marche pas", 
-                "fonctionne pas", "endommagé", "qualité", "mauvais état"
-            ],
-            "Information commande": [
-                "information", "détail", "statut", "état", "facture", "reçu", 
-                "confirmation", "résumé", "liste", "contenu"
-            ]
-        }
-        
-        # Score par catégorie
-        scores = {}
-        for categorie, mots_cles in categories.items():
-            score = sum(1 for mot in mots_cles if mot in message_lower)
-            if score > 0:
-                scores[categorie] = score
-        
-        # Retourner la catégorie avec le score le plus élevé
-        if scores:
-            return max(scores, key=scores.get)
-        
-        return "Non classé"
+        """Classifie le message selon les catégories des réponses types Notion"""
+        return get_keyword_classifier().label(message, among=TEMPLATE_CATEGORIES, default="Non classé")
     
     def _generate_response(self, categorie: str, client: Dict, 
                           commande: Optional[Dict], message: str) -> str:
@@ -231,7 +188,7 @@ class SupportAgent:
             Réponse améliorée:
             """
             
-            response = openai.ChatCompletion.create(
+            response = self.openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=300,
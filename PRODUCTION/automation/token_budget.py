@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Budget de Tokens des Appels Claude
+Plafond de sortie (max_tokens) par type d'appel, catégorie et urgence, resserré à
+partir des tokens de sortie réellement observés, et compactage du contexte client
+(historique de commandes) sous un budget de tokens d'entrée.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Types d'appels budgétés
+CLASSIFICATION_CALL = "classification"
+RESPONSE_CALL = "response"
+COMBINED_CALL = "combined"
+
+# Plafond initial (avant observations), plancher et plafond maximum par type d'appel.
+# La consigne de réponse est de 150-300 mots, soit environ 400-600 tokens en français.
+DEFAULT_BUDGETS = {
+    CLASSIFICATION_CALL: {'initial': 300, 'floor': 150, 'ceiling': 1024},
+    RESPONSE_CALL: {'initial': 900, 'floor': 400, 'ceiling': 3000},
+    COMBINED_CALL: {'initial': 1100, 'floor': 550, 'ceiling': 3000}
+}
+
+# Catégories dont la réponse s'appuie sur le détail des commandes
+ORDER_CATEGORIES = ("retard_livraison", "information_commande")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens d'un texte français (~3,5 caractères par token)"""
+    return math.ceil(len(text) / 3.5) if text else 0
+
+
+def _percentile(ordered, pct: float) -> float:
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class TokenBudgeter:
+    """max_tokens adaptatif par (type d'appel, catégorie, urgence) et compactage du contexte"""
+
+    def __init__(self, window: int = 200, min_samples: int = 30, percentile: float = 99,
+                 headroom: float = 1.2, urgent_level: int = 4, max_context_tokens: int = 350,
+                 max_orders: int = 3, raise_decay: float = 0.9):
+        """
+        Args:
+            window: Nombre d'observations gardées par groupe
+            min_samples: Observations nécessaires avant de remplacer le plafond initial
+            percentile: Percentile des tokens de sortie observés servant de base au plafond
+            headroom: Marge appliquée au percentile
+            urgent_level: Urgence à partir de laquelle les réponses ont leur propre budget
+            max_context_tokens: Budget de tokens de l'historique de commandes dans le prompt
+            max_orders: Nombre maximum de commandes gardées dans le contexte
+            raise_decay: Facteur appliqué au plafond relevé à chaque sortie non tronquée
+        """
+        self.window = max(1, window)
+        self.min_samples = max(1, min_samples)
+        self.percentile = percentile
+        self.headroom = headroom
+        self.urgent_level = urgent_level
+        self.max_context_tokens = max_context_tokens
+        self.max_orders = max_orders
+        self.raise_decay = raise_decay
+
+        self._lock = threading.Lock()
+        # (type d'appel, catégorie, urgent) -> tokens de sortie observés
+        self._observations = {}
+        # Plafond relevé après une réponse tronquée (stop_reason 'max_tokens'),
+        # redescendu à chaque sortie complète jusqu'à ce que le percentile reprenne la main
+        self._raised = {}
+        self.stats = {
+            'calls': 0,
+            'truncated': 0,
+            'orders_trimmed': 0
+        }
+
+    def _key(self, call: str, category: Optional[str], urgency: Optional[int]):
+        urgent = urgency is not None and urgency >= self.urgent_level
+        return call, category or "*", urgent
+
+    def max_tokens(self, call: str, category: Optional[str] = None, urgency: Optional[int] = None) -> int:
+        """Plafond de tokens de sortie pour un appel (catégorie inconnue : tous messages confondus)"""
+        limits = DEFAULT_BUDGETS[call]
+        key = self._key(call, category, urgency)
+        with self._lock:
+            samples = self._observations.get(key)
+            if not samples or len(samples) < self.min_samples:
+                # Pas assez d'observations pour ce groupe : toutes catégories du même type
+                samples = [value for (kind, _, _), values in self._observations.items()
+                           if kind == call for value in values]
+            raised = self._raised.get(key, 0)
+
+        if len(samples) < self.min_samples:
+            budget = limits['initial']
+        else:
+            budget = math.ceil(_percentile(sorted(samples), self.percentile) * self.headroom)
+        return int(min(limits['ceiling'], max(limits['floor'], budget, raised)))
+
+    def record(self, call: str, category: Optional[str], urgency: Optional[int], output_tokens: int,
+               max_tokens: Optional[int] = None, stop_reason: Optional[str] = None):
+        """
+        Enregistre les tokens de sortie d'un appel
+
+        Une sortie tronquée ne mesure pas le besoin réel : le plafond du groupe est
+        relevé de 50 % au lieu d'ajouter l'observation. Chaque sortie complète le fait
+        redescendre (raise_decay), sans passer sous la sortie observée avec sa marge.
+        """
+        key = self._key(call, category, urgency)
+        with self._lock:
+            self.stats['calls'] += 1
+            if stop_reason == 'max_tokens':
+                self.stats['truncated'] += 1
+                current = max(max_tokens or 0, self._raised.get(key, 0))
+                self._raised[key] = min(DEFAULT_BUDGETS[call]['ceiling'], math.ceil(current * 1.5))
+                print(f"⚠️ [TokenBudget] Sortie tronquée ({call}, {category}) à {max_tokens} tokens")
+                return
+            samples = self._observations.get(key)
+            if samples is None:
+                samples = self._observations[key] = deque(maxlen=self.window)
+            samples.append(output_tokens)
+
+            raised = self._raised.get(key)
+            if raised is not None:
+                lowered = min(raised, max(math.ceil(raised * self.raise_decay),
+                                          math.ceil(output_tokens * self.headroom)))
+                if lowered <= DEFAULT_BUDGETS[call]['floor']:
+                    # Plus rien à maintenir au-dessus du calcul par percentile
+                    del self._raised[key]
+                else:
+                    self._raised[key] = lowered
+
+    def compact_context(self, customer_context: Optional[Dict], max_orders: Optional[int] = None) -> Optional[Dict]:
+        """
+        Copie du contexte client limitée aux commandes les plus récentes tenant dans le budget
+        (le contexte d'origine, partagé par le cache, n'est pas modifié)
+        """
+        if not customer_context or not customer_context.get("commandes"):
+            return customer_context
+
+        limit = self.max_orders if max_orders is None else max_orders
+        kept, used = [], 0
+        # Commandes triées de la plus récente à la plus ancienne (read_client_context)
+        for order in customer_context["commandes"][:limit]:
+            cost = estimate_tokens(f"- Commande #{order.get('id')}: {order.get('montant')}€ ({order.get('statut')})")
+            if kept and used + cost > self.max_context_tokens:
+                break
+            kept.append({key: order.get(key) for key in ('id', 'date', 'statut', 'montant')})
+            used += cost
+
+        trimmed = len(customer_context["commandes"]) - len(kept)
+        if trimmed:
+            with self._lock:
+                self.stats['orders_trimmed'] += trimmed
+        return dict(customer_context, commandes=kept)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Plafonds courants et distribution observée par groupe"""
+        with self._lock:
+            stats = dict(self.stats)
+            groups = {key: sorted(values) for key, values in self._observations.items()}
+            raised = dict(self._raised)
+
+        budgets = {}
+        for key in sorted(set(groups) | set(raised), key=str):
+            call, category, urgent = key
+            values = groups.get(key, [])
+            budgets[f"{call}/{category}{'/urgent' if urgent else ''}"] = {
+                'samples': len(values),
+                'p50': _percentile(values, 50) if values else None,
+                'p95': _percentile(values, 95) if values else None,
+                'max_tokens': self.max_tokens(call, None if category == "*" else category,
+                                              self.urgent_level if urgent else None)
+            }
+        stats['budgets'] = budgets
+        stats['defaults'] = {call: self.max_tokens(call) for call in DEFAULT_BUDGETS}
+        return stats
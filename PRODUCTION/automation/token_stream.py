@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Diffusion des Réponses Claude en Streaming
+Canal en mémoire par ticket : le worker y publie les fragments de texte au fil
+de la génération, les endpoints SSE (threads Flask ou coroutines ASGI) les
+relisent depuis le début puis attendent la suite.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator
+
+TOKEN = 'token'
+RESET = 'reset'
+DONE = 'done'
+
+
+class _Channel:
+    """Événements d'un ticket ; l'index d'un événement sert de curseur aux abonnés"""
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.closed_at = None
+        self.created_at = time.monotonic()
+        self.first_token_at = None
+        self.async_waiters = set()
+
+
+class TokenStreamHub:
+    """Canaux de streaming par ticket, partagés entre threads et boucle asyncio"""
+
+    def __init__(self, retention_seconds: float = 300, max_channels: int = 10000):
+        """
+        Args:
+            retention_seconds: Durée de conservation d'un canal terminé (abonnés tardifs)
+            max_channels: Nombre maximum de canaux gardés en mémoire
+        """
+        self.retention_seconds = retention_seconds
+        self.max_channels = max_channels
+
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+        self.stats = {
+            'opened': 0,
+            'completed': 0,
+            'tokens': 0,
+            'ttft_ms_total': 0.0,
+            'ttft_count': 0
+        }
+
+    def open(self, key: str):
+        """Crée le canal d'un ticket (avant la mise en file, pour les abonnés précoces)"""
+        with self._lock:
+            self._purge()
+            if key not in self._channels:
+                self._channels[key] = _Channel()
+                self.stats['opened'] += 1
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._channels
+
+    def publish(self, key: str, text: str):
+        """Ajoute un fragment de texte généré"""
+        if text:
+            self._append(key, (TOKEN, text))
+
+    def reset(self, key: str):
+        """Annule le texte déjà diffusé (nouvelle tentative du worker)"""
+        self._append(key, (RESET, None))
+
+    def close(self, key: str, payload: Dict[str, Any]):
+        """Termine le canal avec le résultat final (tel que retourné par le suivi de ticket)"""
+        self._append(key, (DONE, payload), close=True)
+
+    def _append(self, key, event, close=False):
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None or channel.closed:
+                return
+            channel.events.append(event)
+            if event[0] == TOKEN:
+                self.stats['tokens'] += 1
+                if channel.first_token_at is None:
+                    channel.first_token_at = time.monotonic()
+                    self.stats['ttft_ms_total'] += (channel.first_token_at - channel.created_at) * 1000
+                    self.stats['ttft_count'] += 1
+            if close:
+                channel.closed = True
+                channel.closed_at = time.monotonic()
+                self.stats['completed'] += 1
+            waiters = list(channel.async_waiters)
+            self._changed.notify_all()
+
+        for loop, event_flag in waiters:
+            loop.call_soon_threadsafe(event_flag.set)
+
+    def _purge(self):
+        """Supprime les canaux terminés depuis plus que la rétention (verrou tenu)"""
+        now = time.monotonic()
+        expired = [
+            key for key, channel in self._channels.items()
+            if channel.closed and now - channel.closed_at > self.retention_seconds
+        ]
+        for key in expired:
+            del self._channels[key]
+
+        # Au-delà du maximum, oublier les canaux les plus anciens
+        while len(self._channels) > self.max_channels:
+            del self._channels[next(iter(self._channels))]
+
+    def subscribe(self, key: str, timeout: float) -> Iterator[tuple]:
+        """
+        Itère sur les événements (type, donnée) d'un ticket depuis le début
+
+        S'arrête après l'événement 'done' ou si aucun événement n'arrive avant le délai.
+        """
+        cursor = 0
+        while True:
+            with self._lock:
+                channel = self._channels.get(key)
+                if channel is None:
+                    return
+                if cursor >= len(channel.events):
+                    if channel.closed:
+                        return
+                    if not self._changed.wait_for(lambda: cursor < len(channel.events), timeout):
+                        return
+                events = channel.events[cursor:]
+                cursor += len(events)
+
+            for event in events:
+                yield event
+                if event[0] == DONE:
+                    return
+
+    async def asubscribe(self, key: str, timeout: float):
+        """Version asynchrone de subscribe (serveur ASGI)"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        cursor = 0
+
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                return
+            channel.async_waiters.add(waiter)
+
+        try:
+            while True:
+                with self._lock:
+                    events = channel.events[cursor:]
+                    cursor += len(events)
+                    closed = channel.closed
+                    waiter[1].clear()
+
+                for event in events:
+                    yield event
+                    if event[0] == DONE:
+                        return
+                if closed:
+                    return
+
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    return
+        finally:
+            with self._lock:
+                channel.async_waiters.discard(waiter)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les métriques de streaming (dont le temps moyen avant le premier token)"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['active'] = sum(1 for channel in self._channels.values() if not channel.closed)
+        count = stats.pop('ttft_count')
+        total = stats.pop('ttft_ms_total')
+        stats['ttft_ms_avg'] = round(total / count, 1) if count else None
+        return stats
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formate un événement Server-Sent Events (donnée JSON)"""
+    if event == TOKEN:
+        data = {'text': data}
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
@@ -24,6 +24,129 @@ OPENAI_CONFIG = {
     'api_key': os.getenv('OPENAI_API_KEY')
 }
 
+# Configuration du pool de connexions SQLite (application web)
+DB_POOL_CONFIG = {
+    'max_connections': int(os.getenv('DB_POOL_MAX_CONNECTIONS', '64')),
+    'busy_timeout_ms': int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+}
+
+# Configuration de l'écriture groupée des logs de transactions
+LOG_WRITER_CONFIG = {
+    'flush_interval_ms': int(os.getenv('LOG_FLUSH_INTERVAL_MS', '200')),
+    'batch_size': int(os.getenv('LOG_BATCH_SIZE', '100')),
+    'max_queue': int(os.getenv('LOG_MAX_QUEUE', '10000'))
+}
+
+# Configuration de l'agrégation des emails inconnus
+UNKNOWN_EMAIL_CONFIG = {
+    'flush_interval_seconds': float(os.getenv('UNKNOWN_EMAIL_FLUSH_SECONDS', '5')),
+    'max_emails': int(os.getenv('UNKNOWN_EMAIL_MAX_PENDING', '10000'))
+}
+
+# Configuration de la file de traitement asynchrone des messages
+WORKER_CONFIG = {
+    'workers': int(os.getenv('MESSAGE_WORKERS', '4')),
+    'max_retries': int(os.getenv('MESSAGE_MAX_RETRIES', '2')),
+    'lease_seconds': int(os.getenv('MESSAGE_LEASE_SECONDS', '300')),
+    'long_poll_max_seconds': float(os.getenv('TICKET_LONG_POLL_MAX', '25'))
+}
+
+# Limitation de débit par expéditeur et plafond d'appels Claude simultanés
+RATE_LIMIT_CONFIG = {
+    'sender_rate_per_minute': float(os.getenv('RATE_LIMIT_PER_MINUTE', '6')),
+    'sender_burst': int(os.getenv('RATE_LIMIT_BURST', '3')),
+    'max_inflight_claude': int(os.getenv('CLAUDE_MAX_INFLIGHT', '4')),
+    'max_queued_messages': int(os.getenv('CLAUDE_MAX_QUEUED', '100'))
+}
+
+# Configuration du cache de contexte client
+CONTEXT_CACHE_CONFIG = {
+    'max_entries': int(os.getenv('CONTEXT_CACHE_MAX_ENTRIES', '5000')),
+    'ttl_seconds': float(os.getenv('CONTEXT_CACHE_TTL_SECONDS', '300')),
+    'poll_interval': float(os.getenv('CONTEXT_CACHE_POLL_SECONDS', '1'))
+}
+
+# Configuration du cache persistant des classifications et réponses Claude
+RESPONSE_CACHE_CONFIG = {
+    'enabled': os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    'ttl_seconds': float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', str(24 * 3600))),
+    'max_entries': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '10000')),
+    # Fusion des compteurs de consultation et éviction LRU (hors du chemin des requêtes)
+    'flush_interval_seconds': float(os.getenv('RESPONSE_CACHE_FLUSH_SECONDS', '5'))
+}
+
+# Détection des rafales de messages quasi identiques (incidents transporteur...)
+BURST_CONFIG = {
+    'threshold': float(os.getenv('BURST_SIMILARITY_THRESHOLD', '0.6')),
+    'window_seconds': float(os.getenv('BURST_WINDOW_SECONDS', '1800')),
+    'min_burst_size': int(os.getenv('BURST_MIN_SIZE', '3'))
+}
+
+# Plafonds max_tokens adaptatifs et compactage du contexte des prompts Claude
+TOKEN_BUDGET_CONFIG = {
+    'window': int(os.getenv('TOKEN_BUDGET_WINDOW', '200')),
+    'min_samples': int(os.getenv('TOKEN_BUDGET_MIN_SAMPLES', '30')),
+    'percentile': float(os.getenv('TOKEN_BUDGET_PERCENTILE', '99')),
+    'headroom': float(os.getenv('TOKEN_BUDGET_HEADROOM', '1.2')),
+    'max_context_tokens': int(os.getenv('TOKEN_BUDGET_CONTEXT_TOKENS', '350'))
+}
+
+# Résilience des appels Anthropic : délai par appel, disjoncteur, requêtes couvertes
+RESILIENCE_CONFIG = {
+    'deadline_seconds': float(os.getenv('CLAUDE_DEADLINE_SECONDS', '30')),
+    'failure_threshold': int(os.getenv('CLAUDE_BREAKER_FAILURES', '5')),
+    'slo_seconds': float(os.getenv('CLAUDE_SLO_SECONDS', '20')),
+    'reset_seconds': float(os.getenv('CLAUDE_BREAKER_RESET_SECONDS', '30')),
+    'hedge': os.getenv('CLAUDE_HEDGED_REQUESTS', 'false').lower() in ('1', 'true', 'yes'),
+    'hedge_min_delay': float(os.getenv('CLAUDE_HEDGE_MIN_DELAY', '1'))
+}
+
+# Routage des messages : modèle rapide pour les cas simples, grand modèle pour les cas sensibles.
+# La classification reste par défaut sur le grand modèle : le préfixe système mis en cache
+# (~1,5k tokens) est sous le minimum cachable de Haiku (2048 tokens), alors qu'il est relu
+# du cache à 10 % du prix sur Sonnet. Les réponses routées vers le modèle rapide ne profitent
+# pas du cache de prompt, compensé par un prix des tokens de sortie près de 4 fois plus bas.
+ROUTING_CONFIG = {
+    'enabled': os.getenv('CLAUDE_ROUTING', 'true').lower() in ('1', 'true', 'yes'),
+    'fast_model': os.getenv('CLAUDE_FAST_MODEL', 'claude-3-5-haiku-20241022'),
+    'large_model': os.getenv('CLAUDE_LARGE_MODEL', 'claude-3-5-sonnet-20240620'),
+    'classification_model': os.getenv('CLAUDE_CLASSIFICATION_MODEL') or None,
+    'max_fast_urgency': int(os.getenv('CLAUDE_FAST_MAX_URGENCY', '3')),
+    'min_confidence': float(os.getenv('CLAUDE_FAST_MIN_CONFIDENCE', '0.7')),
+    'large_sentiments': [s.strip() for s in os.getenv('CLAUDE_LARGE_SENTIMENTS', 'negatif,tres_negatif').split(',') if s.strip()],
+    'large_categories': [c.strip() for c in os.getenv('CLAUDE_LARGE_CATEGORIES', 'reclamation').split(',') if c.strip()]
+}
+
+# Classifieur local appris sur les classifications Claude (automation/local_classifier.py)
+LOCAL_CLASSIFIER_CONFIG = {
+    'model_path': os.getenv('LOCAL_CLASSIFIER_PATH', os.path.join('data', 'local_classifier.npz')),
+    'threshold': float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.9')),
+    'audit_rate': float(os.getenv('LOCAL_CLASSIFIER_AUDIT_RATE', '0.05'))
+}
+
+# Traitement par lots de l'arriéré (Message Batches API, automation/batch_processor.py)
+BATCH_CONFIG = {
+    'page_size': int(os.getenv('BATCH_PAGE_SIZE', '500')),
+    'max_batch_size': int(os.getenv('BATCH_MAX_SIZE', '10000')),
+    'poll_interval': float(os.getenv('BATCH_POLL_SECONDS', '60'))
+}
+
+# Configuration du streaming SSE des réponses
+STREAM_CONFIG = {
+    'idle_timeout_seconds': int(os.getenv('STREAM_IDLE_TIMEOUT', '60')),
+    'retention_seconds': int(os.getenv('STREAM_RETENTION_SECONDS', '300'))
+}
+
+# Configuration du serveur ASGI (API client asynchrone)
+ASGI_CONFIG = {
+    'host': os.getenv('ASGI_HOST', '0.0.0.0'),
+    'port': int(os.getenv('ASGI_PORT', '5000')),
+    'db_threads': int(os.getenv('ASGI_DB_THREADS', '8')),
+    'wsgi_threads': int(os.getenv('ASGI_WSGI_THREADS', '32')),
+    'max_inflight_claude': int(os.getenv('ASGI_MAX_INFLIGHT_CLAUDE', '256'))
+}
+
 # Vérification des variables obligatoires
 def check_config():
     """Vérifie que toutes les variables d'environnement nécessaires sont définies"""
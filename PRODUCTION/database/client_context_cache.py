@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache du Contexte Client
+Contexte assemblé (fiche client + dernières commandes) gardé par email, borné
+en taille (LRU) et en durée (TTL). Toute écriture touchant un client invalide
+son entrée ; les autres processus (interface admin, autres workers web) sont
+prévenus par la table cache_invalidations, relue au plus une fois par intervalle.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+def ensure_invalidation_table(conn):
+    """Crée la table des invalidations partagée entre processus"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def record_invalidation(conn, email: str) -> int:
+    """
+    Signale aux autres processus que le contexte d'un client a changé
+    (à appeler dans la transaction qui modifie ses données)
+
+    Returns:
+        Identifiant de l'invalidation
+    """
+    cursor = conn.execute('INSERT INTO cache_invalidations (email) VALUES (?)', (email,))
+    return cursor.lastrowid
+
+
+def read_client_context(conn, email: str) -> Dict[str, Any]:
+    """
+    Lit le contexte d'un client pour l'agent IA (tables client et commandes_details)
+
+    Returns:
+        {'client', 'nb_commandes', 'total_depense', 'commandes'} (5 dernières commandes)
+    """
+    context = {
+        "client": None,
+        "nb_commandes": 0,
+        "total_depense": 0,
+        "commandes": []
+    }
+    # 1. Récupérer les informations du client depuis la table 'client'
+    client_info = conn.execute('SELECT * FROM client WHERE email = ?', (email,)).fetchone()
+    if client_info:
+        context['client'] = dict(client_info)
+
+    # 2. Récupérer l'historique des commandes depuis la table unifiée 'commandes_details'
+    orders = conn.execute(
+        """
+        SELECT commande_id, created_at, statut, montant_total, produits_json
+        FROM commandes_details
+        WHERE client_email = ?
+        ORDER BY created_at DESC
+        LIMIT 5
+        """, (email,)
+    ).fetchall()
+
+    if orders:
+        context['nb_commandes'] = len(orders)
+        context['total_depense'] = float(sum(o['montant_total'] for o in orders))
+        context['commandes'] = [_order_context(order) for order in orders]
+
+    return context
+
+
+def read_client_orders(conn, email: str, order_ids) -> list:
+    """
+    Lit les commandes citées dans un message (numéros extraits par automation.entity_extractor),
+    limitées à celles du client
+
+    Returns:
+        Commandes au format de read_client_context, dans l'ordre de order_ids
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return []
+    orders = conn.execute(
+        f"""
+        SELECT commande_id, created_at, statut, montant_total, produits_json
+        FROM commandes_details
+        WHERE client_email = ? AND commande_id IN ({', '.join('?' * len(order_ids))})
+        """, [email] + order_ids
+    ).fetchall()
+    found = {order['commande_id']: _order_context(order) for order in orders}
+    return [found[order_id] for order_id in order_ids if order_id in found]
+
+
+def _order_context(order) -> Dict[str, Any]:
+    try:
+        produits = json.loads(order['produits_json'])
+    except (json.JSONDecodeError, TypeError):
+        produits = []  # Gérer le cas où le JSON est invalide ou null
+
+    return {
+        'id': order['commande_id'],
+        'date': order['created_at'],
+        'statut': order['statut'],
+        'montant': float(order['montant_total']),
+        'produits': produits
+    }
+
+
+class ClientContextCache:
+    """Cache LRU/TTL du contexte client avec invalidation à l'écriture"""
+
+    def __init__(self, loader: Callable[[str], Dict], db_pool=None, max_entries: int = 5000,
+                 ttl_seconds: float = 300, poll_interval: float = 1.0, retention_seconds: int = 600):
+        """
+        Args:
+            loader: Fonction qui lit le contexte d'un email en base
+            db_pool: Pool de connexions pour les invalidations entre processus (optionnel)
+            max_entries: Nombre maximum d'emails gardés en cache
+            ttl_seconds: Durée de vie d'une entrée
+            poll_interval: Intervalle minimum entre deux lectures des invalidations
+            retention_seconds: Âge au-delà duquel les invalidations sont supprimées
+        """
+        self.loader = loader
+        self.db_pool = db_pool
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+
+        # email -> (expiration, contexte)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        # Incrémenté à chaque invalidation : un chargement commencé avant n'est pas gardé
+        self._version = 0
+        self._last_invalidation_id = 0
+        self._own_invalidations = set()
+        self._last_poll = 0.0
+        self._last_purge = 0.0
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'remote_invalidations': 0
+        }
+
+    def ensure_table(self):
+        """Crée la table des invalidations et ignore celles déjà présentes"""
+        if not self.db_pool:
+            return
+        with self.db_pool.connection() as conn:
+            ensure_invalidation_table(conn)
+            row = conn.execute('SELECT MAX(id) FROM cache_invalidations').fetchone()
+        self._last_invalidation_id = row[0] or 0
+        self._last_poll = time.monotonic()
+
+    def get(self, email: str) -> Dict[str, Any]:
+        """
+        Retourne le contexte d'un email (partagé entre appelants : ne pas le modifier)
+
+        Les erreurs du loader sont propagées et rien n'est mis en cache.
+        """
+        self._poll_invalidations()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(email)
+                    self.stats['hits'] += 1
+                    return entry[1]
+                del self._entries[email]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            version = self._version
+
+        context = self.loader(email)
+
+        with self._lock:
+            if self._version == version:
+                self._entries[email] = (now + self.ttl, context)
+                self._entries.move_to_end(email)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return context
+
+    def invalidate(self, email: str):
+        """Oublie le contexte d'un email (après le commit de l'écriture) et prévient les autres processus"""
+        self._drop([email])
+        with self._lock:
+            self.stats['invalidations'] += 1
+
+        if not self.db_pool:
+            return
+        try:
+            with self.db_pool.connection() as conn:
+                invalidation_id = record_invalidation(conn, email)
+            with self._lock:
+                self._own_invalidations.add(invalidation_id)
+        except Exception as e:
+            print(f"⚠️ Erreur enregistrement invalidation cache: {e}")
+
+    def _drop(self, emails):
+        with self._lock:
+            self._version += 1
+            for email in emails:
+                self._entries.pop(email, None)
+
+    def _poll_invalidations(self):
+        """Applique les invalidations écrites par les autres processus"""
+        if not self.db_pool or time.monotonic() - self._last_poll < self.poll_interval:
+            return
+        # Un seul thread interroge la base, les autres continuent sans attendre
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_poll = time.monotonic()
+            with self.db_pool.connection() as conn:
+                rows = conn.execute(
+                    'SELECT id, email FROM cache_invalidations WHERE id > ? ORDER BY id',
+                    (self._last_invalidation_id,)
+                ).fetchall()
+
+                if self._last_poll - self._last_purge > self.retention_seconds / 10:
+                    self._last_purge = self._last_poll
+                    conn.execute(
+                        "DELETE FROM cache_invalidations WHERE created_at < datetime('now', ?)",
+                        (f'-{self.retention_seconds} seconds',)
+                    )
+
+            if not rows:
+                return
+            self._last_invalidation_id = rows[-1][0]
+
+            remote = []
+            with self._lock:
+                for invalidation_id, email in rows:
+                    if invalidation_id in self._own_invalidations:
+                        self._own_invalidations.discard(invalidation_id)
+                    else:
+                        remote.append(email)
+                self.stats['remote_invalidations'] += len(remote)
+            if remote:
+                self._drop(remote)
+        except Exception as e:
+            print(f"⚠️ Erreur lecture invalidations cache: {e}")
+        finally:
+            self._poll_lock.release()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les métriques du cache (dont le taux de succès)"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else None
+        })
+        return stats
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool de Connexions SQLite
+Une connexion réutilisable par thread, configurée une seule fois à sa création
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class _ThreadConnection:
+    """Connexion rattachée à un thread (libérée à la fin du thread)"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.depth = 0
+
+
+class SQLiteConnectionPool:
+    """Pool de connexions SQLite thread-local avec métriques de checkout"""
+
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456
+    }
+
+    def __init__(self, db_path: str, pragmas: Optional[Dict[str, Any]] = None, max_connections: int = 64,
+                 acquire_timeout: Optional[float] = None):
+        """
+        Initialise le pool (aucune connexion n'est ouverte avant le premier usage)
+
+        Args:
+            db_path: Chemin de la base SQLite
+            pragmas: PRAGMA appliqués à chaque nouvelle connexion
+            max_connections: Nombre maximum de connexions ouvertes simultanément
+            acquire_timeout: Attente maximale (secondes) d'une place quand toutes les
+                connexions sont prises (par défaut le busy_timeout de SQLite)
+        """
+        self.db_path = db_path
+        self.pragmas = dict(self.DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.max_connections = max_connections
+        self.acquire_timeout = (acquire_timeout if acquire_timeout is not None
+                                else int(self.pragmas['busy_timeout']) / 1000)
+
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._open = weakref.WeakSet()
+
+        self.stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0
+        }
+
+    def _create_connection(self) -> sqlite3.Connection:
+        """Ouvre une connexion et applique les PRAGMA"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        # La connexion n'est utilisée que par son thread ; check_same_thread=False
+        # permet seulement de la fermer depuis le ramasse-miettes ou close_all()
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _release(self, connection: sqlite3.Connection):
+        """Ferme une connexion et libère sa place dans le pool"""
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self.stats['closed'] += 1
+        self._slots.release()
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Retourne la connexion du thread courant (ne pas la fermer)"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is not None:
+            with self._lock:
+                self.stats['checkouts'] += 1
+            return holder.connection
+
+        # Première utilisation dans ce thread : attendre une place puis ouvrir
+        # (les threads longs — workers, writers, flux SSE — gardent la leur jusqu'à leur fin)
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.stats['timeouts'] += 1
+            raise sqlite3.OperationalError(
+                f"Pool de connexions saturé: {self.max_connections} connexions ouvertes, "
+                f"aucune libérée en {self.acquire_timeout:g}s (DB_POOL_MAX_CONNECTIONS)"
+            )
+        try:
+            connection = self._create_connection()
+        except Exception:
+            self._slots.release()
+            raise
+        wait_ms = (time.perf_counter() - start) * 1000
+
+        holder = _ThreadConnection(connection)
+        weakref.finalize(holder, self._release, connection)
+        self._local.holder = holder
+        self._open.add(holder)
+
+        with self._lock:
+            self.stats['created'] += 1
+            self.stats['checkouts'] += 1
+            self.stats['wait_ms_total'] += wait_ms
+            self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], wait_ms)
+
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """
+        Fournit la connexion du thread courant dans une transaction
+
+        Valide (commit) à la sortie du bloc le plus externe, annule (rollback)
+        en cas d'exception. Les blocs imbriqués partagent la même transaction.
+        """
+        connection = self.get_connection()
+        holder = self._local.holder
+        holder.depth += 1
+        try:
+            yield connection
+        except Exception:
+            if holder.depth == 1:
+                connection.rollback()
+            raise
+        else:
+            if holder.depth == 1:
+                connection.commit()
+        finally:
+            holder.depth -= 1
+
+    def close_all(self):
+        """Ferme toutes les connexions ouvertes (arrêt du processus)"""
+        for holder in list(self._open):
+            holder.connection.close()
+        self._local = threading.local()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retourne les métriques du pool"""
+        with self._lock:
+            stats = dict(self.stats)
+        checkouts = stats['checkouts']
+        stats.update({
+            'open_connections': stats['created'] - stats['closed'],
+            'max_connections': self.max_connections,
+            'wait_ms_avg': round(stats['wait_ms_total'] / checkouts, 3) if checkouts else 0.0,
+            'wait_ms_total': round(stats['wait_ms_total'], 3),
+            'wait_ms_max': round(stats['wait_ms_max'], 3)
+        })
+        return stats
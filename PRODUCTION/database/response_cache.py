@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache Persistant des Classifications et Réponses Claude
+Les messages répétitifs ("où en est ma commande #…", remboursements) réutilisent
+une classification ou une réponse déjà générée. La clé combine le texte normalisé,
+la catégorie et une empreinte du contexte client utile ; les valeurs propres au
+client (prénom, références et montants de commande...) sont remplacées par des
+variables à l'écriture et réinjectées à la lecture. Un texte qui garde une autre
+donnée du client (date, quantité, référence courte, produit, adresse...) absente
+du message n'est pas mis en cache : il n'est jamais servi à un autre client.
+Une consultation ne fait qu'une lecture : les compteurs (succès, dernière
+utilisation) sont cumulés en mémoire et fusionnés périodiquement par un thread,
+qui applique aussi l'expiration et l'éviction LRU.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+CLASSIFICATION = 'classification'
+RESPONSE = 'response'
+
+# Références de commande citées dans un message (CMD-AAAAMMJJhhmmss-NN ou #123)
+ORDER_REF_PATTERN = re.compile(r'CMD-\d{14}-\d{2}|#\d+', re.IGNORECASE)
+
+# Valeurs trop courtes pour être remplacées sans risque dans un texte
+MIN_VARIABLE_LENGTH = 3
+
+# Variables d'un texte mis en cache
+VARIABLE_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+
+# Champs du client qui font partie de l'empreinte (identiques pour tous les clients d'une entrée)
+FINGERPRINT_CLIENT_FIELDS = ('type',)
+
+
+def ensure_response_cache_tables(conn):
+    """Crée les tables du cache et de ses compteurs (partagés avec l'interface admin)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            hits INTEGER DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache(last_used_at)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache_stats (
+            kind TEXT PRIMARY KEY,
+            lookups INTEGER DEFAULT 0,
+            hits INTEGER DEFAULT 0,
+            tokens_saved INTEGER DEFAULT 0
+        )
+    ''')
+
+
+def read_response_cache_stats(conn) -> Dict[str, Any]:
+    """
+    Lit les compteurs du cache (tous processus confondus)
+
+    Returns:
+        Compteurs par type d'entrée et totaux (taux de succès, tokens économisés)
+    """
+    try:
+        rows = conn.execute('SELECT kind, lookups, hits, tokens_saved FROM response_cache_stats').fetchall()
+        entries = conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+    except Exception:
+        # Tables pas encore créées par l'application web
+        rows, entries = [], 0
+
+    stats = {'entries': entries, 'lookups': 0, 'hits': 0, 'tokens_saved': 0, 'by_kind': {}}
+    for kind, lookups, hits, tokens_saved in rows:
+        stats['by_kind'][kind] = {
+            'lookups': lookups,
+            'hits': hits,
+            'tokens_saved': tokens_saved,
+            'hit_ratio': round(hits / lookups, 3) if lookups else None
+        }
+        stats['lookups'] += lookups
+        stats['hits'] += hits
+        stats['tokens_saved'] += tokens_saved
+    stats['hit_ratio'] = round(stats['hits'] / stats['lookups'], 3) if stats['lookups'] else None
+    return stats
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces réduits"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^a-z0-9<>_]+', ' ', text).split())
+
+
+def _amount_variants(amount) -> List[str]:
+    """Écritures possibles d'un montant dans une réponse (89,90 en premier, puis 89.9...)"""
+    try:
+        value = float(amount)
+    except (TypeError, ValueError):
+        return []
+    canonical = f"{value:.2f}".replace('.', ',')
+    variants = {f"{value:.2f}", f"{value:g}", str(amount)}
+    variants |= {variant.replace('.', ',') for variant in variants}
+    variants.discard(canonical)
+    return [canonical] + sorted(variants, key=len, reverse=True)
+
+
+class ResponseCache:
+    """Cache SQLite (TTL + LRU) des classifications et réponses générées"""
+
+    def __init__(self, db_pool, ttl_seconds: float = 86400, max_entries: int = 10000,
+                 flush_interval_seconds: float = 5.0):
+        """
+        Initialise le cache (le thread de fusion des compteurs démarre avec start())
+
+        Args:
+            db_pool: Pool de connexions SQLite
+            ttl_seconds: Durée de vie d'une entrée
+            max_entries: Nombre maximum d'entrées (les moins récemment utilisées sont supprimées)
+            flush_interval_seconds: Intervalle entre deux fusions des compteurs et évictions
+        """
+        self.db_pool = db_pool
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.flush_interval = flush_interval_seconds
+
+        # kind -> [consultations, succès, tokens économisés] ; clé -> [succès, dernière utilisation]
+        self._pending_stats = {}
+        self._pending_hits = {}
+        self._stored = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            'flushes': 0,
+            'evictions': 0,
+            'errors': 0,
+            'unshareable': 0
+        }
+
+    def ensure_table(self):
+        with self.db_pool.connection() as conn:
+            ensure_response_cache_tables(conn)
+
+    def start(self):
+        """Démarre le thread de fusion périodique des compteurs"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="response-cache-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def close(self, timeout: float = 5.0):
+        """Arrête le thread après une dernière fusion"""
+        if self._thread is None:
+            self.flush()
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    # Variables propres au client
+
+    def _variables(self, message: str, customer_context: Dict = None) -> Dict[str, List[str]]:
+        """
+        Valeurs propres au client et au message, par nom de variable
+
+        La première écriture de chaque variable sert à la substitution,
+        les autres sont seulement reconnues dans les textes mis en cache.
+        """
+        variables = {}
+        for index, ref in enumerate(ORDER_REF_PATTERN.findall(message or ''), 1):
+            variables[f'ref_{index}'] = [ref]
+
+        customer_context = customer_context or {}
+        client = customer_context.get('client') or {}
+        for field in ('email', 'prenom', 'nom'):
+            if client.get(field):
+                variables[field] = [str(client[field])]
+
+        for index, order in enumerate(customer_context.get('commandes') or [], 1):
+            if order.get('id') is not None:
+                variables[f'commande_{index}'] = [str(order['id'])]
+            amounts = _amount_variants(order.get('montant'))
+            if amounts:
+                variables[f'montant_{index}'] = amounts
+
+        if customer_context.get('total_depense'):
+            variables['total_depense'] = _amount_variants(customer_context['total_depense'])
+        return variables
+
+    @staticmethod
+    def _to_template(text: str, variables: Dict[str, List[str]]) -> str:
+        """Remplace les valeurs du client par {{variable}} (les plus longues d'abord)"""
+        replacements = [
+            (value, name) for name, values in variables.items()
+            for value in values if len(value) >= MIN_VARIABLE_LENGTH
+        ]
+        for value, name in sorted(replacements, key=lambda item: len(item[0]), reverse=True):
+            # Valeur entière uniquement ("Marc" ne doit pas toucher "Marcel")
+            text = re.sub(r'(?<!\w)' + re.escape(value) + r'(?!\w)', '{{' + name + '}}', text)
+        return text
+
+    @staticmethod
+    def _from_template(template: str, variables: Dict[str, List[str]]) -> Optional[str]:
+        """Réinjecte les valeurs du client ; None si une variable n'a pas de valeur"""
+        missing = []
+
+        def substitute(match):
+            values = variables.get(match.group(1))
+            if not values:
+                missing.append(match.group(1))
+                return match.group(0)
+            return values[0]
+
+        text = VARIABLE_PATTERN.sub(substitute, template)
+        return None if missing else text
+
+    @staticmethod
+    def _private_values(customer_context: Dict = None) -> List[str]:
+        """Textes du contexte client hors empreinte (fiche client, produits commandés), normalisés"""
+        customer_context = customer_context or {}
+        client = customer_context.get('client') or {}
+        values = [value for field, value in client.items()
+                  if field not in FINGERPRINT_CLIENT_FIELDS and isinstance(value, str)]
+        for order in customer_context.get('commandes') or []:
+            for item in order.get('produits') or []:
+                if isinstance(item, dict):
+                    values.extend(value for value in item.values() if isinstance(value, str))
+                elif isinstance(item, str):
+                    values.append(item)
+        return [value for value in dict.fromkeys(normalize_text(value) for value in values) if len(value) > 1]
+
+    def _shareable(self, template: str, key_text: str, customer_context: Dict) -> bool:
+        """
+        Un texte (déjà converti en modèle) peut être servi à tout client de la même clé
+        s'il ne garde ni chiffre ni texte du contexte client absents du texte de la clé
+        (dates, quantités, références courtes, produits : propres au client d'origine)
+        """
+        text = f" {normalize_text(VARIABLE_PATTERN.sub(' ', template))} "
+        key_text = f" {key_text} "
+        key_numbers = set(re.findall(r'\d+', key_text))
+        if any(number not in key_numbers for number in re.findall(r'\d+', text)):
+            return False
+        return not any(f' {value} ' in text and f' {value} ' not in key_text
+                       for value in self._private_values(customer_context))
+
+    # Clés
+
+    def _key_text(self, text: str, variables: Dict[str, List[str]]) -> str:
+        """Texte du message tel qu'il entre dans la clé (variables et références masquées)"""
+        return normalize_text(ORDER_REF_PATTERN.sub(' <ref> ', self._to_template(text, variables)))
+
+    def _key(self, kind: str, key_text: str, category: str, customer_context: Dict) -> str:
+        raw = '|'.join([kind, key_text, category or '', self._fingerprint(customer_context)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _fingerprint(customer_context: Dict = None) -> str:
+        """Empreinte du contexte qui change le fond de la réponse (profil, statuts des commandes)"""
+        customer_context = customer_context or {}
+        client = customer_context.get('client') or {}
+        statuses = [order.get('statut') for order in customer_context.get('commandes') or []]
+        return json.dumps([bool(client), client.get('type'), statuses], ensure_ascii=False)
+
+    # Lecture / écriture
+
+    def _lookup(self, kind: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self.db_pool.connection() as conn:
+            row = conn.execute(
+                'SELECT payload, input_tokens, output_tokens FROM response_cache '
+                'WHERE cache_key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+
+        # Compteurs fusionnés en base par flush()
+        with self._lock:
+            counters = self._pending_stats.setdefault(kind, [0, 0, 0])
+            counters[0] += 1
+            if row:
+                counters[1] += 1
+                counters[2] += row[1] + row[2]
+                hits = self._pending_hits.setdefault(key, [0, now])
+                hits[0] += 1
+                hits[1] = now
+        return row[0] if row else None
+
+    def _store(self, kind: str, key: str, payload: str, usage: Dict = None):
+        usage = usage or {}
+        now = time.time()
+        with self.db_pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO response_cache
+                    (cache_key, kind, payload, input_tokens, output_tokens, created_at, last_used_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    payload = excluded.payload,
+                    input_tokens = excluded.input_tokens,
+                    output_tokens = excluded.output_tokens,
+                    created_at = excluded.created_at,
+                    last_used_at = excluded.last_used_at,
+                    expires_at = excluded.expires_at
+            ''', (key, kind, payload, usage.get('input_tokens', 0), usage.get('output_tokens', 0),
+                  now, now, now + self.ttl))
+        with self._lock:
+            self._stored += 1
+
+    def flush(self) -> int:
+        """
+        Fusionne les compteurs en attente puis, après des écritures, applique
+        l'expiration et l'éviction LRU au-delà du maximum
+
+        Returns:
+            Nombre de consultations fusionnées
+        """
+        with self._lock:
+            pending_stats, self._pending_stats = self._pending_stats, {}
+            pending_hits, self._pending_hits = self._pending_hits, {}
+            stored, self._stored = self._stored, 0
+
+        if not pending_stats and not stored:
+            return 0
+
+        try:
+            with self.db_pool.connection() as conn:
+                conn.executemany(
+                    'UPDATE response_cache SET hits = hits + ?, last_used_at = MAX(last_used_at, ?) '
+                    'WHERE cache_key = ?',
+                    [(hits, last_used, key) for key, (hits, last_used) in pending_hits.items()]
+                )
+                conn.executemany('''
+                    INSERT INTO response_cache_stats (kind, lookups, hits, tokens_saved) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(kind) DO UPDATE SET
+                        lookups = lookups + excluded.lookups,
+                        hits = hits + excluded.hits,
+                        tokens_saved = tokens_saved + excluded.tokens_saved
+                ''', [(kind, *counters) for kind, counters in pending_stats.items()])
+
+                evicted = 0
+                if stored:
+                    evicted += conn.execute('DELETE FROM response_cache WHERE expires_at <= ?',
+                                            (time.time(),)).rowcount
+                    evicted += conn.execute('''
+                        DELETE FROM response_cache WHERE cache_key IN (
+                            SELECT cache_key FROM response_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                        )
+                    ''', (self.max_entries,)).rowcount
+        except Exception as e:
+            print(f"⚠️ Erreur fusion compteurs du cache de réponses: {e}")
+            self._restore(pending_stats, pending_hits, stored)
+            return 0
+
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['evictions'] += evicted
+        return sum(counters[0] for counters in pending_stats.values())
+
+    def _restore(self, pending_stats: Dict, pending_hits: Dict, stored: int):
+        """Réintègre des compteurs non écrits pour la prochaine fusion"""
+        with self._lock:
+            self.stats['errors'] += 1
+            self._stored += stored
+            for kind, counters in pending_stats.items():
+                current = self._pending_stats.setdefault(kind, [0, 0, 0])
+                for index, value in enumerate(counters):
+                    current[index] += value
+            for key, (hits, last_used) in pending_hits.items():
+                current = self._pending_hits.setdefault(key, [0, last_used])
+                current[0] += hits
+                current[1] = max(current[1], last_used)
+
+    def _classification_key(self, message: str, subject: str, customer_context: Dict):
+        variables = self._variables(message, customer_context)
+        key_text = self._key_text(f"{subject}\n{message}", variables)
+        return self._key(CLASSIFICATION, key_text, '', customer_context), key_text, variables
+
+    def has_classification(self, message: str, subject: str, customer_context: Dict = None) -> bool:
+        """Indique si une classification est en cache (sans compter de consultation)"""
+        key, _, _ = self._classification_key(message, subject, customer_context)
+        with self.db_pool.connection() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM response_cache WHERE cache_key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        return row is not None
+
+    def get_classification(self, message: str, subject: str, customer_context: Dict = None) -> Optional[Dict]:
+        """Classification en cache pour ce message (éléments clés personnalisés) ou None"""
+        key, _, variables = self._classification_key(message, subject, customer_context)
+        payload = self._lookup(CLASSIFICATION, key)
+        if payload is None:
+            return None
+
+        classification = json.loads(payload)
+        key_elements = [self._from_template(element, variables) for element in classification.get('key_elements', [])]
+        if None in key_elements:
+            return None
+        classification['key_elements'] = key_elements
+        return classification
+
+    def put_classification(self, message: str, subject: str, customer_context: Dict,
+                           classification: Dict, usage: Dict = None) -> bool:
+        """
+        Met en cache une classification (sans ses métadonnées de traitement)
+
+        Returns:
+            False si un élément clé garde une donnée propre au client (rien n'est mis en cache)
+        """
+        key, key_text, variables = self._classification_key(message, subject, customer_context)
+        fields = ('category', 'urgency', 'sentiment', 'key_elements', 'requires_human', 'confidence')
+        cached = {field: classification[field] for field in fields if field in classification}
+        cached['key_elements'] = [
+            self._to_template(str(element), variables) for element in cached.get('key_elements') or []
+        ]
+        if not all(self._shareable(element, key_text, customer_context) for element in cached['key_elements']):
+            return False
+        self._store(CLASSIFICATION, key, json.dumps(cached, ensure_ascii=False), usage)
+        return True
+
+    def get_response(self, message: str, category: str, customer_context: Dict = None) -> Optional[str]:
+        """Réponse en cache pour ce message et cette catégorie, personnalisée pour le client, ou None"""
+        variables = self._variables(message, customer_context)
+        key = self._key(RESPONSE, self._key_text(message, variables), category, customer_context)
+        template = self._lookup(RESPONSE, key)
+        if template is None:
+            return None
+        return self._from_template(template, variables)
+
+    def put_response(self, message: str, category: str, customer_context: Dict, response: str,
+                     usage: Dict = None) -> bool:
+        """
+        Met en cache une réponse, les valeurs du client remplacées par des variables
+
+        Returns:
+            False si la réponse garde une donnée propre au client (rien n'est mis en cache)
+        """
+        variables = self._variables(message, customer_context)
+        key_text = self._key_text(message, variables)
+        template = self._to_template(response, variables)
+        if not self._shareable(template, key_text, customer_context):
+            with self._lock:
+                self.stats['unshareable'] += 1
+            return False
+        self._store(RESPONSE, self._key(RESPONSE, key_text, category, customer_context), template, usage)
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        """Taux de succès et tokens économisés (compteurs persistants)"""
+        with self.db_pool.connection() as conn:
+            stats = read_response_cache_stats(conn)
+        with self._lock:
+            stats.update(self.stats)
+            stats['pending_lookups'] = sum(counters[0] for counters in self._pending_stats.values())
+        stats.update({'ttl_seconds': self.ttl, 'max_entries': self.max_entries})
+        return stats
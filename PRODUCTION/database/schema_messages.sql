@@ -8,7 +8,7 @@ CREATE TABLE IF NOT EXISTS messages (
     client_name TEXT,
     subject TEXT NOT NULL,
     message TEXT NOT NULL,
-    status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme')),
+    status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme', 'erreur')),
     category TEXT,
     urgency INTEGER DEFAULT 1 CHECK (urgency BETWEEN 1 AND 5),
     sentiment TEXT,
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Écriture Groupée des Logs de Transactions
+Les requêtes se contentent de mettre les événements en file ; un thread
+les insère dans transaction_logs par lots (un executemany par transaction).
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+class TransactionLogWriter:
+    """Puits de logs en mémoire vidé périodiquement dans transaction_logs"""
+
+    def __init__(self, db_pool, flush_interval_ms: int = 200, batch_size: int = 100, max_queue: int = 10000):
+        """
+        Initialise le writer (le thread démarre avec start())
+
+        Args:
+            db_pool: Pool de connexions (SQLiteConnectionPool)
+            flush_interval_ms: Délai maximum avant l'écriture d'un événement
+            batch_size: Nombre d'événements déclenchant une écriture immédiate
+            max_queue: Taille maximum de la file (au-delà, les événements sont perdus)
+        """
+        self.db_pool = db_pool
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'errors': 0
+        }
+
+    def ensure_table(self):
+        """Crée la table transaction_logs (appelé au démarrage, hors des requêtes)"""
+        with self.db_pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS transaction_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    details TEXT,
+                    ip_address TEXT,
+                    user_agent TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def start(self):
+        """Démarre le thread d'écriture"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="transaction-log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, email: str, action: str, status: str, details: Optional[Dict] = None) -> bool:
+        """
+        Met un événement en file sans attendre la base
+
+        Returns:
+            False si la file est pleine et que l'événement a été perdu
+        """
+        # Horodatage UTC au format de CURRENT_TIMESTAMP, pris au moment de l'événement
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        row = (email, action, status, json.dumps(details) if details else None, timestamp)
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+            return False
+
+        with self._lock:
+            self.stats['enqueued'] += 1
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+        # Vider ce qui reste à l'arrêt
+        self._drain()
+
+    def _collect(self):
+        """Attend un premier événement puis regroupe jusqu'au lot ou au délai"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with self.db_pool.connection() as conn:
+                conn.executemany('''
+                    INSERT INTO transaction_logs (email, action, status, details, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', batch)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+                self.stats['dropped'] += len(batch)
+            print(f"⚠️ Erreur écriture logs transactions ({len(batch)} perdus): {e}")
+            return
+
+        with self._lock:
+            self.stats['written'] += len(batch)
+            self.stats['flushes'] += 1
+
+    def close(self, timeout: float = 5.0):
+        """Arrête le thread après avoir écrit les événements en attente"""
+        if self._thread is None:
+            self._drain()
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les compteurs du writer pour le monitoring"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
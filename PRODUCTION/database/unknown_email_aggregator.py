@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agrégation des Emails Inconnus
+Les tentatives refusées sont comptées en mémoire puis fusionnées
+périodiquement dans unknown_emails par un seul lot d'upserts.
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+
+class UnknownEmailAggregator:
+    """Compteur en mémoire des tentatives d'emails inconnus, vidé périodiquement"""
+
+    def __init__(self, db_pool, flush_interval_seconds: float = 5.0, max_emails: int = 10000):
+        """
+        Initialise l'agrégateur (le thread démarre avec start())
+
+        Args:
+            db_pool: Pool de connexions (SQLiteConnectionPool)
+            flush_interval_seconds: Intervalle entre deux écritures en base
+            max_emails: Nombre maximum d'emails distincts gardés entre deux écritures
+        """
+        self.db_pool = db_pool
+        self.flush_interval = flush_interval_seconds
+        self.max_emails = max_emails
+
+        # email -> [first_attempt, last_attempt, attempt_count, action_type]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            'recorded': 0,
+            'flushed_attempts': 0,
+            'flushes': 0,
+            'dropped': 0,
+            'errors': 0
+        }
+
+    def ensure_table(self):
+        """Crée la table unknown_emails (appelé au démarrage, hors des requêtes)"""
+        with self.db_pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS unknown_emails (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE NOT NULL,
+                    first_attempt DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_attempt DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    attempt_count INTEGER DEFAULT 1,
+                    action_type TEXT DEFAULT 'TENTATIVE_ACCES',
+                    status TEXT DEFAULT 'NON_AUTORISE'
+                )
+            ''')
+
+    def start(self):
+        """Démarre le thread de fusion périodique"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="unknown-email-aggregator", daemon=True)
+        self._thread.start()
+
+    def record(self, email: str, action: str = "TENTATIVE_ACCES") -> bool:
+        """
+        Compte une tentative refusée sans toucher à la base
+
+        Returns:
+            False si la tentative a été perdue (trop d'emails distincts en attente)
+        """
+        # Horodatage UTC au format de CURRENT_TIMESTAMP
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+        with self._lock:
+            entry = self._pending.get(email)
+            if entry is None:
+                if len(self._pending) >= self.max_emails:
+                    self.stats['dropped'] += 1
+                    self._wakeup.set()
+                    return False
+                self._pending[email] = [now, now, 1, action]
+            else:
+                entry[1] = now
+                entry[2] += 1
+                entry[3] = action
+            self.stats['recorded'] += 1
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Fusionne les compteurs en attente dans unknown_emails
+
+        Returns:
+            Nombre d'emails écrits
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        rows = [
+            (email, first, last, count, action)
+            for email, (first, last, count, action) in pending.items()
+        ]
+
+        try:
+            with self.db_pool.connection() as conn:
+                conn.executemany('''
+                    INSERT INTO unknown_emails (email, first_attempt, last_attempt, attempt_count, action_type)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(email) DO UPDATE SET
+                        last_attempt = excluded.last_attempt,
+                        attempt_count = unknown_emails.attempt_count + excluded.attempt_count,
+                        action_type = excluded.action_type
+                ''', rows)
+        except Exception as e:
+            print(f"⚠️ Erreur fusion emails inconnus: {e}")
+            self._restore(pending)
+            return 0
+
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['flushed_attempts'] += sum(row[3] for row in rows)
+        return len(rows)
+
+    def _restore(self, pending: Dict):
+        """Réintègre un lot non écrit pour ne perdre aucune tentative"""
+        with self._lock:
+            self.stats['errors'] += 1
+            for email, (first, last, count, action) in pending.items():
+                entry = self._pending.get(email)
+                if entry is None:
+                    self._pending[email] = [first, last, count, action]
+                else:
+                    entry[0] = min(entry[0], first)
+                    entry[2] += count
+
+    def close(self, timeout: float = 5.0):
+        """Arrête le thread après une dernière fusion"""
+        if self._thread is None:
+            self.flush()
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Retourne les compteurs de l'agrégateur pour le monitoring"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending_emails'] = len(self._pending)
+        return stats
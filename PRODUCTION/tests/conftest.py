@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""Les tests importent les modules comme l'application (depuis PRODUCTION/ et web_app/)"""
+
+import os
+import sys
+
+PRODUCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PRODUCTION_DIR)
+sys.path.insert(0, os.path.join(PRODUCTION_DIR, 'web_app'))
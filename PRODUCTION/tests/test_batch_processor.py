@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Traitement par lots : réclamation de l'arriéré, application des résultats en une transaction"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from automation.batch_processor import BacklogBatchProcessor
+from database.connection_pool import SQLiteConnectionPool
+
+MESSAGES_TABLE = '''
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_email TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        message TEXT NOT NULL,
+        status TEXT DEFAULT 'nouveau',
+        category TEXT, urgency INTEGER, sentiment TEXT, response TEXT, response_time REAL,
+        quality_score REAL, model_used TEXT, classified_by TEXT, processed_at DATETIME,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+class FakeBatches:
+    """Message Batches API : chaque résultat est défini par le texte du message"""
+
+    def __init__(self):
+        self.requests = []
+
+    def create(self, requests):
+        self.requests = requests
+        return SimpleNamespace(id='msgbatch_1')
+
+    def results(self, batch_id):
+        for request in self.requests:
+            text = request['params']['messages'][0]['content']
+            result_type = 'errored' if 'erreur' in text else 'succeeded'
+            yield SimpleNamespace(custom_id=request['custom_id'],
+                                  result=SimpleNamespace(type=result_type, message=text))
+
+
+class FakeAgent:
+    def __init__(self):
+        self.client = SimpleNamespace(messages=SimpleNamespace(batches=FakeBatches()))
+
+    def batch_request(self, message, subject, customer_context):
+        return {"messages": [{"role": "user", "content": message}]}
+
+    def batch_result(self, email, subject, message, response_message, customer_context):
+        usage = {'input_tokens': 100, 'output_tokens': 50}
+        if 'illisible' in response_message:
+            return {'error': 'JSON invalide', 'usage': usage}
+        return {'category': 'retard_livraison', 'urgency': 3, 'sentiment': 'negatif',
+                'response': f"Réponse à {email}", 'quality_score': 0.9, 'model': 'claude',
+                'classified_by': 'claude', 'usage': usage}
+
+
+@pytest.fixture
+def db_pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'crm.db'))
+    with pool.connection() as conn:
+        conn.execute(MESSAGES_TABLE)
+        conn.executemany(
+            "INSERT INTO messages (client_email, subject, message, status) VALUES (?, 's', ?, ?)",
+            [('a@b.fr', 'Où est mon colis ?', 'nouveau'),
+             ('a@b.fr', 'erreur côté API', 'nouveau'),
+             ('c@d.fr', 'réponse illisible', 'nouveau'),
+             ('c@d.fr', 'déjà traité', 'traite')]
+        )
+    yield pool
+    pool.close_all()
+
+
+def statuses(db_pool):
+    with db_pool.connection() as conn:
+        return [tuple(row) for row in conn.execute('SELECT id, status, batch_id, response FROM messages ORDER BY id')]
+
+
+def test_submit_then_apply_results(db_pool):
+    processor = BacklogBatchProcessor(db_pool, FakeAgent(), context_loader=lambda conn, email: {},
+                                      page_size=2)
+    processor.ensure_tables()
+
+    assert processor.submit() == 'msgbatch_1'
+    assert [row[1:3] for row in statuses(db_pool)[:3]] == [('en_cours', 'msgbatch_1')] * 3
+    assert processor.pending_batches() == ['msgbatch_1']
+
+    assert processor.apply_results('msgbatch_1') == {'succeeded': 1, 'errored': 2}
+    assert statuses(db_pool) == [
+        (1, 'traite', 'msgbatch_1', 'Réponse à a@b.fr'),
+        (2, 'nouveau', None, None),
+        (3, 'nouveau', None, None),
+        (4, 'traite', None, None),
+    ]
+    assert processor.pending_batches() == []
+    assert processor.get_status()['input_tokens'] == 200
+
+
+def test_empty_backlog_submits_nothing(db_pool):
+    with db_pool.connection() as conn:
+        conn.execute("UPDATE messages SET status = 'traite'")
+    processor = BacklogBatchProcessor(db_pool, FakeAgent(), context_loader=lambda conn, email: {})
+    processor.ensure_tables()
+    assert processor.submit() is None
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Détection des rafales : messages quasi identiques regroupés, classification partagée"""
+
+from automation.burst_detector import BurstDetector, minhash, similarity
+from database.connection_pool import SQLiteConnectionPool
+
+OUTAGE = [
+    "Bonjour, le site ne fonctionne plus depuis ce matin, impossible de payer ma commande CMD-20240415090000-01",
+    "Bonjour, le site ne fonctionne plus depuis ce matin, impossible de payer ma commande CMD-20240415091500-07 !",
+    "Bonjour le site ne fonctionne plus depuis ce matin, impossible de payer ma commande CMD-20240415093000-12 merci",
+]
+UNRELATED = "Je souhaite retourner le pull reçu hier, la taille ne convient pas à mon fils"
+
+
+def test_near_duplicates_share_a_cluster(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'crm.db'))
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY, cluster_id INTEGER)')
+        conn.executemany('INSERT INTO messages (id) VALUES (?)', [(1,), (2,), (3,), (4,)])
+    detector = BurstDetector(db_pool=pool, threshold=0.6, min_burst_size=3)
+    detector.ensure_table()
+
+    assert similarity(minhash(OUTAGE[0]), minhash(OUTAGE[1])) >= 0.6
+    assert similarity(minhash(OUTAGE[0]), minhash(UNRELATED)) < 0.6
+
+    assert detector.add(1, OUTAGE[0]) is None
+    assert detector.add(4, UNRELATED) is None
+    assert detector.add(2, OUTAGE[1]) is None
+    cluster_id = detector.add(3, OUTAGE[2])
+    assert cluster_id is not None
+
+    with pool.connection() as conn:
+        members = dict(conn.execute('SELECT id, cluster_id FROM messages'))
+        size = conn.execute('SELECT size FROM message_clusters WHERE id = ?', (cluster_id,)).fetchone()[0]
+    assert members == {1: cluster_id, 2: cluster_id, 3: cluster_id, 4: None}
+    assert size == 3
+
+    status = detector.get_status()
+    assert status['clustered'] == 2
+    assert status['bursts'] == 1
+    assert status['tracked_clusters'] == 2
+    pool.close_all()
+
+
+def test_cluster_classification_is_reused_without_key_elements():
+    detector = BurstDetector()
+    detector.add(1, OUTAGE[0])
+    detector.add(2, OUTAGE[1])
+    detector.add(3, UNRELATED)
+    assert detector.classification_for(2) is None
+
+    detector.record_classification(1, {'category': 'probleme_technique', 'urgency': 4,
+                                       'key_elements': ['CMD-20240415090000-01']})
+
+    assert detector.classification_for(2) == {'category': 'probleme_technique', 'urgency': 4, 'key_elements': []}
+    assert detector.classification_for(3) is None
+    # Texte trop court pour être comparé
+    assert detector.add(5, "Merci") is None
+    assert detector.classification_for(5) is None
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Cache du contexte client : invalidation locale et entre processus (cache_invalidations)"""
+
+from database.client_context_cache import ClientContextCache, record_invalidation
+from database.connection_pool import SQLiteConnectionPool
+
+
+def test_invalidation_reaches_other_instances(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'crm.db'))
+    store = {'marie@exemple.fr': {'nb_commandes': 1}}
+    loads = []
+
+    def loader(email):
+        loads.append(email)
+        return dict(store[email])
+
+    # Deux processus (application web et interface admin) sur la même base
+    web = ClientContextCache(loader, db_pool=pool, poll_interval=0)
+    admin = ClientContextCache(loader, db_pool=pool, poll_interval=0)
+    web.ensure_table()
+    admin.ensure_table()
+
+    assert web.get('marie@exemple.fr') == {'nb_commandes': 1}
+    assert admin.get('marie@exemple.fr') == {'nb_commandes': 1}
+    assert web.get('marie@exemple.fr') == {'nb_commandes': 1}
+    assert len(loads) == 2
+
+    store['marie@exemple.fr'] = {'nb_commandes': 2}
+    admin.invalidate('marie@exemple.fr')
+
+    assert admin.get('marie@exemple.fr') == {'nb_commandes': 2}
+    assert web.get('marie@exemple.fr') == {'nb_commandes': 2}
+    assert web.get_status()['remote_invalidations'] == 1
+    # L'instance qui a invalidé ne compte pas sa propre invalidation comme distante
+    assert admin.get_status()['remote_invalidations'] == 0
+
+    # Écriture directe en base (script, autre worker) dans sa propre transaction
+    store['marie@exemple.fr'] = {'nb_commandes': 3}
+    with pool.connection() as conn:
+        record_invalidation(conn, 'marie@exemple.fr')
+    assert web.get('marie@exemple.fr') == {'nb_commandes': 3}
+    assert admin.get('marie@exemple.fr') == {'nb_commandes': 3}
+    pool.close_all()
+
+
+def test_lru_and_ttl_without_database():
+    cache = ClientContextCache(lambda email: {'email': email}, max_entries=2, ttl_seconds=0)
+
+    for email in ('a@b.fr', 'c@d.fr', 'e@f.fr'):
+        cache.get(email)
+    assert cache.get_status()['evictions'] == 1
+
+    cache.get('e@f.fr')
+    status = cache.get_status()
+    assert status['expired'] == 1
+    assert status['hits'] == 0
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Pool de connexions : attente bornée quand le pool est saturé, place rendue en fin de thread"""
+
+import gc
+import sqlite3
+import threading
+
+from database.connection_pool import SQLiteConnectionPool
+
+
+def in_thread(pool):
+    """Ouvre une connexion depuis un autre thread et retourne l'erreur éventuelle"""
+    errors = []
+
+    def target():
+        try:
+            with pool.connection() as conn:
+                conn.execute('SELECT 1')
+        except sqlite3.OperationalError as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=target)
+    worker.start()
+    worker.join(5)
+    return errors
+
+
+def test_exhausted_pool_times_out(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'pool.db'), max_connections=1, acquire_timeout=0.1)
+    with pool.connection() as conn:
+        conn.execute('SELECT 1')
+
+    # Le thread principal garde la seule connexion : l'autre thread attend puis échoue
+    errors = in_thread(pool)
+    assert len(errors) == 1
+    assert 'saturé' in str(errors[0])
+    assert pool.get_stats()['timeouts'] == 1
+    pool.close_all()
+
+
+def test_finished_thread_frees_its_slot(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'pool.db'), max_connections=1, acquire_timeout=1)
+
+    assert in_thread(pool) == []
+    gc.collect()
+    assert in_thread(pool) == []
+
+    stats = pool.get_stats()
+    assert stats['created'] == 2
+    assert stats['timeouts'] == 0
+    pool.close_all()
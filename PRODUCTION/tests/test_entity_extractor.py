@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Extraction des numéros de commande, montants, dates et produits d'un message"""
+
+from automation.entity_extractor import EntityExtractor
+
+PRODUCTS = [(1, 'Cafetière Expresso Deluxe'), (2, 'Pull laine'), (3, 'Pull coton')]
+
+
+def test_order_ids_amounts_and_products():
+    extractor = EntityExtractor(PRODUCTS)
+    entities = extractor.extract("Ma commande CMD-20240312101010-01 (cafetière expresso) et la #42 : "
+                                 "12,50 € puis €8 pour le pull laine")
+
+    assert entities['order_ids'] == ['CMD-20240312101010-01', '42']
+    assert entities['amounts'] == [12.5, 8.0]
+    assert [product['id'] for product in entities['products']] == [1, 2]
+
+
+def test_reference_prefixes():
+    extractor = EntityExtractor()
+
+    assert extractor.extract("Commande n°123, puis N° 45 et no.7")['order_ids'] == ['123', '45', '7']
+    assert extractor.extract("commande no 12")['order_ids'] == ['12']
+    # "No" sans point n'introduit pas un numéro de commande
+    assert extractor.extract("No 3 colis manquants")['order_ids'] == []
+
+
+def test_dates():
+    extractor = EntityExtractor()
+
+    assert extractor.extract("Livré le 12/03, commandé le 1er mars 2024")['dates'] == ['--03-12', '2024-03-01']
+    assert extractor.extract("le 05.04.2024 ou le 2024-04-06")['dates'] == ['2024-04-05', '2024-04-06']
+    # Nombre décimal, séparateurs différents ou date impossible : pas de date
+    assert extractor.extract("Le colis de 3.5 kg")['dates'] == []
+    assert extractor.extract("12.03-2024 et 31/13")['dates'] == []
+
+
+def test_ambiguous_product_prefix_is_ignored():
+    extractor = EntityExtractor(PRODUCTS)
+
+    assert extractor.extract("mon pull est troué")['products'] == []
+    assert extractor.extract("la cafetiere ne chauffe plus")['products'] == [
+        {'id': 1, 'name': 'Cafetière Expresso Deluxe'}]
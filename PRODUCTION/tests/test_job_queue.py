@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Nouvelles tentatives, abandon ('erreur') et reprise de la file de traitement"""
+
+import threading
+
+import pytest
+
+from automation.job_queue import MessageJobQueue
+from database.connection_pool import SQLiteConnectionPool
+
+OLD_MESSAGES_TABLE = '''
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_email TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        message TEXT NOT NULL,
+        status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme')),
+        ticket_id TEXT UNIQUE,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+@pytest.fixture
+def db_pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'messages.db'))
+    with pool.connection() as conn:
+        conn.execute(OLD_MESSAGES_TABLE.replace("'ferme')", "'ferme', 'erreur')"))
+        conn.execute('ALTER TABLE messages ADD COLUMN processing_error TEXT')
+        conn.execute('ALTER TABLE messages ADD COLUMN batch_id TEXT')
+    yield pool
+    pool.close_all()
+
+
+def add_message(db_pool, status='nouveau'):
+    with db_pool.connection() as conn:
+        return conn.execute(
+            "INSERT INTO messages (client_email, subject, message, status) VALUES ('a@b.fr', 's', 'm', ?)",
+            (status,)
+        ).lastrowid
+
+
+def message_row(db_pool, message_id):
+    with db_pool.connection() as conn:
+        return dict(conn.execute('SELECT * FROM messages WHERE id = ?', (message_id,)).fetchone())
+
+
+def run_queue(db_pool, handler, message_ids, max_retries=2, **kwargs):
+    """Traite les messages avec un worker et attend la fin de chacun"""
+    job_queue = MessageJobQueue(db_pool, handler, workers=1, max_retries=max_retries, **kwargs)
+    job_queue._running = True
+    worker = threading.Thread(target=job_queue._worker_loop, daemon=True)
+    worker.start()
+    for message_id in message_ids:
+        job_queue.submit(message_id)
+    for message_id in message_ids:
+        assert job_queue.wait_for(message_id, 5)
+    job_queue._queue.put(None)
+    worker.join(5)
+    return job_queue
+
+
+def test_retry_then_success(db_pool):
+    message_id = add_message(db_pool)
+    calls = []
+
+    def handler(mid, options):
+        calls.append(mid)
+        if len(calls) < 3:
+            raise RuntimeError('API indisponible')
+        with db_pool.connection() as conn:
+            conn.execute("UPDATE messages SET status = 'traite' WHERE id = ?", (mid,))
+
+    job_queue = run_queue(db_pool, handler, [message_id])
+
+    assert len(calls) == 3
+    assert message_row(db_pool, message_id)['status'] == 'traite'
+    assert job_queue.stats['retried'] == 2
+    assert job_queue.stats['failed'] == 0
+
+
+def test_terminal_failure_after_last_retry(db_pool):
+    message_id = add_message(db_pool)
+    calls, failures = [], []
+
+    def handler(mid, options):
+        calls.append(mid)
+        raise RuntimeError('ClaudeAgent non disponible')
+
+    job_queue = run_queue(db_pool, handler, [message_id], max_retries=2,
+                          on_failure=lambda mid, error: failures.append((mid, error)))
+
+    row = message_row(db_pool, message_id)
+    assert len(calls) == 3
+    assert row['status'] == 'erreur'
+    assert row['processing_error'] == 'ClaudeAgent non disponible'
+    assert failures == [(message_id, 'ClaudeAgent non disponible')]
+    assert job_queue.stats['failed'] == 1
+
+    # Un message en erreur n'est jamais remis en file au redémarrage
+    assert MessageJobQueue(db_pool, handler).recover() == 0
+
+
+def test_recover_requeues_pending_and_stale_messages(db_pool):
+    pending = add_message(db_pool)
+    stale = add_message(db_pool, 'en_cours')
+    add_message(db_pool, 'traite')
+    add_message(db_pool, 'erreur')
+    with db_pool.connection() as conn:
+        conn.execute("UPDATE messages SET updated_at = '2000-01-01' WHERE id = ?", (stale,))
+
+    job_queue = MessageJobQueue(db_pool, lambda mid, options: None)
+    assert job_queue.recover() == 2
+    assert [job_queue._queue.get_nowait() for _ in range(2)] == [pending, stale]
+    assert message_row(db_pool, stale)['status'] == 'nouveau'
+
+
+def test_claim_is_exclusive(db_pool):
+    message_id = add_message(db_pool)
+    job_queue = MessageJobQueue(db_pool, lambda mid, options: None)
+    assert job_queue.claim(message_id)
+    assert not job_queue.claim(message_id)
+
+
+def test_migrate_messages_status_keeps_rows(tmp_path):
+    import app
+
+    pool = SQLiteConnectionPool(str(tmp_path / 'old.db'))
+    with pool.connection() as conn:
+        conn.execute(OLD_MESSAGES_TABLE)
+        conn.execute('CREATE INDEX idx_messages_status ON messages(status)')
+        conn.execute("INSERT INTO messages (client_email, subject, message, ticket_id) VALUES ('a@b.fr', 's', 'm', 'T1')")
+        conn.execute('DELETE FROM messages')
+        conn.execute("INSERT INTO messages (client_email, subject, message, ticket_id) VALUES ('a@b.fr', 's', 'm', 'T2')")
+
+        assert app.migrate_messages_status(conn)
+        assert not app.migrate_messages_status(conn)
+
+        conn.execute("UPDATE messages SET status = 'erreur' WHERE ticket_id = 'T2'")
+        assert tuple(conn.execute('SELECT id, status FROM messages').fetchone()) == (2, 'erreur')
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_messages_status'").fetchone()
+        new_id = conn.execute("INSERT INTO messages (client_email, subject, message) VALUES ('a@b.fr', 's', 'm')").lastrowid
+        assert new_id == 3
+    pool.close_all()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Automate d'Aho-Corasick des mots-clés"""
+
+from automation.keyword_classifier import KeywordAutomaton, normalize
+
+
+def test_overlapping_and_nested_keywords():
+    automaton = KeywordAutomaton(['he', 'she', 'his', 'hers'])
+
+    assert automaton.search('ushers') == {0, 1, 3}
+    assert automaton.search('ahishers') == {0, 1, 2, 3}
+    assert automaton.search('xyz') == set()
+
+
+def test_keywords_in_normalized_text():
+    keywords = ['colis', 'pas recu', 'rembourse', 'recu']
+    automaton = KeywordAutomaton(keywords)
+
+    found = automaton.search(normalize("Colis pas reçu, je veux être remboursé"))
+    assert {keywords[index] for index in found} == {'colis', 'pas recu', 'rembourse', 'recu'}
+
+
+def test_duplicate_keywords_share_an_index():
+    automaton = KeywordAutomaton(['retard', 'retard', 'tard'])
+
+    assert automaton.keywords == ['retard', 'tard']
+    assert automaton.search('en retard') == {0, 1}
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Classifieur local : entraînement, enregistrement puis prédiction après rechargement"""
+
+from automation.local_classifier import LocalClassifier, train
+
+EXAMPLES = {
+    ('retard_livraison', 4, 'negatif'): [
+        "Mon colis n'est toujours pas livré, la livraison a du retard",
+        "Colis en retard, toujours pas de livraison depuis dix jours",
+        "Livraison annoncée hier mais le colis n'est pas arrivé",
+    ],
+    ('remboursement', 2, 'neutre'): [
+        "Je souhaite être remboursé pour le pull retourné",
+        "Quand vais-je recevoir le remboursement de mon retour ?",
+        "Demande de remboursement après retour de l'article",
+    ],
+    ('produit_defectueux', 3, 'negatif'): [
+        "La cafetière est cassée, elle ne chauffe plus",
+        "Produit défectueux : l'écran est cassé à la réception",
+        "L'appareil ne fonctionne plus, il est défectueux",
+    ],
+}
+
+
+def training_rows(repeat=4):
+    return [
+        {'subject': '', 'message': text, 'category': category, 'urgency': urgency, 'sentiment': sentiment}
+        for (category, urgency, sentiment), texts in EXAMPLES.items()
+        for _ in range(repeat) for text in texts
+    ]
+
+
+def test_train_save_load_predict(tmp_path):
+    model = train(training_rows(), min_df=1, epochs=150, holdout=0.25)
+    assert model.meta['rows'] == 36
+    assert set(model.heads) == {'category', 'urgency', 'sentiment'}
+
+    path = str(tmp_path / 'local_classifier.npz')
+    model.save(path)
+    loaded = LocalClassifier.load(path)
+
+    prediction = loaded.predict("Le colis est en retard, livraison toujours pas arrivée")
+    assert prediction['category'] == 'retard_livraison'
+    assert prediction['urgency'] == 4
+    assert prediction['model'] == 'local'
+    assert prediction['confidence'] > 0.5
+    assert loaded.predict("remboursement du retour")['category'] == 'remboursement'
+    assert prediction == model.predict("Le colis est en retard, livraison toujours pas arrivée")
+
+
+def test_unknown_terms_have_no_confidence():
+    model = train(training_rows(), min_df=1, epochs=50, holdout=0)
+    prediction = model.predict("xyzzy")
+    assert prediction['confidence'] == 0.0
+    assert prediction['category'] == 'autre'
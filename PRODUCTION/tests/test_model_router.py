@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Routage entre modèles, et spéculation soumise au même routage"""
+
+from automation.claude_agent import ClaudeAgent
+from automation.model_router import FAST_TIER, LARGE_TIER, ModelRouter
+
+CALM = {'category': 'retard_livraison', 'urgency': 2, 'sentiment': 'neutre',
+        'requires_human': False, 'confidence': 0.9}
+URGENT = dict(CALM, urgency=5, sentiment='tres_negatif', requires_human=True)
+
+
+def router():
+    return ModelRouter('fast-model', 'large-model')
+
+
+def test_tiers():
+    model_router = router()
+
+    assert model_router.tier(CALM) == FAST_TIER
+    assert model_router.tier(URGENT) == LARGE_TIER
+    assert model_router.tier(dict(CALM, confidence=0.5)) == LARGE_TIER
+    assert model_router.tier(None) == LARGE_TIER
+    assert ModelRouter('fast-model', 'large-model', enabled=False).tier(CALM) == LARGE_TIER
+    # Classification sur le grand modèle (préfixe mis en cache) sauf choix explicite
+    assert model_router.classification_model == 'large-model'
+    assert ModelRouter('fast-model', 'large-model', 'other-model').classification_model == 'other-model'
+
+
+def speculating_agent(claude_classification):
+    """Agent dont les appels Claude sont remplacés : la réponse indique le modèle choisi"""
+    agent = ClaudeAgent(router=router())
+    generated = []
+
+    def generate_response(message, classification, customer_context=None, on_text=None, usage=None,
+                          should_stop=None):
+        model = agent.router.route(classification)
+        generated.append(model)
+        return f"réponse {model}"
+
+    agent._fallback_classification = lambda message: dict(CALM)
+    agent.classify_message = lambda message, subject="", customer_context=None, usage=None: dict(
+        claude_classification)
+    agent.generate_response = generate_response
+    return agent, generated
+
+
+def test_speculation_kept_when_claude_confirms_the_tier():
+    agent, generated = speculating_agent(dict(CALM, urgency=3))
+
+    classification, response = agent._speculative_call("Colis en retard", "", {}, None, agent._new_usage())
+
+    assert response == "réponse fast-model"
+    assert generated == ['fast-model']
+    assert agent.speculation_stats['hits'] == 1
+
+
+def test_speculation_regenerated_when_claude_needs_the_large_model():
+    agent, generated = speculating_agent(URGENT)
+
+    classification, response = agent._speculative_call("Colis en retard", "", {}, None, agent._new_usage())
+
+    assert classification['requires_human']
+    assert response == "réponse large-model"
+    assert generated == ['fast-model', 'large-model']
+    assert agent.speculation_stats['misses'] == 1
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Choix du mode de traitement Claude : deux appels par défaut, mode combiné sur demande"""
+
+import os
+import subprocess
+import sys
+
+from automation.claude_agent import ClaudeAgent, COMBINED_MODE, PROCESSING_MODES, TWO_STEP_MODE
+
+PRODUCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_mode(**env):
+    """Mode par défaut d'un nouveau processus (CLAUDE_PROCESSING_MODE lu à l'import)"""
+    environ = {key: value for key, value in os.environ.items() if key != 'CLAUDE_PROCESSING_MODE'}
+    environ.update(env)
+    return subprocess.run(
+        [sys.executable, '-c', 'from automation.claude_agent import ClaudeAgent; print(ClaudeAgent.resolve_mode())'],
+        cwd=PRODUCTION_DIR, env=environ, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+
+
+def test_two_step_is_the_default():
+    assert default_mode() == TWO_STEP_MODE
+    assert default_mode(CLAUDE_PROCESSING_MODE='combined') == COMBINED_MODE
+    assert default_mode(CLAUDE_PROCESSING_MODE='inconnu') == TWO_STEP_MODE
+
+
+def test_mode_selectable_per_request():
+    for mode in PROCESSING_MODES:
+        assert ClaudeAgent.resolve_mode(mode) == mode
+    assert ClaudeAgent.resolve_mode('inconnu') == ClaudeAgent.resolve_mode()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Prompt caching : préfixe système identique pour tous les messages, le message reste dans le tour user"""
+
+import pytest
+
+from automation import claude_agent
+from automation.claude_agent import ClaudeAgent
+
+CLASSIFICATION = {'category': 'retard_livraison', 'urgency': 3, 'sentiment': 'negatif',
+                  'key_elements': ['colis en retard'], 'requires_human': False, 'confidence': 0.9}
+REQUESTS = [
+    ("Mon colis n'est toujours pas arrivé", "Retard", {'client': {'prenom': 'Marie', 'type': 'premium'}}),
+    ("Je voudrais une facture pour ma commande", "Facture", None),
+]
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(claude_agent, 'PROMPT_CACHING', True)
+    return ClaudeAgent()
+
+
+def test_system_prefix_is_shared_and_cached(agent):
+    requests = []
+    for message, subject, context in REQUESTS:
+        requests += [agent._classification_request(message, subject, context),
+                     agent._response_request(message, CLASSIFICATION, context),
+                     agent._combined_request(message, subject, context)]
+
+    systems = [request['system'] for request in requests]
+    assert all(system == systems[0] for system in systems)
+    assert systems[0][-1]['cache_control'] == {'type': 'ephemeral'}
+
+    prefix = systems[0][-1]['text']
+    for message, subject, context in REQUESTS:
+        assert message not in prefix
+    assert 'Marie' not in prefix
+    for request, (message, _, _) in zip(requests, [r for r in REQUESTS for _ in range(3)]):
+        assert message in request['messages'][-1]['content']
+
+
+def test_prompt_caching_can_be_disabled(agent, monkeypatch):
+    monkeypatch.setattr(claude_agent, 'PROMPT_CACHING', False)
+    assert agent._system_prompt() == ClaudeAgent._system_prefix()
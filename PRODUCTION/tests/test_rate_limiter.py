@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Contrôle d'admission Claude : une admission par message, libérée une seule fois"""
+
+import threading
+
+from automation.job_queue import MessageJobQueue
+from automation.rate_limiter import ClaudeAdmissionController
+from database.connection_pool import SQLiteConnectionPool
+
+MESSAGES_TABLE = '''
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT DEFAULT 'nouveau',
+        processing_error TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def test_admission_is_released_once_per_message():
+    controller = ClaudeAdmissionController(max_inflight=1, max_queued=1)
+
+    assert controller.admit()[0]
+    controller.attach(1)
+    assert controller.admit()[0]
+    controller.attach(2)
+    assert not controller.admit()[0]
+
+    # Les tentatives successives d'un même message ne libèrent pas d'admission
+    for _ in range(3):
+        with controller.slot():
+            pass
+    assert controller.backlog == 2
+    assert not controller.admit()[0]
+
+    assert controller.release(1)
+    assert not controller.release(1)
+    assert controller.backlog == 1
+    assert controller.admit()[0]
+
+
+def test_cancel_and_unadmitted_release():
+    controller = ClaudeAdmissionController(max_inflight=1, max_queued=0)
+
+    assert controller.admit()[0]
+    controller.cancel()
+    assert controller.backlog == 0
+
+    # Message repris au démarrage, jamais admis
+    assert not controller.release(42)
+    assert controller.backlog == 0
+    assert controller.get_status()['released'] == 0
+
+
+def test_backlog_drains_after_success_failure_skip_and_cancel(tmp_path):
+    """Câblage de l'application : chaque issue d'un message admis libère son admission"""
+    controller = ClaudeAdmissionController(max_inflight=1, max_queued=3)
+    pool = SQLiteConnectionPool(str(tmp_path / 'messages.db'))
+    with pool.connection() as conn:
+        conn.execute(MESSAGES_TABLE)
+        ok, failing, done = (conn.execute("INSERT INTO messages (status) VALUES (?)", (status,)).lastrowid
+                             for status in ('nouveau', 'nouveau', 'traite'))
+
+    def handler(message_id, options):
+        with controller.slot():
+            if message_id == failing:
+                raise RuntimeError('API indisponible')
+        with pool.connection() as conn:
+            conn.execute("UPDATE messages SET status = 'traite' WHERE id = ?", (message_id,))
+        controller.release(message_id)
+
+    job_queue = MessageJobQueue(pool, handler, workers=1, max_retries=1,
+                                on_failure=lambda message_id, error: controller.release(message_id),
+                                on_skipped=controller.release)
+    job_queue._running = True
+    worker = threading.Thread(target=job_queue._worker_loop, daemon=True)
+    worker.start()
+
+    # Message déjà traité (doublon), message abandonné après ses tentatives, puis succès
+    for message_id in (done, failing, ok):
+        assert controller.admit()[0]
+        controller.attach(message_id)
+        job_queue.submit(message_id)
+    # Requête refusée après admission (validation, erreur d'insertion)
+    assert controller.admit()[0]
+    controller.cancel()
+
+    assert job_queue.wait_for(failing, 5)
+    assert job_queue.wait_for(ok, 5)
+    job_queue._queue.put(None)
+    worker.join(5)
+    pool.close_all()
+
+    assert job_queue.stats['failed'] == 1
+    assert controller.backlog == 0
+    assert controller.admit()[0]
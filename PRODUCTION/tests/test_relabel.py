@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Reclassification par lots : simulation par défaut, écriture seulement avec --apply"""
+
+import sys
+
+import pytest
+
+from automation import relabel
+from database.connection_pool import SQLiteConnectionPool
+
+MESSAGES = [
+    ("Colis non reçu", "Ma commande n'est toujours pas livrée, le colis est en retard", 'autre'),
+    ("Remboursement", "Je veux être remboursé, le produit est défectueux", 'autre'),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'crm.db')
+    pool = SQLiteConnectionPool(path)
+    with pool.connection() as conn:
+        conn.execute('''
+            CREATE TABLE messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subject TEXT, message TEXT, status TEXT DEFAULT 'traite',
+                category TEXT, urgency INTEGER, sentiment TEXT, classified_by TEXT,
+                updated_at DATETIME
+            )
+        ''')
+        conn.executemany('INSERT INTO messages (subject, message, category) VALUES (?, ?, ?)', MESSAGES)
+    pool.close_all()
+    return path
+
+
+def categories(db_path):
+    pool = SQLiteConnectionPool(db_path)
+    with pool.connection() as conn:
+        rows = [tuple(row) for row in conn.execute('SELECT category, classified_by FROM messages ORDER BY id')]
+    pool.close_all()
+    return rows
+
+
+class FixedClassifier:
+    name = 'local'
+    heads = ('category',)
+
+    def predict_batch(self, texts):
+        return [{'category': 'retard_livraison', 'confidence': 0.9} for _ in texts]
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['relabel.py', *args])
+    return relabel.main()
+
+
+def test_dry_run_counts_without_writing(db_path):
+    pool = SQLiteConnectionPool(db_path)
+    results = relabel.BatchRelabeler(pool, FixedClassifier()).relabel(['messages'], dry_run=True)
+    pool.close_all()
+
+    assert results['messages']['updated'] == 2
+    assert categories(db_path) == [('autre', None), ('autre', None)]
+
+
+def test_default_run_writes_nothing(db_path, monkeypatch):
+    assert run_main(monkeypatch, '--db', db_path, '--tables', 'messages', '--classifier', 'keywords') == 0
+    assert categories(db_path) == [('autre', None), ('autre', None)]
+
+    assert run_main(monkeypatch, '--db', db_path, '--tables', 'messages', '--classifier', 'keywords',
+                    '--min-confidence', '0', '--apply') == 0
+    assert ('autre', None) not in categories(db_path)
+
+
+def test_missing_local_model_is_an_error(db_path, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        relabel.load_batch_classifier('auto', str(tmp_path / 'absent.json'))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Disjoncteur : seules les pannes de l'API comptent ; délai total et SLO des flux"""
+
+import asyncio
+import threading
+import time
+
+import anthropic
+import httpx
+import pytest
+
+from automation.resilience import OPEN, ResilientCaller, StreamDeadlineError
+
+
+def api_error(status_code):
+    response = httpx.Response(status_code, request=httpx.Request('POST', 'https://api.anthropic.com/v1/messages'))
+    return anthropic.APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+def failing(error):
+    def create(**request):
+        raise error
+    return create
+
+
+class FakeStream:
+    """Flux du SDK : un fragment toutes les `delay` secondes, interrompu par close()"""
+
+    def __init__(self, fragments, delay):
+        self.closed = threading.Event()
+        self.delay = delay
+        self.text_stream = self._texts(fragments)
+
+    def _texts(self, fragments):
+        for fragment in fragments:
+            if self.closed.wait(self.delay):
+                raise httpx.ReadError("connexion fermée")
+            yield fragment
+
+    def close(self):
+        self.closed.set()
+
+    def get_final_message(self):
+        return 'message final'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncFakeStream:
+    def __init__(self, fragments, delay):
+        self.delay = delay
+        self.text_stream = self._texts(fragments)
+
+    async def _texts(self, fragments):
+        for fragment in fragments:
+            await asyncio.sleep(self.delay)
+            yield fragment
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def test_only_api_failures_open_the_breaker():
+    caller = ResilientCaller(failure_threshold=2)
+
+    for error in (api_error(400), ValueError("bug de l'appelant")):
+        for _ in range(3):
+            with pytest.raises(type(error)):
+                caller.call('classification', failing(error), {'model': 'm'})
+    assert caller.breaker.stats['failures'] == 0
+
+    for error in (api_error(529), anthropic.APIConnectionError(request=httpx.Request('POST', 'https://x'))):
+        with pytest.raises(type(error)):
+            caller.call('classification', failing(error), {'model': 'm'})
+    assert caller.breaker.stats['failures'] == 2
+    assert caller.breaker.state == OPEN
+
+
+def test_caller_error_inside_stream_is_not_an_outage():
+    caller = ResilientCaller(failure_threshold=1)
+
+    with pytest.raises(RuntimeError):
+        with caller.stream('response', lambda **request: FakeStream(['a', 'b'], 0), {'model': 'm'}) as stream:
+            for _ in stream.text_stream:
+                raise RuntimeError("erreur dans on_text")
+    assert caller.breaker.stats['failures'] == 0
+    assert caller.breaker.allow()
+
+
+def test_long_stream_is_judged_on_its_first_fragment():
+    caller = ResilientCaller(failure_threshold=1, slo_seconds=0.1, deadline_seconds=5)
+
+    with caller.stream('response', lambda **request: FakeStream(['x'] * 6, 0.03), {'model': 'm'}) as stream:
+        assert ''.join(stream.text_stream) == 'xxxxxx'
+        assert stream.get_final_message() == 'message final'
+
+    assert caller.breaker.stats['slo_violations'] == 0
+    assert caller.breaker.stats['successes'] == 1
+
+
+def test_stream_deadline_covers_the_whole_generation():
+    caller = ResilientCaller(deadline_seconds=0.2)
+
+    # Un fragment toutes les 0,1 s : le délai total est atteint avant la fin
+    started = time.monotonic()
+    with pytest.raises(StreamDeadlineError):
+        with caller.stream('response', lambda **request: FakeStream(['x'] * 10, 0.1), {'model': 'm'}) as stream:
+            list(stream.text_stream)
+    # Lecture bloquée : le flux est fermé au délai total
+    with pytest.raises(StreamDeadlineError):
+        with caller.stream('response', lambda **request: FakeStream(['x'], 10), {'model': 'm'}) as stream:
+            list(stream.text_stream)
+
+    assert time.monotonic() - started < 2
+    assert caller.breaker.stats['failures'] == 2
+
+
+def test_async_stream_deadline():
+    caller = ResilientCaller(deadline_seconds=0.2)
+
+    async def consume(delay):
+        async with caller.astream('response', lambda **request: AsyncFakeStream(['x'] * 3, delay),
+                                  {'model': 'm'}) as stream:
+            return [fragment async for fragment in stream.text_stream]
+
+    assert asyncio.run(consume(0.01)) == ['x'] * 3
+    with pytest.raises(StreamDeadlineError):
+        asyncio.run(consume(0.5))
+    assert caller.breaker.stats['failures'] == 1
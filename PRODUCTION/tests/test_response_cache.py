@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Cache des réponses : aucune donnée d'un client servie à un autre"""
+
+import re
+
+import pytest
+
+from database.connection_pool import SQLiteConnectionPool
+from database.response_cache import ResponseCache, normalize_text
+
+MESSAGE = "Bonjour, où en est ma commande ? Merci"
+
+
+def context(prenom, nom, order_id, date, quantity, product, amount):
+    return {
+        'client': {'email': f'{prenom.lower()}@exemple.fr', 'prenom': prenom, 'nom': nom,
+                   'date_creation': '2023-01-05 10:00:00'},
+        'nb_commandes': 1,
+        'total_depense': amount,
+        'commandes': [{'id': order_id, 'date': date, 'statut': 'expediee', 'montant': amount,
+                       'produits': [{'id': 1, 'nom': product, 'prix': amount, 'quantite': quantity}]}]
+    }
+
+
+CLIENT_A = context('Marc', 'Durand', 'CMD-20240312101010-01', '2024-03-12 10:10:10', 3, 'Lampe Orion', 89.9)
+CLIENT_B = context('Li', 'Wu', 'CMD-20240415090000-02', '2024-04-15 09:00:00', 1, 'Pull laine', 45.0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'cache.db'))
+    cache = ResponseCache(pool)
+    cache.ensure_table()
+    yield cache
+    pool.close_all()
+
+
+def values_of(customer_context):
+    """Valeurs du contexte reconnaissables dans un texte normalisé"""
+    client, order = customer_context['client'], customer_context['commandes'][0]
+    product = order['produits'][0]
+    return [client['prenom'], client['nom'], client['email'], order['id'], '12/03', '12 mars',
+            f"{product['quantite']} articles", product['nom'], '89,90']
+
+
+def test_reply_with_customer_details_is_never_served_to_another_client(cache):
+    reply = ("Bonjour Marc Durand, votre commande CMD-20240312101010-01 du 12/03 (3 articles, "
+             "Lampe Orion) de 89,90 € est expédiée, livraison prévue le 14 mars.")
+
+    assert not cache.put_response(MESSAGE, 'information_commande', CLIENT_A, reply)
+    served = cache.get_response(MESSAGE, 'information_commande', CLIENT_B)
+
+    assert served is None or not any(
+        re.search(r'(?<!\w)' + re.escape(normalize_text(value)) + r'(?!\w)', normalize_text(served))
+        for value in values_of(CLIENT_A))
+
+
+def test_templated_reply_is_personalized_for_each_client(cache):
+    reply = ("Bonjour Marc, votre commande CMD-20240312101010-01 de 89,90 € est expédiée. "
+             "Vous recevrez un email de suivi.")
+
+    assert cache.put_response(MESSAGE, 'information_commande', CLIENT_A, reply)
+    served = cache.get_response(MESSAGE, 'information_commande', CLIENT_B)
+
+    assert served == ("Bonjour Li, votre commande CMD-20240415090000-02 de 45,00 € est expédiée. "
+                      "Vous recevrez un email de suivi.")
+    for value in ('Marc', 'CMD-20240312101010-01', '89,90'):
+        assert value not in served
+
+
+def test_numbers_from_the_message_are_shared(cache):
+    message = "Mon colis de 3 articles n'est pas arrivé"
+    reply = "Nous vérifions l'envoi de vos 3 articles auprès du transporteur."
+
+    assert cache.put_response(message, 'retard_livraison', CLIENT_A, reply)
+    assert cache.get_response(message, 'retard_livraison', CLIENT_B) == reply
+
+
+def test_classification_key_elements_stay_private(cache):
+    classification = {'category': 'information_commande', 'urgency': 2, 'sentiment': 'neutre',
+                      'key_elements': ['Lampe Orion', 'commande du 12/03'], 'confidence': 0.9}
+
+    assert not cache.put_classification(MESSAGE, 'Suivi', CLIENT_A, classification)
+    assert cache.get_classification(MESSAGE, 'Suivi', CLIENT_B) is None
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""Lecture du JSON des réponses texte de Claude"""
+
+from automation.structured_output import extract_json_object
+
+
+def test_object_inside_text_or_code_block():
+    assert extract_json_object('Voici : {"category": "autre", "urgency": 1} Merci.') == \
+        {'category': 'autre', 'urgency': 1}
+    assert extract_json_object('```json\n{"a": {"b": "}"}}\n```') == {'a': {'b': '}'}}
+
+
+def test_trailing_commas_and_invalid_candidates():
+    assert extract_json_object('{"key_elements": ["colis", "retard",], "urgency": 3,}') == \
+        {'key_elements': ['colis', 'retard'], 'urgency': 3}
+    # Accolades sans JSON avant l'objet : le candidat suivant est essayé
+    assert extract_json_object('{pas du json} puis {"ok": true}') == {'ok': True}
+
+
+def test_no_object():
+    assert extract_json_object('') is None
+    assert extract_json_object('Aucune classification') is None
+    assert extract_json_object('[1, 2]') is None
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests du budget de tokens : relèvement après troncature, plafond maximum et redescente"""
+
+from automation.token_budget import DEFAULT_BUDGETS, RESPONSE_CALL, TokenBudgeter
+
+
+def test_truncation_raises_then_caps_at_ceiling():
+    budgeter = TokenBudgeter(min_samples=5)
+    ceiling = DEFAULT_BUDGETS[RESPONSE_CALL]['ceiling']
+    limit = budgeter.max_tokens(RESPONSE_CALL, "retour_produit", 2)
+    assert limit == DEFAULT_BUDGETS[RESPONSE_CALL]['initial']
+
+    budgeter.record(RESPONSE_CALL, "retour_produit", 2, limit, max_tokens=limit, stop_reason='max_tokens')
+    raised = budgeter.max_tokens(RESPONSE_CALL, "retour_produit", 2)
+    assert raised == 1350
+
+    for _ in range(5):
+        budgeter.record(RESPONSE_CALL, "retour_produit", 2, ceiling, max_tokens=ceiling, stop_reason='max_tokens')
+    assert budgeter.max_tokens(RESPONSE_CALL, "retour_produit", 2) == ceiling
+    assert budgeter.stats['truncated'] == 6
+
+
+def test_raised_ceiling_decays_back_to_percentile():
+    budgeter = TokenBudgeter(min_samples=5)
+    budgeter.record(RESPONSE_CALL, "retour_produit", 2, 3000, max_tokens=3000, stop_reason='max_tokens')
+    assert budgeter.max_tokens(RESPONSE_CALL, "retour_produit", 2) == 3000
+
+    for _ in range(30):
+        budgeter.record(RESPONSE_CALL, "retour_produit", 2, 400)
+
+    # p99 de 400 tokens avec 20 % de marge
+    assert budgeter.max_tokens(RESPONSE_CALL, "retour_produit", 2) == 480
+
+
+def test_decay_keeps_room_for_observed_output():
+    budgeter = TokenBudgeter(min_samples=50)
+    budgeter.record(RESPONSE_CALL, "retour_produit", 2, 2000, max_tokens=2000, stop_reason='max_tokens')
+    for _ in range(40):
+        budgeter.record(RESPONSE_CALL, "retour_produit", 2, 2000)
+
+    # Sorties complètes proches du plafond relevé : il ne redescend pas sous sortie + marge
+    assert budgeter.max_tokens(RESPONSE_CALL, "retour_produit", 2) == 2400
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Canaux de streaming : relecture depuis le début par les abonnés tardifs, sync et async"""
+
+import asyncio
+import threading
+
+from automation.token_stream import DONE, RESET, TOKEN, TokenStreamHub, sse_event
+
+
+def test_late_subscriber_replays_channel():
+    hub = TokenStreamHub()
+    hub.open('T1')
+    hub.publish('T1', 'Bonjour')
+    hub.reset('T1')
+    hub.publish('T1', 'Bonjour Marie')
+    hub.close('T1', {'status': 'traite'})
+    hub.publish('T1', 'ignoré')
+
+    assert list(hub.subscribe('T1', timeout=1)) == [
+        (TOKEN, 'Bonjour'), (RESET, None), (TOKEN, 'Bonjour Marie'), (DONE, {'status': 'traite'})
+    ]
+    assert list(hub.subscribe('inconnu', timeout=1)) == []
+    status = hub.get_status()
+    assert status['tokens'] == 2
+    assert status['active'] == 0
+
+
+def test_subscribers_receive_events_published_from_worker():
+    hub = TokenStreamHub()
+    hub.open('T2')
+
+    def worker():
+        for text in ('Votre ', 'commande'):
+            hub.publish('T2', text)
+        hub.close('T2', {'status': 'traite'})
+
+    async def collect():
+        events = []
+        async for event in hub.asubscribe('T2', timeout=5):
+            events.append(event)
+        return events
+
+    publisher = threading.Timer(0.05, worker)
+    publisher.start()
+    events = asyncio.run(collect())
+    publisher.join()
+
+    assert events == list(hub.subscribe('T2', timeout=1))
+    assert events[-1] == (DONE, {'status': 'traite'})
+    assert sse_event(TOKEN, 'é') == 'event: token\ndata: {"text": "é"}\n\n'
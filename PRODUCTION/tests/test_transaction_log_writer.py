@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Writer des logs de transactions : écriture par lots et vidage complet à l'arrêt"""
+
+from database.connection_pool import SQLiteConnectionPool
+from database.transaction_log_writer import TransactionLogWriter
+
+
+def logged_rows(pool):
+    with pool.connection() as conn:
+        return [tuple(row) for row in conn.execute('SELECT email, action, status, details FROM transaction_logs ORDER BY id')]
+
+
+def test_close_flushes_pending_events(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'logs.db'))
+    writer = TransactionLogWriter(pool, flush_interval_ms=200, batch_size=100)
+    writer.ensure_table()
+    writer.start()
+
+    for index in range(250):
+        assert writer.log(f'client{index}@exemple.fr', 'login', 'success', {'attempt': index} if index == 0 else None)
+    writer.close()
+
+    rows = logged_rows(pool)
+    assert len(rows) == 250
+    assert rows[0] == ('client0@exemple.fr', 'login', 'success', '{"attempt": 0}')
+    status = writer.get_status()
+    assert status['written'] == 250
+    assert status['queued'] == 0
+    assert status['flushes'] >= 3
+    pool.close_all()
+
+
+def test_close_without_thread_drains_queue(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'logs.db'))
+    writer = TransactionLogWriter(pool, batch_size=2, max_queue=3)
+    writer.ensure_table()
+
+    results = [writer.log('a@b.fr', 'verify', 'failed') for _ in range(4)]
+    assert results == [True, True, True, False]
+    writer.close()
+
+    assert len(logged_rows(pool)) == 3
+    assert writer.get_status()['dropped'] == 1
+    pool.close_all()
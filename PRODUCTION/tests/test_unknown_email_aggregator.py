@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Agrégation des emails inconnus : compteurs fusionnés par upsert"""
+
+from database.connection_pool import SQLiteConnectionPool
+from database.unknown_email_aggregator import UnknownEmailAggregator
+
+
+def attempts(pool):
+    with pool.connection() as conn:
+        return {row['email']: (row['attempt_count'], row['action_type'])
+                for row in conn.execute('SELECT email, attempt_count, action_type FROM unknown_emails')}
+
+
+def test_flush_upserts_attempt_counts(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'unknown.db'))
+    aggregator = UnknownEmailAggregator(pool)
+    aggregator.ensure_table()
+
+    for _ in range(3):
+        aggregator.record('inconnu@exemple.fr')
+    aggregator.record('autre@exemple.fr')
+    assert aggregator.flush() == 2
+    assert attempts(pool) == {'inconnu@exemple.fr': (3, 'TENTATIVE_ACCES'), 'autre@exemple.fr': (1, 'TENTATIVE_ACCES')}
+
+    # Les tentatives suivantes s'ajoutent à la ligne existante
+    aggregator.record('inconnu@exemple.fr', 'VERIFICATION')
+    aggregator.record('inconnu@exemple.fr', 'VERIFICATION')
+    aggregator.close()
+    assert attempts(pool)['inconnu@exemple.fr'] == (5, 'VERIFICATION')
+
+    status = aggregator.get_status()
+    assert status['flushed_attempts'] == 6
+    assert status['pending_emails'] == 0
+    pool.close_all()
+
+
+def test_distinct_email_limit_drops_new_addresses(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'unknown.db'))
+    aggregator = UnknownEmailAggregator(pool, max_emails=1)
+    aggregator.ensure_table()
+
+    assert aggregator.record('a@exemple.fr')
+    assert aggregator.record('a@exemple.fr')
+    assert not aggregator.record('b@exemple.fr')
+    aggregator.close()
+
+    assert attempts(pool) == {'a@exemple.fr': (2, 'TENTATIVE_ACCES')}
+    assert aggregator.get_status()['dropped'] == 1
+    pool.close_all()
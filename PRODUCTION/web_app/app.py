@@ -5,17 +5,20 @@ Application Web Moderne - Support Client E-commerce
 Interface web avec Flask, Bootstrap 5 et API REST
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 import sys
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
 import json
 from dotenv import load_dotenv
 import pytz
 import uuid
-import sqlite3
+import re
 import time
+import math
+import atexit
+from contextlib import contextmanager
 
 # Charger les variables d'environnement depuis .env
 load_dotenv()
@@ -23,6 +26,19 @@ load_dotenv()
 # Ajouter le répertoire parent au path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config import NOTION_CONFIG, WORKER_CONFIG, DB_POOL_CONFIG, LOG_WRITER_CONFIG, UNKNOWN_EMAIL_CONFIG, RATE_LIMIT_CONFIG, STREAM_CONFIG, CONTEXT_CACHE_CONFIG, RESPONSE_CACHE_CONFIG, BURST_CONFIG, TOKEN_BUDGET_CONFIG, RESILIENCE_CONFIG, ROUTING_CONFIG, LOCAL_CLASSIFIER_CONFIG
+from database.connection_pool import SQLiteConnectionPool
+from database.transaction_log_writer import TransactionLogWriter
+from database.unknown_email_aggregator import UnknownEmailAggregator
+from database.client_context_cache import ClientContextCache, read_client_context, read_client_orders
+from database.response_cache import ResponseCache
+from automation.reveal_scheduler import DelayedRevealScheduler
+from automation.rate_limiter import TokenBucketLimiter, ClaudeAdmissionController
+from automation.token_stream import TokenStreamHub, sse_event
+from automation.burst_detector import BurstDetector
+from automation.keyword_classifier import get_keyword_classifier, TEMPLATE_CATEGORIES
+from automation.entity_extractor import EntityExtractor, load_product_catalog
+
 # Configuration Flask
 app = Flask(__name__)
 app.secret_key = 'support_client_secret_key_2025'
@@ -41,117 +57,511 @@ db_manager = None
 notion_manager = None
 support_agent = None
 claude_agent = None
+job_queue = None
+reveal_scheduler = DelayedRevealScheduler()
+
+# Fragments de réponse Claude diffusés en SSE, par ticket
+token_stream = TokenStreamHub(retention_seconds=STREAM_CONFIG['retention_seconds'])
+
+# Limites par expéditeur et plafond global d'appels Claude
+sender_limiter = TokenBucketLimiter(
+    RATE_LIMIT_CONFIG['sender_rate_per_minute'],
+    RATE_LIMIT_CONFIG['sender_burst']
+)
+claude_admission = ClaudeAdmissionController(
+    RATE_LIMIT_CONFIG['max_inflight_claude'],
+    RATE_LIMIT_CONFIG['max_queued_messages']
+)
+
+# Chemin absolu de la base partagée avec l'interface admin
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crm_ecommerce.db')
+
+# Pool de connexions : une connexion réutilisable par thread
+db_pool = SQLiteConnectionPool(
+    DB_PATH,
+    pragmas={
+        'busy_timeout': DB_POOL_CONFIG['busy_timeout_ms'],
+        'mmap_size': DB_POOL_CONFIG['mmap_size']
+    },
+    max_connections=DB_POOL_CONFIG['max_connections']
+)
+
+# Logs de transactions écrits par lots en arrière-plan
+transaction_log_writer = TransactionLogWriter(
+    db_pool,
+    flush_interval_ms=LOG_WRITER_CONFIG['flush_interval_ms'],
+    batch_size=LOG_WRITER_CONFIG['batch_size'],
+    max_queue=LOG_WRITER_CONFIG['max_queue']
+)
+
+# Tentatives d'emails inconnus agrégées en mémoire puis fusionnées périodiquement
+unknown_email_aggregator = UnknownEmailAggregator(
+    db_pool,
+    flush_interval_seconds=UNKNOWN_EMAIL_CONFIG['flush_interval_seconds'],
+    max_emails=UNKNOWN_EMAIL_CONFIG['max_emails']
+)
+
+# Classifications et réponses Claude réutilisées pour les messages répétitifs
+response_cache = ResponseCache(
+    db_pool,
+    ttl_seconds=RESPONSE_CACHE_CONFIG['ttl_seconds'],
+    max_entries=RESPONSE_CACHE_CONFIG['max_entries'],
+    flush_interval_seconds=RESPONSE_CACHE_CONFIG['flush_interval_seconds']
+) if RESPONSE_CACHE_CONFIG['enabled'] else None
+
+# Rafales de messages quasi identiques : une classification par cluster
+burst_detector = BurstDetector(
+    db_pool,
+    threshold=BURST_CONFIG['threshold'],
+    window_seconds=BURST_CONFIG['window_seconds'],
+    min_burst_size=BURST_CONFIG['min_burst_size']
+)
+
+# Numéros de commande, montants, dates et produits cités (catalogue chargé à l'initialisation)
+entity_extractor = EntityExtractor()
 
 def get_db_connection():
-    """Crée une connexion à la base de données."""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crm_ecommerce.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Retourne la connexion poolée du thread courant (ne pas la fermer)."""
+    return db_pool.get_connection()
 
 def init_messages_table():
     """Initialise la table des messages avec statuts"""
     try:
-        import sqlite3
-        import os
-        
-        # Chemin absolu cohérent
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crm_ecommerce.db')
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Table messages avec statuts
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_email TEXT NOT NULL,
-                client_name TEXT,
-                subject TEXT NOT NULL,
-                message TEXT NOT NULL,
-                status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme')),
-                category TEXT,
-                urgency INTEGER DEFAULT 1,
-                sentiment TEXT,
-                response TEXT,
-                response_time REAL DEFAULT 0,
-                quality_score REAL DEFAULT 0,
-                ticket_id TEXT UNIQUE,
-                model_used TEXT DEFAULT 'claude-4-sonnet',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                processed_at DATETIME
-            )
-        ''')
+        with db_pool.connection() as conn:
+            # Table messages avec statuts
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    client_email TEXT NOT NULL,
+                    client_name TEXT,
+                    subject TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    status TEXT DEFAULT 'nouveau' CHECK (status IN ('nouveau', 'en_cours', 'traite', 'ferme', 'erreur')),
+                    category TEXT,
+                    urgency INTEGER DEFAULT 1,
+                    sentiment TEXT,
+                    response TEXT,
+                    response_time REAL DEFAULT 0,
+                    quality_score REAL DEFAULT 0,
+                    ticket_id TEXT UNIQUE,
+                    model_used TEXT DEFAULT 'claude-4-sonnet',
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    processed_at DATETIME
+                )
+            ''')
+            
+            # Colonnes ajoutées après la création initiale de la table
+            added_columns = {
+                'processing_mode': 'TEXT',   # Mode de traitement Claude demandé (NULL : mode par défaut)
+                'cluster_id': 'INTEGER',     # Rafale de messages similaires (table message_clusters)
+                'batch_id': 'TEXT',          # Lot de la Message Batches API (automation/batch_processor.py)
+                'classified_by': 'TEXT',     # Origine de la classification (modèle Claude, local, cache...)
+                'processing_error': 'TEXT'   # Dernière erreur d'un message abandonné (statut 'erreur')
+            }
+            migrate_messages_status(conn)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+            for name, sql_type in added_columns.items():
+                if name not in columns:
+                    conn.execute(f'ALTER TABLE messages ADD COLUMN {name} {sql_type}')
+            
+            burst_detector.ensure_table()
         
-        conn.commit()
-        conn.close()
         print("✅ Table messages initialisée")
     except Exception as e:
         print(f"❌ Erreur init messages: {e}")
 
-def create_message_record(email, subject, message, client_name=None):
+def migrate_messages_status(conn):
+    """
+    Ajoute le statut terminal 'erreur' à la contrainte CHECK d'une table messages
+    créée avant lui. SQLite ne modifie pas une contrainte existante : la table est
+    recréée, recopiée puis renommée dans une transaction (index et triggers recréés).
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'").fetchone()
+    if not row or "'erreur'" in row[0]:
+        return False
+
+    table_sql = re.sub(r'^CREATE TABLE\s+"?messages"?', 'CREATE TABLE messages_migration', row[0])
+    table_sql = table_sql.replace("'traite', 'ferme')", "'traite', 'ferme', 'erreur')", 1)
+    if "'erreur'" not in table_sql:
+        print("⚠️ Contrainte de statut de la table messages non reconnue, migration ignorée")
+        return False
+
+    schema = [r[0] for r in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'messages' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    )]
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'messages'").fetchone()
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+
+    # Les clés étrangères ne peuvent être désactivées qu'en dehors d'une transaction
+    conn.commit()
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        conn.executescript(';\n'.join([
+            'BEGIN IMMEDIATE',
+            table_sql,
+            'INSERT INTO messages_migration SELECT * FROM messages',
+            'DROP TABLE messages',
+            'ALTER TABLE messages_migration RENAME TO messages',
+            *schema,
+            f"UPDATE sqlite_sequence SET seq = MAX(seq, {int(sequence[0]) if sequence else 0}) WHERE name = 'messages'",
+            'COMMIT'
+        ]))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f'PRAGMA foreign_keys = {int(foreign_keys)}')
+
+    print("✅ Table messages migrée (statut 'erreur')")
+    return True
+
+def create_message_record(email, subject, message, client_name=None, processing_mode=None):
     """Crée un enregistrement de message"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         timestamp = datetime.now(PARIS_TZ).strftime('%Y%m%d%H%M%S')
-        ticket_id = f"MSG-{timestamp}-{len(message) % 1000:03d}"
+        # Suffixe aléatoire : plusieurs messages peuvent être créés dans la même seconde
+        ticket_id = f"MSG-{timestamp}-{uuid.uuid4().hex[:6].upper()}"
         
-        cursor.execute('''
-            INSERT INTO messages (client_email, client_name, subject, message, status, ticket_id, created_at)
-            VALUES (?, ?, ?, ?, 'nouveau', ?, ?)
-        ''', (email, client_name, subject, message, ticket_id, datetime.now(PARIS_TZ)))
-        
-        message_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO messages (client_email, client_name, subject, message, status, ticket_id,
+                                      processing_mode, created_at)
+                VALUES (?, ?, ?, ?, 'nouveau', ?, ?, ?)
+            ''', (email, client_name, subject, message, ticket_id, processing_mode, datetime.now(PARIS_TZ)))
+            message_id = cursor.lastrowid
+            
+            # Rattacher le message à une éventuelle rafale de messages similaires
+            burst_detector.add(message_id, f"{subject}\n{message}")
         
         return message_id, ticket_id
     except Exception as e:
         print(f"❌ Erreur création message: {e}")
         return None, None
 
-def update_message_processing(message_id, result, processing_time):
-    """Met à jour le message avec les résultats du traitement"""
+def update_message_processing(message_id, result, processing_time, processed_at=None):
+    """
+    Met à jour le message avec les résultats du traitement
+    (processed_at futur : réponse masquée au suivi de ticket jusqu'à cette date)
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE messages SET
-                status = 'traite',
-                category = ?,
-                urgency = ?,
-                sentiment = ?,
-                response = ?,
-                response_time = ?,
-                quality_score = ?,
-                model_used = ?,
-                processed_at = ?,
-                updated_at = ?
-            WHERE id = ?
-        ''', (
-            result.get('category'),
-            result.get('urgency'),
-            result.get('sentiment'),
-            result.get('response'),
-            processing_time,
-            result.get('quality_score', 0),
-            result.get('model', 'claude-4-sonnet'),
-            datetime.now(PARIS_TZ),
-            datetime.now(PARIS_TZ),
-            message_id
-        ))
+        with db_pool.connection() as conn:
+            conn.execute('''
+                UPDATE messages SET
+                    status = 'traite',
+                    category = ?,
+                    urgency = ?,
+                    sentiment = ?,
+                    response = ?,
+                    response_time = ?,
+                    quality_score = ?,
+                    model_used = ?,
+                    classified_by = ?,
+                    processed_at = ?,
+                    updated_at = ?
+                WHERE id = ?
+            ''', (
+                result.get('category'),
+                result.get('urgency'),
+                result.get('sentiment'),
+                result.get('response'),
+                processing_time,
+                result.get('quality_score', 0),
+                result.get('model'),
+                result.get('classified_by'),
+                processed_at or datetime.now(PARIS_TZ),
+                datetime.now(PARIS_TZ),
+                message_id
+            ))
         
-        conn.commit()
-        conn.close()
         return True
-    except Exception as     e:
+    except Exception as e:
         print(f"❌ Erreur mise à jour message: {e}")
         return False
 
+def get_message_by_ticket(ticket_id):
+    """Récupère un message par son ticket_id"""
+    try:
+        with db_pool.connection() as conn:
+            row = conn.execute('SELECT * FROM messages WHERE ticket_id = ?', (ticket_id,)).fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"❌ Erreur lecture ticket: {e}")
+        return None
+
+def process_queued_message(message_id, options):
+    """Traite un message de la file avec Claude (exécuté par un worker)"""
+    with db_pool.connection() as conn:
+        row = conn.execute('SELECT * FROM messages WHERE id = ?', (message_id,)).fetchone()
+
+    if not row:
+        raise ValueError(f"Message {message_id} introuvable")
+    if not claude_agent:
+        raise RuntimeError("ClaudeAgent non disponible")
+
+    email = row['client_email']
+    ticket_id = row['ticket_id']
+
+    # Enrichissement du contexte (commandes citées dans le message)
+    client_context = get_client_context(email, row['message'])
+
+    # Diffuser la réponse en streaming si un client peut s'y abonner
+    on_text = (lambda text: token_stream.publish(ticket_id, text)) if token_stream.has(ticket_id) else None
+
+    # Mesurer le temps de traitement réel (dans la limite des appels Claude simultanés)
+    try:
+        with claude_admission.slot():
+            start_time = time.time()
+            result = claude_agent.process_customer_message(email, row['message'], row['subject'],
+                                                           context=client_context, on_text=on_text,
+                                                           mode=row['processing_mode'],
+                                                           classification=burst_detector.classification_for(message_id))
+            processing_duration = time.time() - start_time
+
+        if result.get('error'):
+            raise RuntimeError(result['error'])
+    except Exception:
+        # Le texte déjà diffusé sera régénéré par la prochaine tentative
+        token_stream.reset(ticket_id)
+        raise
+
+    return complete_message_processing(message_id, email, ticket_id, result, processing_duration)
+
+def complete_message_processing(message_id, email, ticket_id, result, processing_duration):
+    """Enregistre le résultat d'un traitement Claude (workers et serveur ASGI)"""
+    # Mettre à jour l'enregistrement du message
+    if not update_message_processing(message_id, result, processing_duration):
+        raise RuntimeError(f"Mise à jour du message {message_id} impossible")
+    claude_admission.release(message_id)
+    
+    # Classification réutilisable par les autres messages de la même rafale
+    burst_detector.record_classification(message_id, result)
+
+    # Log pour le monitoring administrateur en console
+    try:
+        print(f"📊 [MONITORING] Échange traité:")
+        print(f"   📧 Email: {email}")
+        print(f"   🏷️  Catégorie: {result.get('category', 'N/A')}")
+        print(f"   🎯 Urgence: {result.get('urgency', 'N/A')}/5")
+        print(f"   😊 Sentiment: {result.get('sentiment', 'N/A')}")
+        print(f"   📊 Qualité: {result.get('quality_score', 0):.2f}")
+        print(f"   ⏱️  Temps total: {processing_duration:.2f}s")
+        print(f"   🎫 Ticket: {ticket_id}")
+        print("=" * 50)
+    except Exception as log_error:
+        print(f"⚠️ Erreur logging monitoring: {log_error}")
+
+    # Logger le traitement réussi
+    log_transaction(email, "MESSAGE_TRAITE", "SUCCES", {
+        'ticket_id': ticket_id,
+        'message_id': message_id,
+        'category': result.get('category'),
+        'urgency': result.get('urgency'),
+        'sentiment': result.get('sentiment'),
+        'quality_score': result.get('quality_score'),
+        'processing_time': processing_duration,
+        'model': result.get('model'),
+        'processing_mode': result.get('processing_mode'),
+        'usage': result.get('usage'),
+        'response_length': len(result.get('response', ''))
+    })
+
+    # Terminer le flux SSE avec le résultat enregistré
+    if token_stream.has(ticket_id):
+        token_stream.close(ticket_id, ticket_result_payload(get_message_by_ticket(ticket_id)))
+    return result
+
+def fail_message_processing(message_id, error):
+    """Message abandonné après sa dernière tentative (statut 'erreur', appelé par la file)"""
+    claude_admission.release(message_id)
+    with db_pool.connection() as conn:
+        row = conn.execute('SELECT client_email, ticket_id FROM messages WHERE id = ?', (message_id,)).fetchone()
+    if not row:
+        return
+
+    log_transaction(row['client_email'], "MESSAGE_ECHEC", "ECHEC", {
+        'ticket_id': row['ticket_id'],
+        'message_id': message_id,
+        'error': error
+    })
+
+    # Terminer le flux SSE : le client cesse d'attendre une réponse
+    if token_stream.has(row['ticket_id']):
+        token_stream.close(row['ticket_id'], ticket_status_payload(row['ticket_id'])[0])
+
+def start_job_queue():
+    """Démarre les workers de traitement des messages"""
+    global job_queue
+
+    if job_queue:
+        return job_queue
+
+    from automation.job_queue import MessageJobQueue
+    job_queue = MessageJobQueue(
+        db_pool,
+        process_queued_message,
+        workers=WORKER_CONFIG['workers'],
+        max_retries=WORKER_CONFIG['max_retries'],
+        lease_seconds=WORKER_CONFIG['lease_seconds'],
+        on_failure=fail_message_processing,
+        # Message déjà traité ou réclamé ailleurs (traitement par lots) : il ne passera plus par ce processus
+        on_skipped=claude_admission.release
+    )
+    job_queue.start()
+    atexit.register(job_queue.stop)
+    return job_queue
+
+def start_client_context_cache():
+    """Prépare la table des invalidations du cache de contexte client"""
+    try:
+        client_context_cache.ensure_table()
+        print("✅ Cache de contexte client prêt")
+    except Exception as e:
+        print(f"❌ Erreur init cache contexte client: {e}")
+
+def start_entity_extractor():
+    """Charge le catalogue produits dans l'extracteur d'entités"""
+    try:
+        with db_pool.connection() as conn:
+            entity_extractor.load_products(load_product_catalog(conn))
+        print(f"✅ Extracteur d'entités prêt ({entity_extractor.product_count} produits)")
+    except Exception as e:
+        print(f"❌ Erreur chargement catalogue produits: {e}")
+
+def start_response_cache():
+    """Prépare les tables du cache de réponses Claude"""
+    if not response_cache:
+        return
+    try:
+        response_cache.ensure_table()
+        response_cache.start()
+        atexit.register(response_cache.close)
+        print("✅ Cache de réponses Claude prêt")
+    except Exception as e:
+        print(f"❌ Erreur init cache de réponses: {e}")
+
+def load_local_classifier():
+    """Classifieur local entraîné (python automation/local_classifier.py train), None si absent"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        LOCAL_CLASSIFIER_CONFIG['model_path'])
+    if not os.path.exists(path):
+        print("⚠️ Classifieur local non entraîné (python automation/local_classifier.py train)")
+        return None
+    try:
+        from automation.local_classifier import LocalClassifier
+        classifier = LocalClassifier.load(path)
+        print(f"✅ Classifieur local chargé ({len(classifier.vocabulary)} termes, "
+              f"seuil {LOCAL_CLASSIFIER_CONFIG['threshold']})")
+        return classifier
+    except Exception as e:
+        # numpy absent ou fichier illisible : toutes les classifications passent par Claude
+        print(f"⚠️ Classifieur local non disponible: {e}")
+        return None
+
+def start_transaction_log_writer():
+    """Crée la table transaction_logs et démarre l'écriture groupée des logs"""
+    try:
+        transaction_log_writer.ensure_table()
+        transaction_log_writer.start()
+        atexit.register(transaction_log_writer.close)
+        print("✅ Writer de logs de transactions démarré")
+    except Exception as e:
+        print(f"❌ Erreur init logs transactions: {e}")
+
+def start_unknown_email_aggregator():
+    """Crée la table unknown_emails et démarre la fusion périodique des tentatives"""
+    try:
+        unknown_email_aggregator.ensure_table()
+        unknown_email_aggregator.start()
+        atexit.register(unknown_email_aggregator.close)
+        print("✅ Agrégateur d'emails inconnus démarré")
+    except Exception as e:
+        print(f"❌ Erreur init emails inconnus: {e}")
+
+def rate_limited_response(email, error, retry_after):
+    """Réponse HTTP 429 avec en-tête Retry-After (payload, code, en-têtes)"""
+    retry_after = max(1, int(math.ceil(retry_after)))
+    log_transaction(email, "LIMITE_DEPASSEE", "ECHEC", {
+        'reason': error,
+        'retry_after': retry_after
+    })
+    
+    return {
+        'success': False,
+        'error': error,
+        'retry_after': retry_after
+    }, 429, {'Retry-After': str(retry_after)}
+
+def schedule_reveal(ticket_id, message_id, payload, delay):
+    """
+    Enregistre une réponse déjà calculée (agent legacy, simulation) et retourne le ticket (HTTP 202).
+    Le message passe tout de suite à 'traite' : ni la file ni le traitement par lots ne le
+    reprennent. Sa date de révélation (processed_at) le masque au suivi de ticket jusque-là,
+    y compris après un redémarrage ou depuis un autre processus.
+    """
+    reveal_at = datetime.now(PARIS_TZ) + timedelta(seconds=delay)
+    result = payload['result']
+    update_message_processing(message_id, {
+        'category': result.get('category') or result.get('categorie'),
+        'response': result.get('response') or result.get('reponse'),
+        'quality_score': result.get('quality_score', 0),
+        'model': payload['mode'],
+        'classified_by': 'keywords'
+    }, delay, processed_at=reveal_at)
+
+    payload.update({
+        'status': 'traite',
+        'ticket_id': ticket_id,
+        'message_id': message_id,
+        'processed_at': reveal_at.isoformat()
+    })
+    reveal_scheduler.schedule(ticket_id, payload, delay)
+
+    return {
+        'success': True,
+        'status': 'en_cours',
+        'ticket_id': ticket_id,
+        'message_id': message_id,
+        'poll_url': f'/api/tickets/{ticket_id}',
+        'reveal_in': delay,
+        'mode': payload.get('mode')
+    }, 202
+
+def reveal_remaining(message_row):
+    """Secondes avant la révélation d'une réponse enregistrée par schedule_reveal (0 si révélée)"""
+    try:
+        reveal_at = datetime.fromisoformat(str(message_row['processed_at']))
+    except (TypeError, ValueError):
+        return 0
+    if reveal_at.tzinfo is None:
+        return 0
+    return max(0.0, (reveal_at - datetime.now(PARIS_TZ)).total_seconds())
+
+# Initialisation paresseuse : rien n'est construit à l'import du module
+_init_lock = threading.Lock()
+_initialized = False
+init_timings = {}
+
+@contextmanager
+def _timed(component):
+    """Enregistre la durée d'initialisation d'un composant (ms)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        init_timings[component] = round((time.perf_counter() - start) * 1000, 1)
+
+def ensure_system_initialized():
+    """Initialise le système au premier usage (une seule fois par processus)"""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if not _initialized:
+            with _timed('total'):
+                initialize_system()
+            _initialized = True
+
 def initialize_system():
     """Initialise les modules du système"""
     global db_manager, notion_manager, support_agent, claude_agent, system_status
@@ -163,43 +573,66 @@ def initialize_system():
     
     try:
         # Initialiser le gestionnaire de base de données
-    try:
-        from database.db_manager import DatabaseManager
-            db_manager = DatabaseManager()
+        try:
+            with _timed('database'):
+                from database.db_manager import DatabaseManager
+                db_manager = DatabaseManager()
             db_connected = True
             print("✅ DatabaseManager initialisé")
         except Exception as e:
             print(f"❌ Erreur DatabaseManager: {e}")
             db_manager = None
         
-        # Initialiser Notion (optionnel)
-        try:
-        from notion.notion_manager import NotionManager
-        notion_manager = NotionManager()
-            notion_connected = True
-            print("✅ NotionManager initialisé")
-        except Exception as e:
-            print(f"⚠️ NotionManager non disponible: {e}")
-            notion_manager = None
+        # Initialiser Notion (optionnel, seulement si un token est configuré)
+        if NOTION_CONFIG.get('token'):
+            try:
+                with _timed('notion'):
+                    from notion.notion_manager import NotionManager
+                    notion_manager = NotionManager()
+                notion_connected = True
+                print("✅ NotionManager initialisé")
+            except Exception as e:
+                print(f"⚠️ NotionManager non disponible: {e}")
+                notion_manager = None
+        else:
+            print("⚠️ NotionManager non configuré (NOTION_TOKEN absent)")
         
         # Initialiser l'agent Claude avec accès à la base de données
         try:
-            from automation.claude_agent import ClaudeAgent
-        claude_agent = ClaudeAgent(db_manager=db_manager)
+            with _timed('claude_agent'):
+                from automation.claude_agent import ClaudeAgent
+                from automation.token_budget import TokenBudgeter
+                from automation.resilience import ResilientCaller
+                from automation.model_router import ModelRouter
+                claude_agent = ClaudeAgent(db_manager=db_manager,
+                                           response_cache=response_cache if db_connected else None,
+                                           token_budget=TokenBudgeter(**TOKEN_BUDGET_CONFIG),
+                                           resilience=ResilientCaller(**RESILIENCE_CONFIG),
+                                           router=ModelRouter(**ROUTING_CONFIG),
+                                           local_classifier=load_local_classifier(),
+                                           local_threshold=LOCAL_CLASSIFIER_CONFIG['threshold'],
+                                           local_audit_rate=LOCAL_CLASSIFIER_CONFIG['audit_rate'])
             claude_ready = True
             print("✅ ClaudeAgent initialisé")
         except Exception as e:
             print(f"⚠️ ClaudeAgent non disponible: {e}")
             claude_agent = None
         
-        # Initialiser la table des messages (seulement si DB disponible)
+        # Initialiser les tables et le writer de logs (seulement si DB disponible)
         if db_connected:
-        init_messages_table()
+            with _timed('tables'):
+                init_messages_table()
+                start_client_context_cache()
+                start_entity_extractor()
+                start_response_cache()
+                start_transaction_log_writer()
+                start_unknown_email_aggregator()
         
-        # Fallback sur l'ancien support agent si nécessaire (ne pas faire échouer l'init si erreur)
+        # Fallback sur l'ancien support agent (partage les gestionnaires déjà créés)
         try:
-            from automation.support_agent import SupportAgent
-            support_agent = SupportAgent()  # Correction: pas de paramètres
+            with _timed('support_agent'):
+                from automation.support_agent import SupportAgent
+                support_agent = SupportAgent(db_manager=db_manager, notion_manager=notion_manager)
             print("✅ SupportAgent initialisé")
         except Exception as e:
             print(f"⚠️ SupportAgent non disponible: {e}")
@@ -218,7 +651,14 @@ def initialize_system():
             'model': claude_status.get('model', 'simulation'),
             'last_update': datetime.now()
         })
-        
+
+        # Démarrer les workers si Claude traite les messages
+        if db_connected and system_status['claude_ready']:
+            try:
+                start_job_queue()
+            except Exception as e:
+                print(f"⚠️ File de traitement non disponible: {e}")
+
         print("✅ Système initialisé avec succès")
         print(f"   - Base de données: {'✅' if db_connected else '❌'}")
         print(f"   - Notion: {'✅' if notion_connected else '❌'}")
@@ -244,8 +684,11 @@ def initialize_system():
         })
         return db_connected  # Même si erreur, on peut continuer si DB OK
 
-# Initialisation au démarrage
-initialize_system()
+@app.before_request
+def lazy_initialize():
+    """Construit les composants au premier appel (hors fichiers statiques)"""
+    if request.endpoint != 'static':
+        ensure_system_initialized()
 
 @app.route('/')
 def index():
@@ -255,256 +698,447 @@ def index():
 @app.route('/api/status')
 def api_status():
     """API pour obtenir le statut du système"""
-    return jsonify(system_status)
+    return jsonify(collect_status())
+
+def collect_status():
+    """Statut du système et métriques des composants"""
+    status = dict(system_status)
+    if job_queue:
+        status['job_queue'] = job_queue.get_status()
+    status['reveal_scheduler'] = reveal_scheduler.get_status()
+    status['db_pool'] = db_pool.get_stats()
+    status['transaction_logs'] = transaction_log_writer.get_status()
+    status['unknown_emails'] = unknown_email_aggregator.get_status()
+    status['rate_limits'] = {
+        'senders': sender_limiter.get_status(),
+        'claude': claude_admission.get_status()
+    }
+    status['streaming'] = token_stream.get_status()
+    status['client_context_cache'] = client_context_cache.get_status()
+    status['bursts'] = burst_detector.get_status()
+    if claude_agent:
+        claude_status = claude_agent.get_status()
+        status['claude_modes'] = claude_status['modes']
+        status['token_budget'] = claude_status['token_budget']
+        status['speculation'] = claude_status['speculation']
+        status['claude_resilience'] = claude_status['resilience']
+        status['model_routing'] = claude_status['routing']
+        status['structured_output'] = claude_status['structured_output']
+        status['local_classifier'] = claude_status['local_classifier']
+    if response_cache and system_status.get('db_connected'):
+        status['response_cache'] = response_cache.get_status()
+    status['init_timings'] = dict(init_timings)
+    return status
+
+@app.route('/api/warmup', methods=['GET', 'POST'])
+def api_warmup():
+    """Préchauffe le processus (à appeler par le serveur après le fork d'un worker)"""
+    start = time.perf_counter()
+    ensure_system_initialized()
+    
+    # Ouvrir la connexion du thread et vérifier la base
+    if system_status.get('db_connected'):
+        with db_pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+    
+    return jsonify({
+        'success': True,
+        'ready': _initialized,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        'init_timings': dict(init_timings),
+        'claude_ready': system_status.get('claude_ready', False),
+        'db_connected': system_status.get('db_connected', False)
+    })
+
+# Statuts après lesquels un ticket n'évolue plus sans intervention (fin du suivi)
+TERMINAL_STATUSES = ('traite', 'erreur')
+
+# Modes de traitement sans Claude (model_used des réponses enregistrées par schedule_reveal)
+FALLBACK_MODES = ('legacy-ai', 'simulation')
+
+@app.route('/api/tickets/<ticket_id>')
+def api_ticket_status(ticket_id):
+    """API pour suivre le traitement d'un message (polling ou long-polling via ?wait=)"""
+    try:
+        wait = min(float(request.args.get('wait', 0) or 0), WORKER_CONFIG['long_poll_max_seconds'])
+    except ValueError:
+        wait = 0
+
+    payload, status_code = ticket_status_payload(ticket_id, wait)
+    return jsonify(payload), status_code
+
+@app.route('/api/tickets/<ticket_id>/stream')
+def api_ticket_stream(ticket_id):
+    """Flux SSE de la réponse d'un ticket (événements token, reset, done, timeout)"""
+    return Response(
+        stream_with_context(ticket_stream_events(ticket_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def ticket_stream_events(ticket_id):
+    """Événements SSE d'un ticket ; sans canal de streaming, seul le résultat final est envoyé"""
+    timeout = STREAM_CONFIG['idle_timeout_seconds']
+
+    if token_stream.has(ticket_id):
+        for kind, data in token_stream.subscribe(ticket_id, timeout):
+            yield sse_event(kind, data)
+            if kind == 'done':
+                return
+    else:
+        # Agent legacy, simulation ou message déjà traité
+        payload, status_code = ticket_status_payload(ticket_id, min(timeout, WORKER_CONFIG['long_poll_max_seconds']))
+        if payload.get('status') in TERMINAL_STATUSES or status_code != 200:
+            yield sse_event('done', payload)
+            return
+
+    # Rien reçu avant le délai : le client repasse au suivi par polling
+    yield sse_event('timeout', {'ticket_id': ticket_id})
+
+def ticket_status_payload(ticket_id, wait=0):
+    """État d'un ticket (payload, code HTTP), en attendant au plus `wait` secondes"""
+    # Réponses calculées en attente de révélation (agent legacy, simulation)
+    delayed = reveal_scheduler.get(ticket_id)
+    if delayed and delayed['state'] == reveal_scheduler.PENDING and wait > 0:
+        reveal_scheduler.wait_for(ticket_id, wait)
+        delayed = reveal_scheduler.get(ticket_id)
+
+    if delayed:
+        if delayed['state'] == reveal_scheduler.REVEALED:
+            return delayed['payload'], 200
+        return {
+            'success': True,
+            'status': 'en_cours',
+            'ticket_id': ticket_id,
+            'reveal_in': delayed['remaining']
+        }, 200
+
+    message_row = get_message_by_ticket(ticket_id)
+    if not message_row:
+        return {
+            'success': False,
+            'error': 'Ticket introuvable'
+        }, 404
+
+    if message_row['status'] not in TERMINAL_STATUSES and wait > 0 and job_queue:
+        job_queue.wait_for(message_row['id'], wait)
+        message_row = get_message_by_ticket(ticket_id)
+
+    # Réponse de secours enregistrée par un autre processus ou avant un redémarrage :
+    # confiée à la roue de ce processus, attendue comme celles qu'il a planifiées
+    remaining = reveal_remaining(message_row) if message_row['status'] == 'traite' else 0
+    if remaining:
+        reveal_scheduler.schedule(ticket_id, ticket_result_payload(message_row), remaining)
+        return ticket_status_payload(ticket_id, wait)
+
+    if message_row['status'] == 'erreur':
+        return {
+            'success': False,
+            'status': 'erreur',
+            'ticket_id': ticket_id,
+            'message_id': message_row['id'],
+            'error': 'Le traitement de votre message a échoué. Notre équipe vous répondra directement.'
+        }, 200
+
+    if message_row['status'] != 'traite':
+        return {
+            'success': True,
+            'status': message_row['status'],
+            'ticket_id': ticket_id,
+            'message_id': message_row['id']
+        }, 200
+
+    return ticket_result_payload(message_row), 200
+
+def ticket_result_payload(message_row):
+    """Résultat d'un message traité, au format du suivi de ticket"""
+    ticket_id = message_row['ticket_id']
+    return {
+        'success': True,
+        'status': message_row['status'],
+        'ticket_id': ticket_id,
+        'message_id': message_row['id'],
+        'result': {
+            'email': message_row['client_email'],
+            'subject': message_row['subject'],
+            'category': message_row['category'],
+            'urgency': message_row['urgency'],
+            'sentiment': message_row['sentiment'],
+            'response': message_row['response'],
+            'quality_score': message_row['quality_score'],
+            'ticket_id': ticket_id,
+            'message_id': message_row['id'],
+            'model': message_row['model_used']
+        },
+        'processed_at': message_row['processed_at'],
+        'processing_delay': message_row['response_time'],
+        'mode': message_row['model_used'] if message_row['model_used'] in FALLBACK_MODES else 'claude-ai',
+        'ai_model': message_row['model_used']
+    }
 
 # Enrichir le contexte pour l'agent IA
-def get_client_context(email: str) -> dict:
+def get_client_context(email: str, message: str = None) -> dict:
     """
-    Récupère le contexte structuré d'un client pour l'agent IA.
-    Interroge la base de données unifiée (tables client et commandes_details).
+    Récupère le contexte structuré d'un client pour l'agent IA (via le cache).
+    Avec le message, seules les commandes qu'il cite sont gardées (numéros, à défaut
+    produits commandés) ; sans référence reconnue, les 5 dernières commandes.
+    Le dictionnaire retourné est partagé : ne pas le modifier.
     """
-    context = {
-        "client": None,
-        "nb_commandes": 0,
-        "total_depense": 0,
-        "commandes": []
-    }
     try:
-        conn = get_db_connection()
-        
-        # 1. Récupérer les informations du client depuis la table 'client'
-        client_info = conn.execute('SELECT * FROM client WHERE email = ?', (email,)).fetchone()
-        if client_info:
-            context['client'] = dict(client_info)
-
-        # 2. Récupérer l'historique des commandes depuis la table unifiée 'commandes_details'
-        orders = conn.execute(
-            """
-            SELECT commande_id, created_at, statut, montant_total, produits_json
-            FROM commandes_details
-            WHERE client_email = ?
-            ORDER BY created_at DESC
-            LIMIT 5
-            """, (email,)
-        ).fetchall()
-        
-        conn.close()
-
-        if orders:
-            context['nb_commandes'] = len(orders)
-            context['total_depense'] = float(sum(o['montant_total'] for o in orders))
-            
-            for order in orders:
-                try:
-                    produits = json.loads(order['produits_json'])
-                except (json.JSONDecodeError, TypeError):
-                    produits = [] # Gérer le cas où le JSON est invalide ou null
-
-                context['commandes'].append({
-                    'id': order['commande_id'],
-                    'date': order['created_at'],
-                    'statut': order['statut'],
-                    'montant': float(order['montant_total']),
-                    'produits': produits
-                })
-                
+        context = client_context_cache.get(email)
+        if message and context.get('client'):
+            return referenced_orders_context(context, email, entity_extractor.extract(message))
+        return context
     except Exception as e:
         print(f"❌ Erreur lors de la récupération du contexte client: {e}")
-        # Retourner une structure valide mais vide en cas d'erreur
+        # Retourner une structure valide mais vide en cas d'erreur (non mise en cache)
         return { "client": None, "nb_commandes": 0, "total_depense": 0, "commandes": [] }
-        
-    return context
 
-@app.route('/api/process-message', methods=['POST'])
-def api_process_message():
-    """API pour traiter un message client"""
-    try:
-        data = request.get_json()
-        
-        email = data.get('email', '').strip()
-        subject = data.get('subject', '').strip()
-        message = data.get('message', '').strip()
-        
-        # Validation
-        if not email or not message:
-            return jsonify({
-                'success': False,
-                'error': 'Email et message requis'
-            }), 400
+def referenced_orders_context(context: dict, email: str, entities: dict) -> dict:
+    """Copie du contexte réduite aux commandes citées (lues en base si absentes du contexte en cache)"""
+    orders = []
+    if entities['order_ids']:
+        known = {order['id']: order for order in context['commandes']}
+        missing = [order_id for order_id in entities['order_ids'] if order_id not in known]
+        if missing:
+            with db_pool.connection() as conn:
+                known.update((order['id'], order) for order in read_client_orders(conn, email, missing))
+        orders = [known[order_id] for order_id in entities['order_ids'] if order_id in known]
+    elif entities['products']:
+        product_ids = {product['id'] for product in entities['products']}
+        orders = [order for order in context['commandes']
+                  if any(isinstance(item, dict) and item.get('id') in product_ids for item in order['produits'])]
+    if not orders:
+        return context
+    return dict(context, commandes=orders)
+
+def load_client_context(email: str) -> dict:
+    """
+    Lit le contexte d'un client en base (tables client et commandes_details).
+    Les erreurs sont propagées pour ne pas mettre en cache un contexte vide.
+    """
+    with db_pool.connection() as conn:
+        return read_client_context(conn, email)
+
+# Contexte client par email, invalidé à chaque écriture (commande, inscription, admin)
+client_context_cache = ClientContextCache(
+    load_client_context,
+    db_pool,
+    max_entries=CONTEXT_CACHE_CONFIG['max_entries'],
+    ttl_seconds=CONTEXT_CACHE_CONFIG['ttl_seconds'],
+    poll_interval=CONTEXT_CACHE_CONFIG['poll_interval']
+)
+
+def prepare_customer_message(data, claude_pipeline_ready):
+    """
+    Valide, authentifie, limite et enregistre un message client
+    (commun à l'application Flask et au serveur ASGI)
+    
+    Args:
+        data: Corps JSON de la requête
+        claude_pipeline_ready: Le mode de service peut traiter les messages avec Claude
         
-        if '@' not in email:
-            return jsonify({
+    Returns:
+        (réponse d'erreur (payload, code, en-têtes) ou None, informations du message)
+    """
+    data = data or {}
+    email = data.get('email', '').strip()
+    subject = data.get('subject', '').strip()
+    message = data.get('message', '').strip()
+    # Mode de traitement Claude : 'combined' (un appel), 'two_step' (deux appels)
+    # ou 'speculative' (réponse générée pendant la classification)
+    processing_mode = data.get('mode') or None
+    
+    # Validation
+    if not email or not message:
+        return ({
+            'success': False,
+            'error': 'Email et message requis'
+        }, 400, {}), None
+    
+    if processing_mode is not None:
+        from automation.claude_agent import PROCESSING_MODES
+        if processing_mode not in PROCESSING_MODES:
+            return ({
                 'success': False,
-                'error': 'Format d\'email invalide'
-            }), 400
-        
-        # Vérifier si l'utilisateur est enregistré dans la base de données
-        print(f"🔍 DEBUG AUTH: db_manager={db_manager is not None}, db_connected={system_status.get('db_connected', False)}")
-        
-        # Logger la tentative d'accès
-        log_transaction(email, "TENTATIVE_ACCES", "EN_COURS", {
-            'subject': subject,
-            'message_length': len(message),
-            'timestamp': datetime.now().isoformat()
-        })
+                'error': f"Mode de traitement invalide (valeurs possibles: {', '.join(PROCESSING_MODES)})"
+            }, 400, {}), None
+    
+    if '@' not in email:
+        return ({
+            'success': False,
+            'error': 'Format d\'email invalide'
+        }, 400, {}), None
+    
+    # Vérifier si l'utilisateur est enregistré dans la base de données
+    print(f"🔍 DEBUG AUTH: db_manager={db_manager is not None}, db_connected={system_status.get('db_connected', False)}")
+    
+    # Logger la tentative d'accès
+    log_transaction(email, "TENTATIVE_ACCES", "EN_COURS", {
+        'subject': subject,
+        'message_length': len(message),
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    if db_manager and system_status.get('db_connected', False):
+        # Authentification et contexte client en une seule lecture (cache)
+        client_info = get_client_context(email)['client']
+        print(f"🔍 DEBUG AUTH: Email {email} -> client_info={client_info}")
         
-        if db_manager and system_status.get('db_connected', False):
-            client_info = db_manager.get_client_by_email(email)
-            print(f"🔍 DEBUG AUTH: Email {email} -> client_info={client_info}")
+        if not client_info:
+            print(f"🚫 DEBUG AUTH: Accès refusé pour {email}")
             
-            if not client_info:
-                print(f"🚫 DEBUG AUTH: Accès refusé pour {email}")
-                
-                # Logger l'échec d'authentification
-                log_transaction(email, "ACCES_REFUSE", "ECHEC", {
-                    'reason': 'Email non enregistré',
-                    'subject': subject,
-                    'message_preview': message[:100]
-                })
-                
-                # Stocker l'email inconnu
-                store_unknown_email(email, "ACCES_REFUSE")
-                
-                return jsonify({
-                    'success': False,
-                    'error': 'Accès refusé. Vous devez être inscrit pour utiliser ce service.',
-                    'requires_registration': True
-                }), 403
-            else:
-                print(f"✅ DEBUG AUTH: Accès autorisé pour {email}")
-                
-                # Logger l'accès autorisé
-                log_transaction(email, "ACCES_AUTORISE", "SUCCES", {
-                    'client_name': f"{client_info.get('prenom', '')} {client_info.get('nom', '')}",
-                    'subject': subject
-                })
-        else:
-            print(f"🚫 DEBUG AUTH: Base de données indisponible (db_manager={db_manager is not None}, connected={system_status.get('db_connected', False)})")
-            
-            # Logger l'erreur système
-            log_transaction(email, "ERREUR_SYSTEME", "ECHEC", {
-                'error': 'Base de données indisponible',
-                'db_manager_exists': db_manager is not None,
-                'db_connected': system_status.get('db_connected', False)
+            # Logger l'échec d'authentification
+            log_transaction(email, "ACCES_REFUSE", "ECHEC", {
+                'reason': 'Email non enregistré',
+                'subject': subject,
+                'message_preview': message[:100]
             })
             
-            return jsonify({
+            # Stocker l'email inconnu
+            store_unknown_email(email, "ACCES_REFUSE")
+            
+            return ({
                 'success': False,
-                'error': 'Base de données indisponible'
-            }), 500
-        
-        # Enrichissement du contexte
-        client_context = get_client_context(email)
+                'error': 'Accès refusé. Vous devez être inscrit pour utiliser ce service.',
+                'requires_registration': True
+            }, 403, {}), None
+        else:
+            print(f"✅ DEBUG AUTH: Accès autorisé pour {email}")
+            
+            # Logger l'accès autorisé
+            log_transaction(email, "ACCES_AUTORISE", "SUCCES", {
+                'client_name': f"{client_info.get('prenom', '')} {client_info.get('nom', '')}",
+                'subject': subject
+            })
+    else:
+        print(f"🚫 DEBUG AUTH: Base de données indisponible (db_manager={db_manager is not None}, connected={system_status.get('db_connected', False)})")
         
-        # Créer l'enregistrement du message avec statut "nouveau"
-        client_name = f"{client_info.get('prenom', '')} {client_info.get('nom', '')}" if client_info else None
-        message_id, ticket_id = create_message_record(email, subject, message, client_name)
+        # Logger l'erreur système
+        log_transaction(email, "ERREUR_SYSTEME", "ECHEC", {
+            'error': 'Base de données indisponible',
+            'db_manager_exists': db_manager is not None,
+            'db_connected': system_status.get('db_connected', False)
+        })
         
-        if not message_id:
-            return jsonify({
-                'success': False,
-                'error': 'Erreur enregistrement message'
-            }), 500
+        return ({
+            'success': False,
+            'error': 'Base de données indisponible'
+        }, 500, {}), None
+    
+    # Limite de débit par expéditeur
+    allowed, retry_after = sender_limiter.acquire(email)
+    if not allowed:
+        return rate_limited_response(email, 'Trop de messages envoyés. Réessayez plus tard.', retry_after), None
+    
+    # Contrôle d'admission avant de mettre un message en file pour Claude
+    use_claude = bool(claude_agent and system_status.get('claude_ready', False) and claude_pipeline_ready)
+    if use_claude:
+        admitted, retry_after = claude_admission.admit()
+        if not admitted:
+            return rate_limited_response(email, 'Service saturé. Réessayez dans quelques instants.', retry_after), None
+    
+    # Créer l'enregistrement du message avec statut "nouveau"
+    client_name = f"{client_info.get('prenom', '')} {client_info.get('nom', '')}" if client_info else None
+    message_id, ticket_id = create_message_record(email, subject, message, client_name, processing_mode)
+    
+    if not message_id:
+        if use_claude:
+            claude_admission.cancel()
+        return ({
+            'success': False,
+            'error': 'Erreur enregistrement message'
+        }, 500, {}), None
+    
+    if use_claude:
+        # Admission libérée une seule fois, quand le message est traité ou abandonné
+        claude_admission.attach(message_id)
+    
+    print(f"📧 Message enregistré: ID {message_id}, Ticket {ticket_id}")
+    
+    return None, {
+        'email': email,
+        'subject': subject,
+        'message': message,
+        'message_id': message_id,
+        'ticket_id': ticket_id,
+        'processing_mode': processing_mode,
+        'use_claude': use_claude
+    }
+
+def process_without_claude(info):
+    """Traitement de secours (ancien agent ou simulation) révélé après un délai"""
+    email, subject, message = info['email'], info['subject'], info['message']
+    ticket_id, message_id = info['ticket_id'], info['message_id']
+    
+    # Simuler un délai de traitement (10-30 secondes)
+    import random
+    processing_delay = random.randint(10, 30)
+    
+    if support_agent and system_status['agent_ready']:
+        # Enrichissement du contexte (commandes citées dans le message)
+        client_context = get_client_context(email, message)
         
-        print(f"📧 Message enregistré: ID {message_id}, Ticket {ticket_id}")
+        # Traitement avec l'ancien agent
+        result = support_agent.process_customer_message(email, message, subject, context=client_context)
         
-        # Simuler un délai de traitement (10-30 secondes)
-        import random
-        import time
-        processing_delay = random.randint(10, 30)
+        # Révéler la réponse après le délai de traitement, sans bloquer le thread
+        return schedule_reveal(ticket_id, message_id, {
+            'success': True,
+            'result': result,
+            'processing_delay': processing_delay,
+            'mode': 'legacy-ai'
+        }, processing_delay)
+    
+    # Mode simulation
+    category = classify_message_simple(message)
+    response = generate_response_simple(email, category, message)
+    
+    # Le délai de traitement est conservé même en simulation
+    return schedule_reveal(ticket_id, message_id, {
+        'success': True,
+        'result': {
+            'email': email,
+            'category': category,
+            'response': response,
+            'quality_score': 0.85,
+            'ticket_id': f'SIM-{datetime.now().strftime("%Y%m%d%H%M%S")}',
+            'mode': 'simulation'
+        },
+        'processing_delay': processing_delay,
+        'mode': 'simulation'
+    }, processing_delay)
+
+@app.route('/api/process-message', methods=['POST'])
+def api_process_message():
+    """API pour traiter un message client"""
+    try:
+        error, info = prepare_customer_message(request.get_json(), job_queue is not None)
+        if error:
+            payload, status_code, headers = error
+            return jsonify(payload), status_code, headers
         
         # Traitement du message - Priorité à Claude
-        if claude_agent and system_status.get('claude_ready', False):
-            # Mesurer le temps de traitement réel
-            start_time = time.time()
+        if info['use_claude']:
+            # Traitement avec Claude (priorité) par les workers en arrière-plan
+            token_stream.open(info['ticket_id'])
+            job_queue.submit(info['message_id'])
             
-            # Traitement avec Claude (priorité)
-            result = claude_agent.process_customer_message(email, message, subject, context=client_context)
-            
-            # Calculer la durée
-            end_time = time.time()
-            processing_duration = end_time - start_time
-            
-            # Mettre à jour l'enregistrement du message
-            update_message_processing(message_id, result, processing_duration)
-            
-            # Ajouter le ticket_id au résultat
-            result['ticket_id'] = ticket_id
-            result['message_id'] = message_id
-            
-            # Log pour le monitoring administrateur en console
-            try:
-                print(f"📊 [MONITORING] Échange traité:")
-                print(f"   📧 Email: {email}")
-                print(f"   🏷️  Catégorie: {result.get('category', 'N/A')}")
-                print(f"   🎯 Urgence: {result.get('urgency', 'N/A')}/5")
-                print(f"   😊 Sentiment: {result.get('sentiment', 'N/A')}")
-                print(f"   📊 Qualité: {result.get('quality_score', 0):.2f}")
-                print(f"   ⏱️  Temps total: {processing_duration:.2f}s")
-                print(f"   🎫 Ticket: {ticket_id}")
-                print("=" * 50)
-            except Exception as log_error:
-                print(f"⚠️ Erreur logging monitoring: {log_error}")
-            
-            # Logger le traitement réussi
-            log_transaction(email, "MESSAGE_TRAITE", "SUCCES", {
-                'ticket_id': ticket_id,
-                'message_id': message_id,
-                'category': result.get('category'),
-                'urgency': result.get('urgency'),
-                'sentiment': result.get('sentiment'),
-                'quality_score': result.get('quality_score'),
-                'processing_time': processing_duration,
-                'model': 'claude-4-sonnet',
-                'response_length': len(result.get('response', ''))
-            })
-            
-            # Juste pour la démo, on ajoute le contexte au résultat
-            result['client_context_debug'] = client_context
             return jsonify({
                 'success': True,
-                'result': result,
-                'processed_at': datetime.now().isoformat(),
-                'processing_delay': processing_duration,
+                'status': 'nouveau',
+                'ticket_id': info['ticket_id'],
+                'message_id': info['message_id'],
+                'poll_url': f'/api/tickets/{info["ticket_id"]}',
+                'stream_url': f'/api/tickets/{info["ticket_id"]}/stream',
+                'queued_at': datetime.now().isoformat(),
                 'mode': 'claude-ai',
-                'ai_model': 'claude-4-sonnet'
-            })
-        elif support_agent and system_status['agent_ready']:
-            # Ajouter le délai de traitement
-            time.sleep(processing_delay)
-            
-            # Traitement avec l'ancien agent
-            result = support_agent.process_customer_message(email, message, subject, context=client_context)
-            
-            return jsonify({
-                'success': True,
-                'result': result,
-                'processed_at': datetime.now().isoformat(),
-                'processing_delay': processing_delay,
-                'mode': 'legacy-ai'
-            })
-        else:
-            # Ajouter le délai de traitement même en simulation
-            time.sleep(processing_delay)
-            
-            # Mode simulation
-            category = classify_message_simple(message)
-            response = generate_response_simple(email, category, message)
-            
-            return jsonify({
-                'success': True,
-                'result': {
-                    'email': email,
-                    'category': category,
-                    'response': response,
-                    'quality_score': 0.85,
-                    'ticket_id': f'SIM-{datetime.now().strftime("%Y%m%d%H%M%S")}',
-                    'mode': 'simulation'
-                },
-                'processed_at': datetime.now().isoformat(),
-                'processing_delay': processing_delay,
-                'mode': 'simulation'
-            })
+                # Modèle choisi par le routeur au traitement (model_used du ticket)
+                'ai_model': 'routed' if ROUTING_CONFIG['enabled'] else ROUTING_CONFIG['large_model']
+            }), 202
+        
+        payload, status_code = process_without_claude(info)
+        return jsonify(payload), status_code
             
     except Exception as e:
         return jsonify({
@@ -593,6 +1227,8 @@ def api_register():
             print(f"🔧 DEBUG INSCRIPTION: client_id retourné = {client_id}")
             
             if client_id:
+                # L'email était peut-être en cache comme inconnu
+                client_context_cache.invalidate(email)
                 print(f"✅ DEBUG INSCRIPTION: Succès client_id={client_id}")
                 return jsonify({
                     'success': True,
@@ -659,17 +1295,8 @@ def api_examples():
     })
 
 def classify_message_simple(message):
-    """Classification simple basée sur des mots-clés"""
-    message_lower = message.lower()
-    
-    if any(word in message_lower for word in ['retard', 'livraison', 'reçu', 'arrivé', 'expédition']):
-        return 'Retard de livraison'
-    elif any(word in message_lower for word in ['remboursement', 'rembourser', 'annuler', 'remboursé']):
-        return 'Remboursement'
-    elif any(word in message_lower for word in ['défectueux', 'cassé', 'abîmé', 'problème', 'défaut']):
-        return 'Produit défectueux'
-    else:
-        return 'Information commande'
+    """Classification simple basée sur des mots-clés (réponses simulées disponibles seulement)"""
+    return get_keyword_classifier().label(message, among=TEMPLATE_CATEGORIES, default='Information commande')
 
 def generate_response_simple(email, category, message):
     """Génère une réponse simple basée sur la catégorie"""
@@ -730,39 +1357,11 @@ def internal_error(error):
     return render_template('500.html'), 500
 
 def log_transaction(email: str, action: str, status: str, details: dict = None):
-    """Enregistre toutes les transactions pour monitoring admin"""
+    """Enregistre toutes les transactions pour monitoring admin (écriture groupée en arrière-plan)"""
     try:
-        import sqlite3
-        import os
-        
-        # Chemin absolu cohérent
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crm_ecommerce.db')
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Table pour logs de transactions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transaction_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL,
-                action TEXT NOT NULL,
-                status TEXT NOT NULL,
-                details TEXT,
-                ip_address TEXT,
-                user_agent TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Insérer le log
-        cursor.execute('''
-            INSERT INTO transaction_logs (email, action, status, details)
-            VALUES (?, ?, ?, ?)
-        ''', (email, action, status, json.dumps(details) if details else None))
-        
-        conn.commit()
-        conn.close()
+        if not transaction_log_writer.log(email, action, status, details):
+            print(f"⚠️ Log transaction perdu (file pleine): {email} | {action}")
+            return
         
         # Log console pour admin
         print(f"📊 [TRANSACTION LOG] {datetime.now().strftime('%H:%M:%S')} | {email} | {action} | {status}")
@@ -771,45 +1370,11 @@ def log_transaction(email: str, action: str, status: str, details: dict = None):
         print(f"⚠️ Erreur log transaction: {e}")
 
 def store_unknown_email(email: str, action: str = "TENTATIVE_ACCES"):
-    """Stocke les emails inconnus pour suivi admin"""
+    """Stocke les emails inconnus pour suivi admin (agrégés puis fusionnés en base)"""
     try:
-        import sqlite3
-        import os
-        
-        # Chemin absolu cohérent
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crm_ecommerce.db')
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Table pour emails inconnus
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS unknown_emails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                first_attempt DATETIME DEFAULT CURRENT_TIMESTAMP,
-                last_attempt DATETIME DEFAULT CURRENT_TIMESTAMP,
-                attempt_count INTEGER DEFAULT 1,
-                action_type TEXT DEFAULT 'TENTATIVE_ACCES',
-                status TEXT DEFAULT 'NON_AUTORISE'
-            )
-        ''')
-        
-        # Insérer ou mettre à jour
-        cursor.execute('''
-            INSERT OR REPLACE INTO unknown_emails 
-            (email, first_attempt, last_attempt, attempt_count, action_type)
-            VALUES (
-                ?, 
-                COALESCE((SELECT first_attempt FROM unknown_emails WHERE email = ?), CURRENT_TIMESTAMP),
-                CURRENT_TIMESTAMP,
-                COALESCE((SELECT attempt_count FROM unknown_emails WHERE email = ?) + 1, 1),
-                ?
-            )
-        ''', (email, email, email, action))
-        
-        conn.commit()
-        conn.close()
+        if not unknown_email_aggregator.record(email, action):
+            print(f"⚠️ Email inconnu non comptabilisé (trop d'emails en attente): {email}")
+            return
         
         print(f"📝 [EMAIL INCONNU STOCKÉ] {email} | Action: {action}")
         
@@ -820,9 +1385,8 @@ def store_unknown_email(email: str, action: str = "TENTATIVE_ACCES"):
 def api_products():
     """Retourne la liste des produits."""
     try:
-        conn = get_db_connection()
-        products = conn.execute('SELECT id, name, description, price, stock, image_url FROM products').fetchall()
-        conn.close()
+        with db_pool.connection() as conn:
+            products = conn.execute('SELECT id, name, description, price, stock, image_url FROM products').fetchall()
         return jsonify({'success': True, 'products': [dict(p) for p in products]})
     except Exception as e:
         print(f"❌ Erreur API Produits: {e}")
@@ -832,7 +1396,12 @@ def api_products():
 def api_create_order():
     """Crée une nouvelle commande en utilisant la table commandes_details."""
     print("📦 [API] Réception d'une nouvelle requête de commande.")
-    data = request.get_json()
+    payload, status_code = create_order(request.get_json())
+    return jsonify(payload), status_code
+
+def create_order(data):
+    """Crée une commande à partir d'un panier (payload, code HTTP)"""
+    data = data or {}
     email = data.get('email')
     cart = data.get('cart') # Le panier contient {id, name, price, quantity}
 
@@ -840,7 +1409,7 @@ def api_create_order():
 
     if not email or not cart:
         print("  L_ ❌ Erreur: Données manquantes.")
-        return jsonify({'success': False, 'error': 'Données manquantes'}), 400
+        return {'success': False, 'error': 'Données manquantes'}, 400
 
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -903,18 +1472,16 @@ def api_create_order():
             )
         
         conn.commit()
+        client_context_cache.invalidate(email)
         print("  L_ ✅ Commande enregistrée avec succès dans commandes_details.")
         
         # Le order_uid est maintenant notre commande_id
-        return jsonify({'success': True, 'order_uid': commande_id, 'total': montant_total})
+        return {'success': True, 'order_uid': commande_id, 'total': montant_total}, 200
 
     except Exception as e:
         print(f"  L_ ❌ ERREUR LORS DE LA CRÉATION DE LA COMMANDE: {e}")
         conn.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
-    finally:
-        conn.close()
-        print("  L_ 🚪 Connexion DB fermée.")
+        return {'success': False, 'error': str(e)}, 500
 
 @app.route('/api/check-email', methods=['POST'])
 def api_check_email():
@@ -924,12 +1491,14 @@ def api_check_email():
     if not email:
         return jsonify({'exists': False, 'error': 'Email manquant'}), 400
     
-    conn = get_db_connection()
-    # Recherche dans la table 'client'
-    client = conn.execute('SELECT id FROM client WHERE email = ?', (email,)).fetchone()
-    conn.close()
-    
-    return jsonify({'exists': client is not None})
+    return jsonify({'exists': client_email_exists(email)})
+
+def client_email_exists(email):
+    """Indique si l'email appartient à un client enregistré"""
+    with db_pool.connection() as conn:
+        # Recherche dans la table 'client'
+        client = conn.execute('SELECT id FROM client WHERE email = ?', (email,)).fetchone()
+    return client is not None
 
 if __name__ == '__main__':
     print("🚀 Lancement du serveur web...")
@@ -937,4 +1506,8 @@ if __name__ == '__main__':
     print("🎨 Interface moderne avec Bootstrap 5")
     print("⚡ Performance optimisée")
     
+    # Le reloader du mode debug relance le script : seul le processus enfant sert les requêtes
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ensure_system_initialized()
+    
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
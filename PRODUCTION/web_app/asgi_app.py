@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serveur ASGI - API Client Asynchrone
+Les attentes Claude sont des coroutines (client AsyncAnthropic) et les accès
+SQLite passent par un pool de threads borné : des milliers de messages en
+cours de traitement ne coûtent pas des milliers de threads.
+
+Routes natives : /api/process-message, /api/check-email, /api/orders, /api/status
+et le flux SSE /api/tickets/<ticket_id>/stream
+Toutes les autres routes (pages, fichiers statiques, tickets, inscription...)
+sont servies par l'application Flask (mode compatibilité) via un pont WSGI.
+
+Lancement (depuis PRODUCTION, comme l'application Flask) :
+    uvicorn --app-dir web_app asgi_app:application --host 0.0.0.0 --port 5000
+ou  python web_app/asgi_app.py
+"""
+
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import app as compat
+from config import ASGI_CONFIG, STREAM_CONFIG, WORKER_CONFIG
+from automation.token_stream import sse_event
+
+# Accès base de données (courts) et requêtes Flask (pont WSGI) sur des pools séparés
+db_executor = ThreadPoolExecutor(ASGI_CONFIG['db_threads'], thread_name_prefix='asgi-db')
+wsgi_executor = ThreadPoolExecutor(ASGI_CONFIG['wsgi_threads'], thread_name_prefix='asgi-wsgi')
+
+_startup_lock = None
+_started = False
+
+# Traitements lancés en arrière-plan (références gardées jusqu'à leur fin)
+_background_tasks = set()
+
+server_stats = {
+    'requests': 0,
+    'inflight_claude': 0,
+    'processed': 0,
+    'handed_to_workers': 0,
+    'already_claimed': 0
+}
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Exécute un appel bloquant (SQLite) dans le pool de threads de la base"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(func, *args, **kwargs))
+
+
+async def ensure_started():
+    """Initialise le système une seule fois (lifespan ou première requête)"""
+    global _startup_lock, _started
+    if _started:
+        return
+    if _startup_lock is None:
+        _startup_lock = asyncio.Lock()
+    async with _startup_lock:
+        if _started:
+            return
+        await run_blocking(compat.ensure_system_initialized)
+        # En mode ASGI, le plafond d'appels Claude simultanés ne dépend plus du nombre de threads
+        # (même contrôleur que l'application Flask : admissions et libérations comptées ensemble)
+        compat.claude_admission.set_async_limit(ASGI_CONFIG['max_inflight_claude'])
+        _started = True
+        print(f"✅ [ASGI] Serveur prêt (Claude: {'✅' if compat.system_status.get('claude_ready') else '❌'})")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def send_json(send, payload, status=200, headers=None):
+    """Envoie une réponse JSON"""
+    body = json.dumps(payload, default=_json_default).encode('utf-8')
+    raw_headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode())
+    ]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode('latin-1'), str(value).encode('latin-1')))
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive):
+    """Lit le corps complet de la requête"""
+    chunks = []
+    more_body = True
+    while more_body:
+        event = await receive()
+        if event['type'] == 'http.disconnect':
+            break
+        chunks.append(event.get('body', b''))
+        more_body = event.get('more_body', False)
+    return b''.join(chunks)
+
+
+async def read_json(receive):
+    body = await read_body(receive)
+    if not body:
+        return {}
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+# ==================== ROUTES NATIVES ====================
+
+async def process_message(scope, receive, send):
+    """Traite un message client ; l'attente de Claude se fait dans la coroutine"""
+    data = await read_json(receive)
+    if data is None:
+        return await send_json(send, {'success': False, 'error': 'JSON invalide'}, 400)
+
+    try:
+        error, info = await run_blocking(compat.prepare_customer_message, data, True)
+        if error:
+            payload, status_code, headers = error
+            return await send_json(send, payload, status_code, headers)
+
+        if not info['use_claude']:
+            payload, status_code = await run_blocking(compat.process_without_claude, info)
+            return await send_json(send, payload, status_code)
+
+        if data.get('stream'):
+            # Le client suit la génération sur le flux SSE du ticket
+            ticket_id = info['ticket_id']
+            compat.token_stream.open(ticket_id)
+            task = asyncio.create_task(process_with_claude(info, stream=True))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+            return await send_json(send, {
+                'success': True,
+                'status': 'en_cours',
+                'ticket_id': ticket_id,
+                'message_id': info['message_id'],
+                'poll_url': f'/api/tickets/{ticket_id}',
+                'stream_url': f'/api/tickets/{ticket_id}/stream',
+                'mode': 'claude-ai'
+            }, 202)
+
+        payload, status_code = await process_with_claude(info)
+        return await send_json(send, payload, status_code)
+
+    except Exception as e:
+        return await send_json(send, {'success': False, 'error': str(e)}, 500)
+
+
+async def process_with_claude(info, stream=False):
+    """Traitement Claude direct ; en cas d'échec le message est confié aux workers"""
+    job_queue = compat.job_queue
+    message_id, ticket_id, email = info['message_id'], info['ticket_id'], info['email']
+    on_text = (lambda text: compat.token_stream.publish(ticket_id, text)) if stream else None
+
+    if not await run_blocking(job_queue.claim, message_id):
+        # Déjà réclamé (worker après une reprise, traitement par lots) : pas de second appel Claude
+        compat.claude_admission.release(message_id)
+        server_stats['already_claimed'] += 1
+        return {
+            'success': True,
+            'status': 'en_cours',
+            'ticket_id': ticket_id,
+            'message_id': message_id,
+            'poll_url': f'/api/tickets/{ticket_id}',
+            'mode': 'claude-ai'
+        }, 202
+
+    server_stats['inflight_claude'] += 1
+    try:
+        client_context = await run_blocking(compat.get_client_context, email, info['message'])
+
+        async with compat.claude_admission.aslot():
+            start_time = time.time()
+            result = await compat.claude_agent.aprocess_customer_message(
+                email, info['message'], info['subject'], context=client_context, on_text=on_text,
+                mode=info['processing_mode'], classification=compat.burst_detector.classification_for(message_id)
+            )
+            processing_duration = time.time() - start_time
+
+        if result.get('error'):
+            raise RuntimeError(result['error'])
+
+        await run_blocking(compat.complete_message_processing, message_id, email, ticket_id,
+                           result, processing_duration)
+        message_row = await run_blocking(compat.get_message_by_ticket, ticket_id)
+        server_stats['processed'] += 1
+        return compat.ticket_result_payload(message_row), 200
+
+    except Exception as e:
+        print(f"⚠️ [ASGI] Traitement direct du message {message_id} échoué, relais aux workers: {e}")
+        compat.token_stream.reset(ticket_id)
+        await run_blocking(job_queue.release, message_id)
+        job_queue.submit(message_id)
+        server_stats['handed_to_workers'] += 1
+        return {
+            'success': True,
+            'status': 'nouveau',
+            'ticket_id': ticket_id,
+            'message_id': message_id,
+            'poll_url': f'/api/tickets/{ticket_id}',
+            'queued_at': datetime.now().isoformat(),
+            'mode': 'claude-ai'
+        }, 202
+
+    finally:
+        server_stats['inflight_claude'] -= 1
+
+
+async def check_email(scope, receive, send):
+    """Vérifie si un email existe dans la base de données clients"""
+    data = await read_json(receive) or {}
+    email = data.get('email')
+    if not email:
+        return await send_json(send, {'exists': False, 'error': 'Email manquant'}, 400)
+
+    exists = await run_blocking(compat.client_email_exists, email)
+    return await send_json(send, {'exists': exists})
+
+
+async def create_order(scope, receive, send):
+    """Crée une commande (transaction SQLite exécutée dans le pool de la base)"""
+    data = await read_json(receive)
+    payload, status_code = await run_blocking(compat.create_order, data)
+    return await send_json(send, payload, status_code)
+
+
+async def status(scope, receive, send):
+    """Statut du système, avec les compteurs du serveur ASGI"""
+    payload = await run_blocking(compat.collect_status)
+    payload['server'] = dict(server_stats, mode='asgi')
+    return await send_json(send, payload)
+
+
+async def ticket_stream(scope, receive, send, ticket_id):
+    """Flux SSE d'un ticket : fragments de texte au fil de la génération, puis résultat"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+
+    async def emit(event, data):
+        await send({'type': 'http.response.body', 'body': sse_event(event, data).encode('utf-8'), 'more_body': True})
+
+    timeout = STREAM_CONFIG['idle_timeout_seconds']
+    finished = False
+    if compat.token_stream.has(ticket_id):
+        async for kind, data in compat.token_stream.asubscribe(ticket_id, timeout):
+            await emit(kind, data)
+            finished = kind == 'done'
+    else:
+        # Agent legacy, simulation ou message déjà traité : seul le résultat final est envoyé
+        loop = asyncio.get_running_loop()
+        payload, status_code = await loop.run_in_executor(
+            wsgi_executor, compat.ticket_status_payload, ticket_id,
+            min(timeout, WORKER_CONFIG['long_poll_max_seconds'])
+        )
+        if payload.get('status') in compat.TERMINAL_STATUSES or status_code != 200:
+            await emit('done', payload)
+            finished = True
+
+    if not finished:
+        await emit('timeout', {'ticket_id': ticket_id})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+ROUTES = {
+    ('POST', '/api/process-message'): process_message,
+    ('POST', '/api/check-email'): check_email,
+    ('POST', '/api/orders'): create_order,
+    ('GET', '/api/status'): status
+}
+
+
+# ==================== PONT WSGI (MODE COMPATIBILITÉ) ====================
+
+def _build_environ(scope, body):
+    """Construit l'environnement WSGI d'une requête ASGI"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ):
+    """Exécute l'application Flask et retourne (statut, en-têtes, corps)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    iterable = compat.app.wsgi_app(environ, start_response)
+    try:
+        body = b''.join(iterable)
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+    return response['status'], response['headers'], body
+
+
+async def wsgi_bridge(scope, receive, send):
+    """Sert une requête avec l'application Flask dans le pool de threads WSGI"""
+    body = await read_body(receive)
+    loop = asyncio.get_running_loop()
+    status_code, headers, content = await loop.run_in_executor(
+        wsgi_executor, _call_wsgi, _build_environ(scope, body)
+    )
+
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': content})
+
+
+# ==================== APPLICATION ====================
+
+async def lifespan(receive, send):
+    while True:
+        event = await receive()
+        if event['type'] == 'lifespan.startup':
+            try:
+                await ensure_started()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif event['type'] == 'lifespan.shutdown':
+            db_executor.shutdown(wait=False)
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """Point d'entrée ASGI"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    await ensure_started()
+    server_stats['requests'] += 1
+
+    path = scope['path']
+    if scope['method'] == 'GET' and path.startswith('/api/tickets/') and path.endswith('/stream'):
+        return await ticket_stream(scope, receive, send, path[len('/api/tickets/'):-len('/stream')])
+
+    handler = ROUTES.get((scope['method'], path))
+    if handler is None:
+        return await wsgi_bridge(scope, receive, send)
+    return await handler(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Lancement du serveur ASGI...")
+    print(f"📋 Interface disponible sur: http://localhost:{ASGI_CONFIG['port']}")
+    uvicorn.run(application, host=ASGI_CONFIG['host'], port=ASGI_CONFIG['port'])
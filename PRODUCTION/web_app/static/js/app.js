@@ -37,9 +37,9 @@ async function processMessage(e) {
         const response = await fetch('/api/process-message', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ email, subject, message })
+            body: JSON.stringify({ email, subject, message, stream: true })
         });
-        const data = await response.json();
+        const data = await streamTicket(await response.json(), showStreamingText);
         if (data.success) {
             displayResult(data.result);
             showToast('Succès', 'Message traité avec succès.', 'success');
@@ -53,6 +53,69 @@ async function processMessage(e) {
     }
 }
 
+// Suivi en streaming : /api/tickets/<ticket_id>/stream (SSE), sinon long-polling
+function streamTicket(data, onText) {
+    if (!data.success || data.result || !data.stream_url || !window.EventSource) {
+        return waitForTicket(data);
+    }
+    
+    return new Promise(resolve => {
+        const source = new EventSource(data.stream_url);
+        let text = '';
+        
+        source.addEventListener('token', e => {
+            text += JSON.parse(e.data).text;
+            onText(text);
+        });
+        source.addEventListener('reset', () => {
+            text = '';
+            onText(text);
+        });
+        source.addEventListener('done', e => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        // Délai dépassé ou connexion perdue : reprise par long-polling
+        const fallback = () => {
+            source.close();
+            resolve(waitForTicket(data));
+        };
+        source.addEventListener('timeout', fallback);
+        source.onerror = fallback;
+    });
+}
+
+function showStreamingText(text) {
+    const resultArea = document.getElementById('result-area');
+    let target = document.getElementById('streaming-text');
+    if (!target) {
+        resultArea.className = 'result-area has-content';
+        resultArea.innerHTML = `
+            <h6 class="text-primary"><i class="bi bi-pencil"></i> Rédaction de la réponse...</h6>
+            <div id="streaming-text" class="bg-light p-2 rounded"></div>`;
+        target = document.getElementById('streaming-text');
+    }
+    target.textContent = text;
+}
+
+// Long-polling borné : 30 attentes de 20 s au plus (10 minutes)
+const TICKET_MAX_POLLS = 30;
+
+// Suivi d'un message mis en file : long-polling sur /api/tickets/<ticket_id>
+async function waitForTicket(data) {
+    if (!data.success || data.result || !data.ticket_id) return data;
+
+    for (let poll = 0; poll < TICKET_MAX_POLLS; poll++) {
+        const response = await fetch(`/api/tickets/${encodeURIComponent(data.ticket_id)}?wait=20`);
+        const ticket = await response.json();
+        if (!ticket.success || ticket.status === 'traite' || ticket.status === 'erreur') return ticket;
+    }
+    return {
+        success: false,
+        error: `Traitement toujours en cours. Suivez le ticket ${data.ticket_id} ultérieurement.`
+    };
+}
+
 function displayResult(result) {
     const resultArea = document.getElementById('result-area');
     resultArea.className = 'result-area has-content animate__animated animate__fadeIn';
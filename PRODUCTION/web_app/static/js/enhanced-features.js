@@ -205,103 +205,64 @@ function enhanceFormSubmission() {
             return;
         }
         
-        await processWithDelay(email, subject, message);
+        await processWithStreaming(email, subject, message);
     });
 }
 
-async function processWithDelay(email, subject, message) {
+async function processWithStreaming(email, subject, message) {
     const btn = document.querySelector('#support-form button[type="submit"]');
     const resultArea = document.getElementById('result-area');
     
     btn.disabled = true;
     btn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Traitement...';
     
-    // Délai aléatoire 10-30s
-    const delay = Math.floor(Math.random() * 21) + 10;
-    
-    // Interface de traitement
+    // Interface de traitement : la réponse s'affiche au fil de sa génération
     resultArea.innerHTML = `
         <div class="card border-primary">
             <div class="card-header bg-primary text-white">
-                <h6 class="mb-0">
-                    <i class="bi bi-cpu"></i> Claude 4 Sonnet - Chaîne de Réflexion
-                </h6>
-            </div>
-            <div class="card-body text-center">
-                <div class="spinner-border text-primary mb-3" style="width: 3rem; height: 3rem;"></div>
-                <h5 id="process-status">Initialisation...</h5>
-                <p class="text-muted">Intelligence artificielle avec réflexion approfondie</p>
-                
-                <div class="progress mb-3">
-                    <div id="progress-bar" class="progress-bar progress-bar-striped progress-bar-animated bg-primary" style="width: 0%"></div>
+                <div class="d-flex justify-content-between">
+                    <h6 class="mb-0">
+                        <i class="bi bi-cpu"></i> Claude - Réponse en cours de rédaction
+                    </h6>
+                    <small id="first-token-time"></small>
                 </div>
-                
-                <div class="row text-center">
-                    <div class="col-6">
-                        <small class="text-muted d-block">Délai prévu</small>
-                        <strong>${delay}s</strong>
-                    </div>
-                    <div class="col-6">
-                        <small class="text-muted d-block">Temps restant</small>
-                        <strong id="countdown">${delay}s</strong>
-                    </div>
+            </div>
+            <div class="card-body">
+                <div id="process-status" class="text-center">
+                    <div class="spinner-border text-primary mb-3"></div>
+                    <h5>Analyse du message...</h5>
                 </div>
-                
-                <small class="text-info mt-3 d-block">
-                    <i class="bi bi-shield-check"></i> Traitement sécurisé • Réponse personnalisée
-                </small>
+                <div id="stream-text" class="bg-light p-4 rounded border-start border-4 border-primary d-none" style="white-space: pre-wrap;"></div>
             </div>
         </div>
     `;
     
-    // Animation
-    let progress = 0;
-    let remaining = delay;
-    const progressBar = document.getElementById('progress-bar');
-    const countdown = document.getElementById('countdown');
+    const started = performance.now();
     const status = document.getElementById('process-status');
+    const streamText = document.getElementById('stream-text');
+    const firstTokenTime = document.getElementById('first-token-time');
     
-    const steps = [
-        "Analyse du message...",
-        "Classification automatique...",
-        "Recherche base de données...",
-        "Génération réflexive...",
-        "Optimisation réponse...",
-        "Finalisation..."
-    ];
-    
-    const interval = setInterval(() => {
-        progress += Math.random() * 3 + 1;
-        if (progress > 95) progress = 95;
-        progressBar.style.width = progress + '%';
-        
-        remaining--;
-        countdown.textContent = Math.max(remaining, 0) + 's';
-        
-        const stepIndex = Math.floor((progress / 95) * steps.length);
-        if (steps[stepIndex]) {
-            status.textContent = steps[stepIndex];
+    const onText = text => {
+        if (streamText.classList.contains('d-none')) {
+            status.classList.add('d-none');
+            streamText.classList.remove('d-none');
+            firstTokenTime.textContent = `1er mot : ${((performance.now() - started) / 1000).toFixed(1)}s`;
         }
-    }, 1000);
+        streamText.textContent = text;
+    };
     
     try {
         const response = await fetch('/api/process-message', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ email, subject, message })
+            body: JSON.stringify({ email, subject, message, stream: true })
         });
         
-        clearInterval(interval);
-        progressBar.style.width = '100%';
-        countdown.textContent = '0s';
-        
-        const data = await response.json();
+        const data = await streamTicket(await response.json(), onText);
         
         if (data.success) {
-            setTimeout(() => {
-                displayResult(data);
-                showAlert('Traité par Claude 4 avec succès !', 'success');
-            }, 800);
+            displayResult(data);
+            showAlert('Traité par Claude avec succès !', 'success');
         } else {
             if (data.requires_registration) {
                 showAlert(data.error, 'warning');
@@ -312,7 +273,6 @@ async function processWithDelay(email, subject, message) {
             resultArea.innerHTML = '<div class="alert alert-warning">Traitement échoué</div>';
         }
     } catch (error) {
-        clearInterval(interval);
         showAlert('Erreur de connexion', 'danger');
         resultArea.innerHTML = '<div class="alert alert-danger">Erreur de connexion</div>';
     } finally {